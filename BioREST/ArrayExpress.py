@@ -53,6 +53,7 @@ __maintainer__ = "Arnaud KOPP"
 __email__ = "kopp.arnaud@gmail.com"
 __status__ = "Production"
 
+import os
 import logging
 from BioREST.Service import REST, check_param_in_list
 
@@ -269,10 +270,7 @@ class ArrayExpress(REST):
         url = "files/" + experiment + "/" + filename
 
         if save:
-            res = self.http_get(url, frmt="txt")
-            f = open(filename, "w")
-            f.write(res)
-            f.close()
+            self.download(url, filename)
         else:
             res = self.http_get(url, frmt=None)
             return res
@@ -324,15 +322,20 @@ class ArrayExpress(REST):
         self.format = frmt
         return [x['accession'] for x in sets['experiments']['experiment']]
 
-    def getAE(self, accession, type='full'):
+    def getAE(self, accession, type='full', directory='', segments=4):
         """
-        retrieve all files from an experiments and save them locally
+        retrieve all files from an experiments and save them locally, files are streamed to disk (in parallel
+        segments for large ones) and interrupted downloads resume where they stopped
+        :param accession: experiment name
+        :param directory: where to save the files
+        :param segments: number of parallel segments by file
+        :return: list of saved files
         """
         filenames = self.retrieveFilesFromExperiment(accession)
-        self.info("Found %s files" % len(filenames))
-        for i,filename in enumerate(filenames):
-            res = self.retrieveFile(accession, filename)
-            fh = open(filename, 'w')
-            self.info("Downloading %s" % filename)
-            fh.write(res)
-            fh.close()
+        log.info("Found %s files" % len(filenames))
+        saved = []
+        for filename in filenames:
+            log.info("Downloading %s" % filename)
+            saved.append(self.download("files/" + accession + "/" + filename, os.path.join(directory, filename),
+                                       segments=segments))
+        return saved
@@ -85,9 +85,8 @@ __status__ = "Production"
 import webbrowser
 from io import StringIO
 import logging
-import pandas as pd
 
-from BioREST.Service import REST
+from BioREST.Service import REST, check_range
 
 log = logging.getLogger(__name__)
 
@@ -120,9 +119,10 @@ class Biogrid(REST):
 
     parameters = property(get_valid_parameters, doc="Returns list of valid parameters")
 
-    def interaction(self, **kwargs):
+    def interaction(self, stream=False, **kwargs):
         """
         Parse request
+        :param stream: if True, returns an iterator over lines read from the network in constant memory
         :param kwargs:
         :return:
         """
@@ -136,9 +136,24 @@ class Biogrid(REST):
                     log.warning("%s is not a valid parameters" % key)
         else:
             raise ValueError('Need parameters to search interaction')
-        res = self.http_get(url, params=params)
+        res = self.http_get(url, params=params, stream=stream)
         return res
 
+    def iter_interactions(self, page_size=10000, limit=None, **kwargs):
+        """
+        Iterate over all the interactions matching the parameters, pages of results are requested lazily (the
+        service returns at most 10000 interactions by request)
+        :param page_size: number of interactions by request (max 10000)
+        :param limit: maximum number of interactions, None for all
+        :param kwargs: search parameters, see :meth:`interaction` (tab formats, without includeHeader)
+        :return: generator of lines
+        """
+        check_range(page_size, 1, 10000)
+        start = kwargs.pop('start', 0)
+        kwargs.pop('max', None)
+        return self.paginate(lambda offset, size: self.interaction(start=offset, max=size, **kwargs), page_size,
+                             start=start, limit=limit)
+
     def get_biogrid_version(self):
         """
         Get the biogrid Version
@@ -184,6 +199,7 @@ class BiogridParser(object):
         """
         Constructor
         """
+        import pandas as pd
         self.Data = pd.read_table(StringIO(data_input), header=None)
         self.Data.columns = ['Biogrid Interaction ID', "Entrez Gene Id A", "Entrez Gene Id B", "Biogrid Id A",
                              "Biogrid Id B", "A", "B", "A Off", "B Off", "A Syn", "B Syn", "Experimental System Name",
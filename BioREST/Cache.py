@@ -0,0 +1,340 @@
+# coding=utf-8
+"""
+Response caches used by the REST class
+DiskCache is a persistent SQLite store shared between runs and processes, entries expire after a per service time to
+live and the least recently used ones are evicted when the total size goes over the byte budget. Expired entries
+keep their validators (ETag / Last-Modified) so they can be revalidated with a conditional request.
+MemoryCache is an in process LRU of already decoded responses, bounded by number of entries and bytes.
+"""
+
+__author__ = "Arnaud KOPP"
+__copyright__ = "© 2015-2016 KOPP Arnaud All Rights Reserved"
+__credits__ = ["KOPP Arnaud"]
+__license__ = "GNU GPL V3.0"
+__maintainer__ = "Arnaud KOPP"
+__email__ = "kopp.arnaud@gmail.com"
+__status__ = "Production"
+
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+import collections
+import logging
+log = logging.getLogger(__name__)
+
+
+def request_key(method, url, params=None, data=None, accept=None):
+    """
+    Build the key identifying a request
+    :param method: http method
+    :param url: full url
+    :param params: params added in url
+    :param data: body of the request
+    :param accept: Accept header
+    :return: hexadecimal digest
+    """
+    if isinstance(data, bytes):
+        data = data.decode('latin-1')
+    raw = json.dumps([method.upper(), url, params or {}, data, accept], sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class DiskCache(object):
+    """
+    Persistent response cache backed by SQLite
+
+    c = DiskCache(max_bytes=100 * 1024 ** 2, service_ttl={'KEGG': 7 * 24 * 3600})
+    set_default_cache(c)
+    KEGG().list("organism")  # network
+    KEGG().list("organism")  # served from disk
+    c.stats()
+    """
+    _schema = """
+        CREATE TABLE IF NOT EXISTS responses (
+            key TEXT PRIMARY KEY,
+            url TEXT,
+            status INTEGER,
+            headers TEXT,
+            body BLOB,
+            size INTEGER,
+            created REAL,
+            expires REAL,
+            accessed REAL);
+        CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed);
+    """
+
+    def __init__(self, path=None, max_bytes=512 * 1024 ** 2, default_ttl=24 * 3600, service_ttl=None):
+        """
+        :param path: sqlite file, default to ~/.cache/BioREST/responses.sqlite
+        :param max_bytes: maximum total size of stored bodies
+        :param default_ttl: time to live in seconds of entries
+        :param service_ttl: dict of time to live in seconds by service name
+        """
+        if path is None:
+            path = os.path.join(os.path.expanduser("~"), ".cache", "BioREST", "responses.sqlite")
+        directory = os.path.dirname(path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.service_ttl = service_ttl or {}
+        self._hits = 0
+        self._misses = 0
+        self._revalidated = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(self._schema)
+        # running total of the stored bytes, the table is only scanned again when it goes over max_bytes (it is
+        # then also corrected for the entries written by other processes)
+        self._size = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def ttl_for(self, service=None):
+        """
+        Time to live of entries for a service
+        :param service: service name
+        """
+        return self.service_ttl.get(service, self.default_ttl)
+
+    def get(self, key, stale=False):
+        """
+        Get an entry
+        :param key: request key (see :func:`request_key`)
+        :param stale: if True, expired entries are also returned (to be revalidated)
+        :return: dict with url, status, headers, body and fresh or None
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT url, status, headers, body, expires FROM responses WHERE key = ?",
+                                     (key,)).fetchone()
+            fresh = row is not None and row[4] >= now
+            if not fresh:
+                self._misses += 1
+                if row is None or not stale:
+                    return None
+            else:
+                self._hits += 1
+                self._conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+                self._conn.commit()
+        return {'url': row[0], 'status': row[1], 'headers': json.loads(row[2]), 'body': row[3], 'fresh': fresh}
+
+    def refresh(self, key, ttl=None, service=None):
+        """
+        Extend the life of an entry revalidated by the server (304 Not Modified)
+        :param key: request key (see :func:`request_key`)
+        :param ttl: time to live in seconds, default to the service one
+        :param service: service name
+        """
+        now = time.time()
+        ttl = self.ttl_for(service) if ttl is None else ttl
+        with self._lock:
+            self._revalidated += 1
+            self._conn.execute("UPDATE responses SET expires = ?, accessed = ? WHERE key = ?", (now + ttl, now, key))
+            self._conn.commit()
+
+    def set(self, key, url, status, headers, body, ttl=None, service=None):
+        """
+        Store a response
+        :param key: request key (see :func:`request_key`)
+        :param url: url of the response
+        :param status: status code
+        :param headers: dict of headers to keep
+        :param body: raw body (bytes)
+        :param ttl: time to live in seconds, default to the service one
+        :param service: service name
+        """
+        if len(body) > self.max_bytes:
+            log.debug("Response too large to be cached (%s bytes)" % len(body))
+            return
+        now = time.time()
+        ttl = self.ttl_for(service) if ttl is None else ttl
+        with self._lock:
+            row = self._conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self._conn.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                               (key, url, status, json.dumps(dict(headers)), sqlite3.Binary(body), len(body), now,
+                                now + ttl, now))
+            self._size += len(body) - (row[0] if row is not None else 0)
+            if self._size > self.max_bytes:
+                self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            self._size = total
+            return
+        # drop expired entries first, then least recently used ones
+        self._conn.execute("DELETE FROM responses WHERE expires < ?", (time.time(),))
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        cursor = self._conn.execute("SELECT key, size FROM responses ORDER BY accessed")
+        evicted = []
+        # go down to 90% of the budget, a full cache does not scan the table on every insert
+        target = self.max_bytes * 0.9
+        for key, size in cursor:
+            if total <= target:
+                break
+            evicted.append((key,))
+            total -= size
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", evicted)
+        self._size = total
+        log.debug("Evicted %s entries from cache" % len(evicted))
+
+    def delete(self, key):
+        """
+        Remove an entry
+        :param key: request key
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._conn.commit()
+            if row is not None:
+                self._size -= row[0]
+
+    def clear(self):
+        """
+        Remove all entries and reset statistics
+        """
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+            self._size = 0
+            self._hits = 0
+            self._misses = 0
+            self._revalidated = 0
+
+    def stats(self):
+        """
+        Statistics of the cache
+        :return: dict with hits, misses, hit ratio, revalidated entries, number of entries and stored bytes
+        """
+        with self._lock:
+            entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        total = self._hits + self._misses
+        return {'hits': self._hits, 'misses': self._misses, 'hit_ratio': self._hits / total if total else 0.,
+                'revalidated': self._revalidated, 'entries': entries, 'bytes': size, 'max_bytes': self.max_bytes}
+
+    def close(self):
+        """
+        Close the sqlite connection
+        """
+        with self._lock:
+            self._conn.close()
+
+
+class MemoryCache(object):
+    """
+    In memory LRU of decoded responses
+    Values are returned as stored (no copy), so they must be treated as read only by callers.
+
+    m = MemoryCache(max_entries=512, max_bytes=32 * 1024 ** 2)
+    set_default_memory_cache(m)
+    """
+
+    def __init__(self, max_entries=1024, max_bytes=64 * 1024 ** 2, default_ttl=3600, service_ttl=None):
+        """
+        :param max_entries: maximum number of entries
+        :param max_bytes: maximum total size of entries (size of the raw responses)
+        :param default_ttl: time to live in seconds of entries
+        :param service_ttl: dict of time to live in seconds by service name
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.service_ttl = service_ttl or {}
+        self._entries = collections.OrderedDict()
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._lock = threading.Lock()
+
+    def ttl_for(self, service=None):
+        """
+        Time to live of entries for a service
+        :param service: service name
+        """
+        return self.service_ttl.get(service, self.default_ttl)
+
+    def get(self, key, default=None):
+        """
+        Get a fresh value
+        :param key: entry key
+        :param default: returned if no fresh entry is found
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                self._misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return entry[1]
+
+    def peek(self, key):
+        """
+        Get an entry even if expired, statistics and LRU order are not updated
+        :param key: entry key
+        :return: tuple (value, tag) or None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            return entry[1], entry[3]
+
+    def set(self, key, value, size=0, ttl=None, service=None, tag=None):
+        """
+        Store a value
+        :param key: entry key
+        :param value: decoded response
+        :param size: size in bytes accounted for the value
+        :param ttl: time to live in seconds, default to the service one
+        :param service: service name
+        :param tag: version of the value (e.g. validators of the response)
+        """
+        if size > self.max_bytes:
+            return
+        ttl = self.ttl_for(service) if ttl is None else ttl
+        with self._lock:
+            self._pop(key)
+            self._entries[key] = (time.monotonic() + ttl, value, size, tag)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._pop(next(iter(self._entries)))
+
+    def _pop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[2]
+
+    def delete(self, key):
+        """
+        Remove an entry
+        :param key: entry key
+        """
+        with self._lock:
+            self._pop(key)
+
+    def clear(self):
+        """
+        Remove all entries and reset statistics
+        """
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self._hits = 0
+            self._misses = 0
+
+    def stats(self):
+        """
+        Statistics of the cache
+        :return: dict with hits, misses, hit ratio, number of entries and accounted bytes
+        """
+        with self._lock:
+            total = self._hits + self._misses
+            return {'hits': self._hits, 'misses': self._misses, 'hit_ratio': self._hits / total if total else 0.,
+                    'entries': len(self._entries), 'bytes': self._bytes, 'max_bytes': self.max_bytes}
@@ -0,0 +1,372 @@
+# coding=utf-8
+"""
+Download manager for bulk files (flat files, archives)
+Files are downloaded in a .part file next to the target, in parallel segments when the server accepts byte ranges.
+The progress of every segment is kept in a .part.json state file, an interrupted download (error, crash, ^C) resumes
+where it stopped if the remote file did not change. The checksum is verified on the downloaded bytes and gzip files
+can be decompressed on the fly to the target, in constant memory.
+
+    from BioREST.Download import Downloader, print_progress
+    d = Downloader(segments=4, progress=print_progress)
+    d.download("https://ftp.ebi.ac.uk/pub/databases/uniprot/knowledgebase/uniprot_sprot.dat.gz", "uniprot_sprot.dat",
+               decompress=True)
+"""
+
+__author__ = "Arnaud KOPP"
+__copyright__ = "© 2015-2016 KOPP Arnaud All Rights Reserved"
+__credits__ = ["KOPP Arnaud"]
+__license__ = "GNU GPL V3.0"
+__maintainer__ = "Arnaud KOPP"
+__email__ = "kopp.arnaud@gmail.com"
+__status__ = "Production"
+
+import os
+import sys
+import json
+import time
+import hashlib
+import threading
+import concurrent.futures
+import requests
+import urllib3
+from BioREST.Scheduler import scheduler as default_scheduler, BULK
+import logging
+log = logging.getLogger(__name__)
+
+
+class DownloadError(IOError):
+    """
+    Raised when a download can not be completed or its checksum does not match
+    """
+    pass
+
+
+class Progress(object):
+    """
+    Thread safe progress of a download, shared by its segments
+    """
+
+    def __init__(self, total=None, done=0, callback=None, interval=0.5):
+        """
+        :param total: number of bytes to download, None if unknown
+        :param done: number of bytes already downloaded (resumed download)
+        :param callback: callable (progress) called at most every interval seconds and at the end
+        :param interval: minimum number of seconds between two calls of callback
+        """
+        self.total = total
+        self.done = done
+        self.callback = callback
+        self.interval = interval
+        self._resumed = done
+        self._start = time.monotonic()
+        self._reported = 0.
+        self._lock = threading.Lock()
+
+    def update(self, n):
+        """
+        Add n downloaded bytes
+        :param n: number of bytes
+        """
+        with self._lock:
+            self.done += n
+            now = time.monotonic()
+            report = self.callback is not None and now - self._reported >= self.interval
+            if report:
+                self._reported = now
+        if report:
+            self.callback(self)
+
+    def finish(self):
+        """
+        Report the end of the download
+        """
+        if self.callback is not None:
+            self.callback(self)
+
+    def _get_elapsed(self):
+        return time.monotonic() - self._start
+
+    elapsed = property(_get_elapsed, doc="seconds since the start of the download")
+
+    def _get_speed(self):
+        elapsed = self.elapsed
+        return (self.done - self._resumed) / elapsed if elapsed > 0 else 0.
+
+    speed = property(_get_speed, doc="bytes downloaded per second in this session")
+
+    def _get_percent(self):
+        return 100. * self.done / self.total if self.total else None
+
+    percent = property(_get_percent, doc="percentage downloaded, None if the size is unknown")
+
+    def __str__(self):
+        percent = "%d%%, " % self.percent if self.total else ""
+        return "...%s%d MB, %d KB/s, %d seconds passed" % (percent, self.done / (1024 * 1024), self.speed / 1024,
+                                                           self.elapsed)
+
+
+def print_progress(progress):
+    """
+    Progress callback writing the progress on one line of stdout
+    :param progress: Progress
+    """
+    sys.stdout.write("\r%s" % progress)
+    sys.stdout.flush()
+
+
+def _parse_checksum(checksum):
+    if checksum is None:
+        return None
+    if isinstance(checksum, (tuple, list)):
+        algorithm, digest = checksum
+    elif ":" in checksum:
+        algorithm, digest = checksum.split(":", 1)
+    else:
+        # bare digest, guess the algorithm from its length
+        algorithm = {32: 'md5', 40: 'sha1', 64: 'sha256', 128: 'sha512'}.get(len(checksum))
+        digest = checksum
+        if algorithm is None:
+            raise ValueError("Unknown checksum %s, use algorithm:digest" % checksum)
+    hashlib.new(algorithm)
+    return algorithm.lower(), digest.lower()
+
+
+def _gunzip(chunks):
+    from BioREST.Service import _gunzip as gunzip
+    return gunzip(chunks)
+
+
+def _read_file(filename, chunk_size):
+    with open(filename, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+
+class Downloader(object):
+    """
+    Resumable, segmented download of large files
+    """
+
+    def __init__(self, segments=4, min_segment_size=8 * 1024 ** 2, chunk_size=256 * 1024, retries=5, timeout=60,
+                 progress=None, session=None, scheduler=None):
+        """
+        :param segments: maximum number of segments downloaded in parallel (1 for a single stream)
+        :param min_segment_size: files smaller than segments * min_segment_size use less segments
+        :param chunk_size: size of chunks read from the network and written to disk
+        :param retries: number of retries of a segment, each retry resumes where the segment stopped
+        :param timeout: timeout of the requests (connect and read) in seconds
+        :param progress: callable (Progress) called while downloading, e.g. :func:`print_progress`
+        :param session: requests session, default to the pooled session of the host
+        :param scheduler: scheduler giving the slots of the segments (bulk priority), default to the process one,
+            False to bypass it
+        """
+        if segments < 1:
+            raise ValueError("segments must be greater than 0")
+        self.segments = segments
+        self.min_segment_size = min_segment_size
+        self.chunk_size = chunk_size
+        self.retries = retries
+        self.timeout = timeout
+        self.progress = progress
+        self.session = session
+        self.scheduler = default_scheduler if scheduler is None else scheduler
+
+    def _session(self, url):
+        if self.session is not None:
+            return self.session
+        from BioREST.Service import get_session
+        return get_session(url)
+
+    def _probe(self, url, headers):
+        """
+        Get size, validator and byte ranges support of the remote file
+        """
+        res = self._session(url).get(url, headers=dict(headers, Range="bytes=0-0"), stream=True,
+                                     timeout=self.timeout)
+        try:
+            if res.status_code not in (200, 206):
+                raise DownloadError("Can't download %s: %s %s" % (url, res.status_code, res.reason))
+            validator = res.headers.get('ETag') or res.headers.get('Last-Modified')
+            if res.status_code == 206 and '/' in res.headers.get('Content-Range', ''):
+                total = res.headers['Content-Range'].rsplit('/', 1)[1]
+                return (int(total) if total.isdigit() else None), validator, True
+            length = res.headers.get('Content-Length')
+            return (int(length) if length else None), validator, False
+        finally:
+            res.close()
+
+    def _plan(self, total, ranges):
+        if not ranges or not total:
+            return [[0, total - 1 if total else None, 0]]
+        n = max(1, min(self.segments, total // self.min_segment_size))
+        step = -(-total // n)
+        return [[start, min(start + step, total) - 1, 0] for start in range(0, total, step)]
+
+    def download(self, url, filename, checksum=None, decompress=False, headers=None, resume=True):
+        """
+        Download url to filename
+        :param url: url of the file
+        :param filename: target file
+        :param checksum: expected digest of the downloaded bytes (before decompression), 'algorithm:hexdigest'
+            (e.g. 'md5:...'), a (algorithm, hexdigest) tuple or a bare md5/sha1/sha256/sha512 hex digest
+        :param decompress: gunzip the downloaded bytes to filename
+        :param headers: additional http headers
+        :param resume: resume a previous interrupted download of the same file
+        :return: filename
+        """
+        checksum = _parse_checksum(checksum)
+        # byte ranges are offsets in the file as stored on the server
+        headers = dict(headers or {}, **{'Accept-Encoding': 'identity'})
+        part = filename + ".part"
+        state_file = part + ".json"
+        total, validator, ranges = self._probe(url, headers)
+
+        state = None
+        if resume and os.path.exists(part) and os.path.exists(state_file):
+            try:
+                with open(state_file) as f:
+                    state = json.load(f)
+            except ValueError:
+                state = None
+            if state is not None and (state.get('url') != url or state.get('total') != total or
+                                      state.get('validator') != validator or not ranges or not validator):
+                log.info("Remote file changed or can't be resumed, restarting download of %s" % url)
+                state = None
+        if state is None:
+            state = {'url': url, 'total': total, 'validator': validator, 'segments': self._plan(total, ranges)}
+            with open(part, "wb") as f:
+                if total:
+                    f.truncate(total)
+        else:
+            log.info("Resuming download of %s (%s/%s bytes)" % (url, sum(x[2] for x in state['segments']), total))
+
+        progress = Progress(total, sum(x[2] for x in state['segments']), self.progress)
+        lock = threading.Lock()
+
+        def _save():
+            with lock:
+                with open(state_file + ".tmp", "w") as f:
+                    json.dump(state, f)
+                os.replace(state_file + ".tmp", state_file)
+
+        _save()
+        segments = [x for x in state['segments'] if x[1] is None or x[0] + x[2] <= x[1]]
+        if segments:
+            log.info("Downloading %s in %s segment(s)" % (url, len(segments)))
+            workers = concurrent.futures.ThreadPoolExecutor(max_workers=len(segments),
+                                                            thread_name_prefix="BioREST-download")
+            try:
+                futures = [workers.submit(self._segment, url, part, segment, headers, validator, ranges, progress,
+                                          _save) for segment in segments]
+                for future in concurrent.futures.as_completed(futures):
+                    future.result()
+            finally:
+                workers.shutdown(wait=True, cancel_futures=True)
+                _save()
+        progress.finish()
+
+        if total is None:
+            total = state['segments'][0][2]
+        if os.path.getsize(part) != total:
+            raise DownloadError("Incomplete download of %s (%s/%s bytes)" % (url, os.path.getsize(part), total))
+        if checksum is not None:
+            digest = hashlib.new(checksum[0])
+            for chunk in _read_file(part, self.chunk_size):
+                digest.update(chunk)
+            if digest.hexdigest() != checksum[1]:
+                os.remove(part)
+                os.remove(state_file)
+                raise DownloadError("Checksum mismatch for %s: %s:%s expected, got %s" % (url, checksum[0],
+                                                                                         checksum[1],
+                                                                                         digest.hexdigest()))
+        if decompress:
+            log.info("Uncompressing %s" % filename)
+            with open(filename + ".tmp", "wb") as f:
+                for chunk in _gunzip(_read_file(part, self.chunk_size)):
+                    f.write(chunk)
+            os.replace(filename + ".tmp", filename)
+            os.remove(part)
+        else:
+            os.replace(part, filename)
+        os.remove(state_file)
+        return filename
+
+    def _segment(self, url, part, segment, headers, validator, ranges, progress, save):
+        """
+        Download one segment [start, end, done] of the file, resuming after errors
+        """
+        attempt = 0
+        while True:
+            start, end, done = segment
+            request_headers = dict(headers)
+            if ranges and (done or start or end is not None):
+                request_headers['Range'] = "bytes=%s-%s" % (start + done, "" if end is None else end)
+                if validator:
+                    request_headers['If-Range'] = validator
+            elif done:
+                # no byte ranges, start again
+                progress.update(-done)
+                segment[2] = done = 0
+            try:
+                slot = self.scheduler.slot(url, priority=BULK) if self.scheduler else _no_slot()
+                with slot:
+                    self._fetch(url, part, segment, request_headers, progress, save)
+                return
+            except (requests.exceptions.RequestException, urllib3.exceptions.HTTPError, DownloadError) as e:
+                attempt += 1
+                if attempt > self.retries:
+                    raise DownloadError("Download of %s failed: %s" % (url, e))
+                delay = min(2 ** attempt, 60)
+                log.warning("Segment %s-%s of %s failed (%s), resuming in %ss" % (start, end, url, e, delay))
+                save()
+                time.sleep(delay)
+
+    def _fetch(self, url, part, segment, headers, progress, save):
+        res = self._session(url).get(url, headers=headers, stream=True, timeout=self.timeout)
+        try:
+            if 'Range' in headers and res.status_code != 206:
+                raise DownloadError("Server answered %s to a byte range request" % res.status_code)
+            if res.status_code not in (200, 206):
+                raise DownloadError("%s %s" % (res.status_code, res.reason))
+            start, end, done = segment
+            saved = done
+            with open(part, "r+b") as f:
+                f.seek(start + done)
+                for chunk in res.raw.stream(self.chunk_size, decode_content=False):
+                    if end is not None and start + segment[2] + len(chunk) > end + 1:
+                        chunk = chunk[:end + 1 - start - segment[2]]
+                    f.write(chunk)
+                    segment[2] += len(chunk)
+                    progress.update(len(chunk))
+                    if segment[2] - saved >= 16 * self.chunk_size:
+                        f.flush()
+                        save()
+                        saved = segment[2]
+            if end is not None and start + segment[2] != end + 1:
+                raise DownloadError("Connection closed at %s/%s bytes" % (start + segment[2], end + 1))
+        finally:
+            res.close()
+
+
+class _no_slot(object):
+    def __enter__(self):
+        return 0.
+
+    def __exit__(self, *args):
+        return False
+
+
+def download(url, filename, checksum=None, decompress=False, **kargs):
+    """
+    Download url to filename with a :class:`Downloader`
+    :param url: url of the file
+    :param filename: target file
+    :param checksum: expected digest of the downloaded bytes, see :meth:`Downloader.download`
+    :param decompress: gunzip the downloaded bytes to filename
+    :param kargs: Downloader parameters (segments, progress ...)
+    :return: filename
+    """
+    return Downloader(**kargs).download(url, filename, checksum=checksum, decompress=decompress)
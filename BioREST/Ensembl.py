@@ -43,7 +43,7 @@ __email__ = "kopp.arnaud@gmail.com"
 __status__ = "Production"
 
 import logging
-from BioREST.Service import REST, check_param_in_list, tolist, to_json
+from BioREST.Service import REST, check_param_in_list, tolist, to_json, merge_xml
 
 log = logging.getLogger(__name__)
 
@@ -55,9 +55,10 @@ class Ensembl(REST):
     The API was copied from the Ensemble API (http://rest.ensemblgenomes.org/)
     REST API in V4.0 used here
 
-    For post requests, max size is 1000
+    For post requests, max size is 1000, longer lists of identifiers are posted by chunks (see :meth:`REST.batch`)
 
     """
+    _max_post_ids = 1000
 
     def __init__(self, requests_per_sec=15):
         """
@@ -78,6 +79,19 @@ class Ensembl(REST):
     def __check_id(identifier):
         pass
 
+    def __post_ids(self, query, identifiers, data, **kargs):
+        """
+        Post identifiers by chunks of at most _max_post_ids, responses are merged back
+        :param query: endpoint
+        :param identifiers: list of identifiers
+        :param data: callable building the body from a chunk of identifiers
+        :param kargs: http_post parameters
+        """
+        # xml documents of the chunks are merged under the root of the first one, not joined as text
+        merge = merge_xml if kargs.get('frmt') in ['xml', 'seqxml'] else None
+        return self.batch(lambda ids: self.http_post(query, data=data(ids), **kargs), identifiers,
+                          size=self._max_post_ids, merge=merge)
+
     @staticmethod
     def __nh_format_to_frmt(value):
         """
@@ -142,10 +156,9 @@ class Ensembl(REST):
         """
         self.__check_frmt(frmt, ['xml'])
         identifiers = tolist(identifiers)
-        res = self.http_post("archive/id/", frmt=frmt,
-                             headers=self.get_headers(content=frmt),
-                             data=to_json({'id': identifiers}),
-                             params={'callback': self.callback})
+        res = self.__post_ids("archive/id/", identifiers, lambda ids: to_json({'id': ids}), frmt=frmt,
+                              headers=self.get_headers(content=frmt),
+                              params={'callback': self.callback})
         return res
 
     # COMPARATIVE GENOMICS
@@ -876,11 +889,10 @@ class Ensembl(REST):
         self.__check_frmt(frmt)
         identifiers = tolist(identifiers)
         expand = int(expand)
-        res = self.http_post("lookup/id/", frmt=frmt,
-                             headers=self.get_headers(content=frmt),
-                             data=to_json({'ids': identifiers}),
-                             params={'db_type': db_type, 'expand': expand, 'format': format,
-                                     'callback': self.callback, 'species': species})
+        res = self.__post_ids("lookup/id/", identifiers, lambda ids: to_json({'ids': ids}), frmt=frmt,
+                              headers=self.get_headers(content=frmt),
+                              params={'db_type': db_type, 'expand': expand, 'format': format,
+                                      'callback': self.callback, 'species': species})
         return res
 
     def get_lookup_by_symbol(self, species, symbol, frmt='json', expand=False, format='full'):
@@ -927,12 +939,11 @@ class Ensembl(REST):
         self.__check_frmt(frmt, ['xml'])
         symbols = tolist(symbols)
         expand = int(expand)
-        res = self.http_post("lookup/symbol/{0}".format(species),
-                             frmt=frmt,
-                             headers=self.get_headers(content=frmt),
-                             data=to_json({'symbols': symbols}),
-                             params={'format': format,
-                                     'callback': self.callback, 'expand': expand})
+        res = self.__post_ids("lookup/symbol/{0}".format(species), symbols, lambda ids: to_json({'symbols': ids}),
+                              frmt=frmt,
+                              headers=self.get_headers(content=frmt),
+                              params={'format': format,
+                                      'callback': self.callback, 'expand': expand})
         return res
 
     # MAPPING
@@ -1406,16 +1417,15 @@ class Ensembl(REST):
         check_param_in_list(mask, ['hard', 'soft'])
         self.__check_frmt(frmt, ['fasta', 'text', 'yaml', 'seqxml'])
         multiple_sequences = int(multiple_sequences)
-        res = self.http_post('sequence/id',
-                             data={"ids": identifier},
-                             frmt=frmt,
-                             headers=self.get_headers(content=frmt),
-                             params={'db_type': db_type, 'object_type': object_type,
-                                     'multiple_sequences': multiple_sequences, 'species': species,
-                                     'expand_3prime': expand_3prime,
-                                     'expand_5prime': expand_5prime, 'format': format, 'mask': mask,
-                                     'mask_feature': mask_feature, 'type': type}
-                             )
+        res = self.__post_ids('sequence/id', identifier, lambda ids: {"ids": ids},
+                              frmt=frmt,
+                              headers=self.get_headers(content=frmt),
+                              params={'db_type': db_type, 'object_type': object_type,
+                                      'multiple_sequences': multiple_sequences, 'species': species,
+                                      'expand_3prime': expand_3prime,
+                                      'expand_5prime': expand_5prime, 'format': format, 'mask': mask,
+                                      'mask_feature': mask_feature, 'type': type}
+                              )
         return res
 
     def get_sequence_by_region(self, region, species, frmt='json', coord_system=None, coord_system_version=None,
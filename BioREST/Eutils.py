@@ -66,6 +66,7 @@ class EUtils(REST):
         before being banned, you may be contacted.
 
     """
+    _max_ids = 200
 
     def __init__(self, email="unknown"):
         url = "http://eutils.ncbi.nlm.nih.gov/entrez/eutils"
@@ -108,16 +109,31 @@ class EUtils(REST):
         if retmode not in ['xml', 'json', 'text']:
             raise ValueError("Unsupported format")
 
-    def _check_ids(self, sid):
+    @staticmethod
+    def _split_ids(sid):
         if isinstance(sid, int):
             sid = [sid]
         if isinstance(sid, list):
             sid = ",".join([str(x) for x in sid])
         # If there are commas, let us split, strip spaces and join back the ids
-        sid = ",".join([x.strip() for x in sid.split(',') if x.strip() != ""])
-        if len(sid.split(",")) > 200:
-            raise ValueError("Number of comma separated IDs must be less than 200")
-        return sid
+        return [x.strip() for x in sid.split(',') if x.strip() != ""]
+
+    def _check_ids(self, sid):
+        sid = self._split_ids(sid)
+        if len(sid) > self._max_ids:
+            raise ValueError("Number of comma separated IDs must be less than %s" % self._max_ids)
+        return ",".join(sid)
+
+    def _get_by_ids(self, url, ids, params, frmt='json'):
+        """
+        Get a list of ids, by chunks of at most _max_ids merged back if needed
+        :param url: endpoint
+        :param ids: list of ids
+        :param params: parameters of the request, id is filled with the ids
+        :param frmt: frmt of the response
+        """
+        return self.batch(lambda chunk: self.http_get(url, frmt=frmt, params=dict(params, id=",".join(chunk))), ids,
+                          size=self._max_ids)
 
     @staticmethod
     def open_query_doc():
@@ -169,14 +185,15 @@ class EUtils(REST):
         Return document Summary of list of UIDs
         :param kwargs:
         :param db:
-        :param sid:
+        :param sid: list of UIDs, limited to 200 in xml, requested by chunks of 200 in json
         :param retmode: xml or json
         :return: Return DocSum
         """
         params = {'db': db, 'id': sid, 'retmode': retmode, 'tool': self.tool, 'email': self.email}
         _valid_opt_param = ['query_key', 'WebEnv', 'retstart', 'retmax']
         url = 'esummary.fcgi'
-        self._check_ids(sid)
+        if retmode == 'xml':
+            self._check_ids(sid)
         self._check_db(db)
 
         for key, value in kwargs.items():
@@ -185,7 +202,8 @@ class EUtils(REST):
         if retmode is 'xml':
             res = self.easyXML(self.http_get(url, frmt='xml', params=params))
         else:
-            res = self.http_get(url, params=params)
+            # json documents of the chunks are merged (result.uids concatenated)
+            res = self._get_by_ids(url, self._split_ids(sid), params)
         return res
 
     def EInfo(self, db, retmode='xml'):
@@ -209,7 +227,7 @@ class EUtils(REST):
         Return formatted data records for a list of input id
         :param retmode: text, xml not recommended
         :param db: Database from which to retrieve UIDs, must be a valid entrez database
-        :param id: UID list, limited to 200
+        :param id: UID list, limited to 200 in xml, requested by chunks of 200 in text
         :param kwargs: rettype, could be fasta, summar
         """
         _valid_opt_param = ['query_key', 'WebEnv', 'retmode', 'rettype', 'retstart', 'retmax', 'strand', 'seq_start',
@@ -230,7 +248,11 @@ class EUtils(REST):
                 else:
                     raise ValueError("invalid complexity. must be a number in 0,1,2,3,4")
                 params[key] = value
-        res = self.http_get(url, frmt=retmode, params=params)
+        if retmode == 'text':
+            res = self._get_by_ids(url, self._split_ids(id), params, frmt=retmode)
+        else:
+            self._check_ids(id)
+            res = self.http_get(url, frmt=retmode, params=params)
         return res
 
     def ELink(self, db, dbfrom, cmd, id, **kwargs):
@@ -9,7 +9,6 @@ __status__ = "Production"
 
 from collections import OrderedDict
 import logging
-import pandas as pd
 
 log = logging.getLogger(__name__)
 
@@ -88,6 +87,7 @@ class MultiFASTA(object):
                             str(f.accession))
 
     def _get_df(self):
+        import pandas as pd
         df = pd.concat([self.fasta[id_].df for id_ in self.fasta.keys()])
         df.reset_index(inplace=True)
         return df
@@ -176,6 +176,7 @@ class FASTA(object):
     name = property(_get_name_sp)
 
     def _get_df(self):
+        import pandas as pd
         df = pd.DataFrame({
             "Identifiers": [self.identifier],
             "Accession": [self.accession],
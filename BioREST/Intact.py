@@ -34,7 +34,7 @@ class Intact(REST):
         """
         super(Intact, self).__init__(name="Intact", url=Intact._url)
 
-    def search(self, query, frmt='json', facets=None, number=None, filters=None):
+    def search(self, query, frmt='json', facets=None, number=None, filters=None, first=None):
         """
         Search for a complex inside intact complex.
 
@@ -42,8 +42,9 @@ class Intact(REST):
         :param frmt: Defaults to json (could be a Pandas data frame if
             Pandas is installed; set frmt to 'pandas')
         :param facets: lists of facets as a string (separated by comma)
-        :param number:
+        :param number: number of results
         :param filters: list of filters.
+        :param first: offset of the first result
 
 
             s = Intact()
@@ -95,7 +96,7 @@ class Intact(REST):
 
         # note that code format to be json, which is the only option so
         # we can use pandas as a frmt without addition code.
-        params = {'format': 'json', 'facets': facets, 'first': None, 'number': number, 'filters': filters}
+        params = {'format': 'json', 'facets': facets, 'first': first, 'number': number, 'filters': filters}
 
         result = self.http_get('search/' + query, frmt="json", params=params)
 
@@ -109,6 +110,26 @@ class Intact(REST):
         else:
             return result
 
+    def iter_search(self, query, facets=None, filters=None, page_size=100, limit=None, concurrency=1):
+        """
+        Iterate over all the complexes matching a search, pages of results (first/number) are requested lazily
+
+            for complex in s.iter_search('*', filters='species_f:("Homo sapiens")', concurrency=4):
+                ...
+
+        :param query: the query (e.g., ndc80)
+        :param facets: lists of facets as a string (separated by comma)
+        :param filters: list of filters.
+        :param page_size: number of results by request
+        :param limit: maximum number of results, None for all
+        :param concurrency: number of pages requested in parallel once the number of results is known (first page)
+        :return: generator of complexes (dict)
+        """
+        return self.paginate(lambda offset, size: self.search(query, facets=facets, filters=filters, first=offset,
+                                                               number=size), page_size,
+                             records=lambda res: res['elements'], limit=limit,
+                             total=lambda res: res.get('totalNumberOfResults'), concurrency=concurrency)
+
     def details(self, query):
         """Return details about a complex
 
@@ -48,10 +48,20 @@ __maintainer__ = "Arnaud KOPP"
 __email__ = "kopp.arnaud@gmail.com"
 __status__ = "Production"
 
+import io
+import os
+import re
+import gzip
+import time
+import functools
+import itertools
+import sqlite3
+import threading
 import webbrowser
 import collections
+import concurrent.futures
 import logging
-from BioREST.Service import REST
+from BioREST.Service import REST, RestServiceError, chunked
 
 log = logging.getLogger(__name__)
 
@@ -64,7 +74,11 @@ class KEGG(REST):
     are partially accesible. All dbentries can be parsed into dictionaries using
     the :class:`KEGGParser`
 
+    With a :class:`KEGGMirror` set as :attr:`mirror`, list, link and conv queries covered by the mirror are answered
+    locally.
     """
+    # maximum number of entries of a get request (KEGG restriction)
+    _max_get_entries = 10
 
     def __init__(self):
         super(KEGG, self).__init__(name="KEGG", url="http://rest.kegg.jp")
@@ -79,6 +93,7 @@ class KEGG(REST):
         self._reaction = None
         self._brite = None
         self._buffer = {}
+        self.mirror = None
 
     def __getattr__(self, req):
         if req.endswith("Ids"):
@@ -124,6 +139,33 @@ class KEGG(REST):
         else:
             return False
 
+    def _get_txt(self, url):
+        """
+        Text of a list/link/conv query, from the mirror when it can answer
+        :param url: KEGG REST path
+        """
+        if self.mirror is not None:
+            res = self.mirror.lookup(url)
+            if res is not None:
+                return res
+        return self.http_get(url, frmt="txt")
+
+    def use_mirror(self, path=None, organisms=None, sync=True, **kargs):
+        """
+        Answer list, link and conv queries from a local mirror
+        :param path: sqlite file of the mirror, see :class:`KEGGMirror`
+        :param organisms: organisms mirrored, default to :attr:`organism` if set
+        :param sync: sync the mirror with the current KEGG release
+        :param kargs: other :class:`KEGGMirror` parameters
+        :return: the mirror
+        """
+        if organisms is None:
+            organisms = [self._organism] if self._organism else []
+        self.mirror = KEGGMirror(path, organisms=organisms, **kargs)
+        if sync:
+            self.mirror.sync(self)
+        return self.mirror
+
     def info(self, query="kegg"):
         """
         Display current statistics of given database or organism
@@ -188,7 +230,7 @@ class KEGG(REST):
                 'module', you provided %s""" % query)
             url += "/" + organism
 
-        res = self.http_get(url, "txt")
+        res = self._get_txt(url)
         return res
 
     def find(self, database, query, option=None):
@@ -240,6 +282,7 @@ class KEGG(REST):
         :param option: aaseq, ntseq, mol, kcf, image, kgml
 
         .note:: The input is limited up to 10 entries (KEGG restriction).
+        Use :meth:`get_many` for more entries.
         """
 
         _valid_options = ["aaseq", "ntseq", "mol", "kcf", "image", "kgml"]
@@ -254,6 +297,102 @@ class KEGG(REST):
         res = self.http_get(url, frmt="txt")
         return res
 
+    def get_many(self, dbentries, option=None, concurrency=None):
+        """
+        Retrieves any number of database entries
+        Entries are packed into requests of 10 entries, sent concurrently within the KEGG rate limit, and the
+        responses are split by record.
+
+        for dbentry, res in k.get_many(["hsa:7535", "hsa:1956"]):
+            KEGGParser2(res)
+
+        :param dbentries: iterable of KEGG database entries, or a string of entries joined by + (see :meth:`get`)
+        :param option: aaseq, ntseq, mol, kcf, image, kgml (image and kgml entries are requested one by one)
+        :param concurrency: maximum number of requests in flight, default to :attr:`CONCURRENCY`
+        :return: generator of (dbentry, text) in the order of dbentries, text is None for entries not found
+        """
+        if isinstance(dbentries, str):
+            # a single string would be chunked character by character
+            dbentries = [x for x in dbentries.split("+") if x]
+        size = 1 if option in ["image", "kgml"] else self._max_get_entries
+        concurrency = concurrency or self.CONCURRENCY
+        batches = chunked(dbentries, size)
+        while True:
+            # a window of batches at a time, results are yielded while memory stays bounded
+            window = list(itertools.islice(batches, concurrency * 4))
+            if not window:
+                return
+            calls = [functools.partial(self._get_batch, batch, option) for batch in window]
+            for batch, records in zip(window, self._run_sync(self.gather(calls, concurrency=concurrency))):
+                for dbentry, record in zip(batch, records):
+                    yield dbentry, record
+
+    def _get_batch(self, batch, option=None):
+        url = "get/" + "+".join(batch)
+        if option:
+            url += "/" + option
+        try:
+            res = self.http_get(url, frmt="txt")
+        except RestServiceError as err:
+            # none of the entries found
+            if err.status == 404:
+                return [None] * len(batch)
+            raise
+        if len(batch) == 1:
+            return [res]
+        records = self._split_records(res, option)
+        found = [None] * len(batch)
+        keys = [self._dbentry_key(x, option) for x in batch]
+        # records come in the order of the request, entries not found are missing
+        i = 0
+        for record in records:
+            key = self._record_key(record, option)
+            while i < len(batch) and keys[i] != key:
+                i += 1
+            if key is None or i == len(batch):
+                break
+            found[i] = record
+            i += 1
+        else:
+            return found
+        if len(records) == len(batch):
+            return records
+        log.debug("Could not match the records of %s, entries requested one by one" % url)
+        return [self._get_batch([x], option)[0] for x in batch]
+
+    @staticmethod
+    def _split_records(res, option=None):
+        if option in ["aaseq", "ntseq"]:
+            return [">" + x for x in res.split("\n>") if x.strip(">").strip()]
+        end = "$$$$" if option == "mol" else "///"
+        records = []
+        record = []
+        for line in res.splitlines(True):
+            record.append(line)
+            if line.rstrip() == end:
+                records.append("".join(record))
+                record = []
+        if "".join(record).strip():
+            records.append("".join(record))
+        return records
+
+    @staticmethod
+    def _dbentry_key(dbentry, option=None):
+        if option in ["aaseq", "ntseq"]:
+            return dbentry.lower()
+        return dbentry.split(":", 1)[-1].lower()
+
+    @staticmethod
+    def _record_key(record, option=None):
+        if option in ["aaseq", "ntseq"]:
+            return record[1:].split(None, 1)[0].lower() if len(record) > 1 else None
+        if option is None or option == "kcf":
+            fields = record.split("\n", 1)[0].split()
+            if len(fields) > 1 and fields[0] == "ENTRY":
+                # enzymes: ENTRY       EC 1.1.1.1
+                return (fields[2] if fields[1] == "EC" and len(fields) > 2 else fields[1]).lower()
+        return None
+
     def conv(self, target, source):
         """
         Convert KEGG identifiers to/from outside identifiers
@@ -289,7 +428,7 @@ class KEGG(REST):
             raise AttributeError("Invalid syntax, target must be a KEGG id or one of the allowed database")
 
         url = "conv/" + target + "/" + source
-        res = self.http_get(url, frmt="txt")
+        res = self._get_txt(url)
 
         try:
             t = [x.split("\t")[0] for x in res.strip().split("\n")]
@@ -316,7 +455,7 @@ class KEGG(REST):
             log.warning("[list] Not a database and not a orgID, hop for you that it's a valid ID.")
 
         url = "link/" + target + "/" + source
-        res = self.http_get(url, frmt="txt")
+        res = self._get_txt(url)
         return res
 
     @staticmethod
@@ -470,7 +609,7 @@ class KEGG(REST):
             return
 
         if self._pathway is None:
-            res = self.http_get("list/pathway/%s" % self.organism, frmt="txt")
+            res = self._get_txt("list/pathway/%s" % self.organism)
             orgs = [x.split()[0] for x in res.split("\n") if len(x)]
             self._pathway = orgs[:]
         return self._pathway
@@ -481,7 +620,7 @@ class KEGG(REST):
             return
 
         if self._module is None:
-            res = self.http_get("list/module/%s" % self.organism)
+            res = self._get_txt("list/module/%s" % self.organism)
             orgs = [x.split()[0] for x in res.split("\n") if len(x)]
             self._module = orgs[:]
         return self._module
@@ -597,6 +736,222 @@ class KEGG(REST):
         return txt
 
 
+class KEGGMirror(object):
+    """
+    Local mirror of the KEGG list, link and conv tables, stored in an indexed SQLite file
+    Tables are downloaded once and synced again only when the KEGG release changes. A KEGG instance with a mirror
+    answers list, link, conv (and the lookfor_* / *Ids helpers) from it with the same return types, whole tables as
+    well as queries on dbentries of the mirrored databases. Other queries go to the network.
+
+    m = KEGGMirror(organisms=["hsa", "mmu"])
+    k = KEGG()
+    k.mirror = m
+    m.sync(k)  # a few minutes the first time, a single info request when the release did not change
+    k.link("pathway", "hsa:7535")  # local
+    """
+    databases = ["organism", "pathway", "module", "ko", "compound", "glycan", "reaction", "enzyme", "drug",
+                 "disease", "brite"]
+    organism_links = ["pathway", "ko", "module", "enzyme"]
+    organism_convs = ["ncbi-geneid", "ncbi-proteinid", "uniprot"]
+    # database of dbentries prefixes
+    _prefixes = {'path': 'pathway', 'map': 'pathway', 'ko': 'ko', 'md': 'module', 'ec': 'enzyme', 'cpd': 'compound',
+                 'gl': 'glycan', 'rn': 'reaction', 'dr': 'drug', 'ds': 'disease', 'br': 'brite'}
+    _schema = """
+        CREATE TABLE IF NOT EXISTS tables (
+            name TEXT PRIMARY KEY,
+            release TEXT,
+            synced REAL,
+            rows INTEGER,
+            body TEXT);
+        CREATE TABLE IF NOT EXISTS entries (
+            tbl TEXT,
+            key TEXT,
+            line TEXT);
+        CREATE INDEX IF NOT EXISTS entries_key ON entries (key, tbl);
+        CREATE TABLE IF NOT EXISTS pairs (
+            tbl TEXT,
+            a TEXT,
+            b TEXT);
+        CREATE INDEX IF NOT EXISTS pairs_a ON pairs (a, tbl);
+        CREATE INDEX IF NOT EXISTS pairs_b ON pairs (b, tbl);
+    """
+
+    def __init__(self, path=None, organisms=None, databases=None, organism_links=None, organism_convs=None):
+        """
+        :param path: sqlite file, default to ~/.cache/BioREST/kegg.sqlite
+        :param organisms: list of organism codes whose genes, links and conversions are mirrored
+        :param databases: list of databases mirrored with list/<database>, default to :attr:`databases`
+        :param organism_links: databases linked to the organisms genes (link/<database>/<organism>)
+        :param organism_convs: outside databases converted from the organisms genes (conv/<organism>/<database>)
+        """
+        if path is None:
+            path = os.path.join(os.path.expanduser("~"), ".cache", "BioREST", "kegg.sqlite")
+        directory = os.path.dirname(path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.path = path
+        self.organisms = list(organisms or [])
+        self.databases = list(self.databases if databases is None else databases)
+        self.organism_links = list(self.organism_links if organism_links is None else organism_links)
+        self.organism_convs = list(self.organism_convs if organism_convs is None else organism_convs)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(self._schema)
+        self._names = set(x[0] for x in self._conn.execute("SELECT name FROM tables"))
+
+    def tables(self):
+        """
+        :return: list of the tables (KEGG REST paths) of the mirror configuration
+        """
+        names = ["list/%s" % db for db in self.databases]
+        for org in self.organisms:
+            names.append("list/%s" % org)
+            names.append("list/pathway/%s" % org)
+            names.extend("link/%s/%s" % (db, org) for db in self.organism_links)
+            names.extend("conv/%s/%s" % (db, org) for db in self.organism_convs)
+        return names
+
+    @staticmethod
+    def release(kegg):
+        """
+        Current KEGG release
+        :param kegg: KEGG instance
+        :return: release string (e.g. 77.0+/03-21, Mar 16)
+        """
+        info = kegg.http_get("info/kegg", frmt="txt", cache=False)
+        match = re.search(r"Release\s+(.+)", info)
+        return match.group(1).strip() if match else info.strip()
+
+    def sync(self, kegg=None, force=False):
+        """
+        Download the tables of the mirror that are missing or from another KEGG release
+        :param kegg: KEGG instance used to download the tables, default to a new one
+        :param force: download all the tables again
+        :return: list of the synced tables
+        """
+        kegg = kegg or KEGG()
+        release = self.release(kegg)
+        with self._lock:
+            current = dict(self._conn.execute("SELECT name, release FROM tables"))
+        names = [x for x in self.tables() if force or current.get(x) != release]
+        if not names:
+            log.info("KEGG mirror is up to date (release %s)" % release)
+            return []
+        log.info("Syncing %s KEGG tables (release %s)" % (len(names), release))
+        # tables are downloaded concurrently within the KEGG rate limit, by groups to bound memory
+        step = kegg.CONCURRENCY
+        for i in range(0, len(names), step):
+            group = names[i:i + step]
+            bodies = kegg.http_get(group, frmt="txt", cache=False)
+            for name, body in zip(group, bodies):
+                self._store(name, body, release)
+        return names
+
+    def _store(self, name, body, release):
+        rows = [line.split("\t", 1) for line in body.split("\n") if line]
+        with self._lock:
+            with self._conn:
+                self._conn.execute("DELETE FROM entries WHERE tbl = ?", (name,))
+                self._conn.execute("DELETE FROM pairs WHERE tbl = ?", (name,))
+                if name.startswith("list/"):
+                    self._conn.executemany("INSERT INTO entries VALUES (?, ?, ?)",
+                                           ((name, row[0], "\t".join(row)) for row in rows))
+                else:
+                    self._conn.executemany("INSERT INTO pairs VALUES (?, ?, ?)",
+                                           ((name, row[0], row[1] if len(row) > 1 else None) for row in rows))
+                self._conn.execute("INSERT OR REPLACE INTO tables VALUES (?, ?, ?, ?, ?)",
+                                   (name, release, time.time(), len(rows), body))
+            self._names.add(name)
+        log.debug("KEGG mirror: %s stored (%s rows)" % (name, len(rows)))
+
+    def _database(self, entry):
+        prefix = entry.split(":", 1)[0]
+        return self._prefixes.get(prefix, prefix)
+
+    def lookup(self, query):
+        """
+        Answer a KEGG REST query from the mirror
+        :param query: KEGG REST path (e.g. list/pathway/hsa, link/pathway/hsa:7535+hsa:1956)
+        :return: text as returned by KEGG, None if the mirror can't answer
+        """
+        query = query.strip("/")
+        if query in self._names:
+            with self._lock:
+                row = self._conn.execute("SELECT body FROM tables WHERE name = ?", (query,)).fetchone()
+            return row[0] if row is not None else None
+        parts = query.split("/")
+        if len(parts) == 2 and parts[0] == "list":
+            return self._lookup_list(parts[1].split("+"))
+        if len(parts) == 3 and parts[0] in ("link", "conv"):
+            if "%s/%s/%s" % (parts[0], parts[2], parts[1]) in self._names:
+                return self._swapped(query)
+            return self._lookup_pairs(parts[0], parts[1], parts[2].split("+"))
+        return None
+
+    def _swapped(self, query):
+        operation, target, source = query.split("/")
+        with self._lock:
+            rows = self._conn.execute("SELECT b, a FROM pairs WHERE tbl = ?",
+                                      ("%s/%s/%s" % (operation, source, target),)).fetchall()
+        return "".join("%s\t%s\n" % row for row in rows)
+
+    def _lookup_list(self, entries):
+        lines = []
+        with self._lock:
+            for entry in entries:
+                tbl = "list/%s" % self._database(entry)
+                if ":" not in entry or tbl not in self._names:
+                    return None
+                row = self._conn.execute("SELECT line FROM entries WHERE key = ? AND tbl = ?", (entry, tbl)).fetchone()
+                if row is None:
+                    return None
+                lines.append(row[0])
+        return "\n".join(lines) + "\n"
+
+    def _lookup_pairs(self, operation, target, entries):
+        lines = []
+        with self._lock:
+            for entry in entries:
+                if ":" not in entry:
+                    return None
+                db = self._database(entry)
+                direct, swapped = "%s/%s/%s" % (operation, target, db), "%s/%s/%s" % (operation, db, target)
+                if direct in self._names:
+                    rows = self._conn.execute("SELECT a, b FROM pairs WHERE a = ? AND tbl = ?", (entry, direct))
+                elif swapped in self._names:
+                    rows = self._conn.execute("SELECT b, a FROM pairs WHERE b = ? AND tbl = ?", (entry, swapped))
+                else:
+                    return None
+                lines.extend("%s\t%s\n" % row for row in rows)
+        return "".join(lines)
+
+    def status(self):
+        """
+        :return: list of dict with name, release, synced time and number of rows of the mirrored tables
+        """
+        with self._lock:
+            rows = self._conn.execute("SELECT name, release, synced, rows FROM tables ORDER BY name").fetchall()
+        return [{'name': x[0], 'release': x[1], 'synced': x[2], 'rows': x[3]} for x in rows]
+
+    def clear(self):
+        """
+        Drop all the mirrored tables
+        """
+        with self._lock:
+            with self._conn:
+                for table in ("tables", "entries", "pairs"):
+                    self._conn.execute("DELETE FROM %s" % table)
+            self._names.clear()
+
+    def close(self):
+        """
+        Close the sqlite connection
+        """
+        with self._lock:
+            self._conn.close()
+
+
 def KEGGParser(res):
     """
     A dispatcher to parse all outputs returned by :meth:`KEGG.get`
@@ -635,294 +990,335 @@ def KEGGParser(res):
             output[last_idx] = [line[10:].strip()]
     return output
 
-def KEGGParser2(res):
-
-    def _parse(res):
-
-        if res == 404:
-            return
-        keys = [x.split(" ")[0] for x in res.split("\n") if len(x) and x[0]!=" "
-                and x!="///"]
-        # let us go line by to not forget anything and know which entries are
-        # found in the RHS. We may have duplicated once as can be found in th
-        # keys variable as well.
-        entries = []
-        entry = ""
-        start = True
-        for line in res.split("\n"):
-            if line == '///':
-                entries.append(entry)
-            elif len(line) == 0:
-                pass
-            elif line[0] != " ":
-                if start == True:
-                    start = False
-                else:
-                    entries.append(entry)
-                entry = line[:]
-            else:
-                entry+= "\n"+line[:]
-
-        # we can now look at each entry and create a dictionary.
-        # The dictionary will contain as key the name found in the LHS
-        # e.g., REACTION and the value will be either the entry content
-        # as a string or a list of strings if the key is not unique
-        # e.g., for references. This could be a bit annoying since
-        # for example References could appear only once if some cases.
-        # This can be tested though by checking the type
-        import collections
-        output = collections.OrderedDict()
-        for entry in entries:
-            name = entry.split("\n")[0].split()[0]
-            if keys.count(name) == 1:
-                output[name] = entry[:]
+def _kegg_sections(res):
+    """
+    Split a KEGG record in sections, a section starts with a keyword in the first column
+    :return: list of the sections text and Counter of the keywords
+    """
+    sections = []
+    counts = collections.Counter()
+    section = [""]
+    start = True
+    for line in res.split("\n"):
+        if line == "///":
+            sections.append("\n".join(section))
+        elif not line:
+            pass
+        elif line[0] != " ":
+            counts[line.split(" ", 1)[0]] += 1
+            if start:
+                start = False
             else:
-                if name in output.keys():
-                    output[name].append(entry[:])
-                else:
-                    output[name] = [entry[:]]
-
-        # remove name that are now the keys of the dictionary anyway
-        # if the values is not a list
-        for k,v in output.items():
-            if k in ['CHROMOSOME', 'TAXONOMY']:
-                continue
+                sections.append("\n".join(section))
+            section = [line]
+        else:
+            section.append(line)
+    return sections, counts
+
+
+def _kegg_line(key, value):
+    # single line (string)
+    if "\n" in value:
+        # happens in description path:hsa04915
+        log.debug("Multiline value in %s" % key)
+        value = value.replace("\n", " ")
+    return value.strip()
+
+
+def _kegg_lines(key, value):
+    # set of lines, COMMENT is sometimes on several lines
+    return [x.strip() for x in value.split("\n")]
+
+
+def _kegg_pairs(key, value):
+    # one identifier and its content by line
+    kp = {}
+    for line in value.split("\n"):
+        try:  # empty orthology in rc:RC00004
+            k, v = line.strip().split(None, 1)
+        except ValueError:
+            log.warning("empty line in %s %s" % (key, line))
+            k = line.strip()
+            v = ''
+        if k.endswith(":"):
+            k = k.rstrip(":")
+        kp[k] = v
+    return kp
+
+
+def _kegg_items(key, value):
+    # RPAIR/rn:R00005 is a dict if "_" found, REACTION/md:hsa_M00554 is a dict if '->' found
+    if '->' in value or "_" in value:
+        kp = {}
+        for line in value.split("\n"):
             try:
-                output[k] = output[k].strip().replace(k,'',1) # remove the name that
-            except: # skip the lists
-                pass
+                k, v = line.strip().split(None, 1)
+            except ValueError:
+                log.warning("empty line in %s %s" % (key, line))
+                k = line.strip()
+                v = ''
+            kp[k] = v
+        return kp
+    return value.split()
 
-        # Now, let us do the real stuff.
-        # This is tricky since format is not consistent with the names e,g
-        # REACTIONS could be sometimes a list of names and sometimes list
-        # of reactions with their description.
-
-        for key, value in output.items():
-            # convert to a dict
-            if key == 'STATISTICS':
-                data = [x.split(":",1) for x in output[key].split("\n")]
-                data = dict([(x[0].strip(), float(x[1].strip())) for x in data])
-                output[key] = data
-            # strip only expecting a single line (string)
-            elif key in ['POSITION', 'DESCRIPTION', 'ENTRY', 'ORGANISM',
-                    'CLASS', 'FORMULA', 'KEYWORDS', 'CATEGORY', 'ANNOTATION',
-                    'DATA_SOURCE', 'MASS', 'COMPOSITION', 'DEFINITION',
-                    'KO_PATHWAY', 'EQUATION', 'TYPE', 'RCLASS']:
-                # get rid of \n
-
-                if "\n" in value:
-                    # happens in description path:hsa04915
-                    print("warning for debugging in %s" % key)
-                    value = value.replace("\n", " ")
-                # nothing to do here except strip
-                output[key] = value.strip()
-            # list : set of lines
-            # COMMENT is sometimes on several lines
-            elif key in ['NAME', 'REMARK', 'ACTIVITY', 'COMMENT', 'ORIGINAL_DB']:
-                output[key] = [x.strip() for x in value.split("\n")]
-            # list: long string splitted into items and therefore converted to a list
-            elif key in ['ENZYME', 'REACTION',  'RPAIR', 'RELATEDPAIR']:
-                # RPAIR/rn:R00005 should be a dict if "_" found
-                # REACTION/md:hsa_M00554 should be a dict if '->' found
-                if '->' in value or "_" in value:
-                    kp = {}
-                    for line in value.split("\n"):
-                        try:
-                            k,v = line.strip().split(None,1)
-                        except:
-                            self.warning("empty line in %s %s" % (key, line))
-                            k = line.strip()
-                            v = ''
-                        kp[k] = v
-                    output[key] = kp.copy()
-                else:
-                    output[key] = [x.strip() for x in value.split()]
-            # transform to dictionary
-            elif key in ['DRUG', 'ORTHOLOGY', 'GENE', 'COMPOUND', 'RMODULE',
-                    'DISEASE', 'PATHWAY_MAP',
-                    'STR_MAP', 'PATHWAY', 'MODULE', 'GENES']:
-                kp = {}
-                for line in value.split("\n"):
-                    try: # empty orthology in rc:RC00004
-                        k,v = line.strip().split(None,1)
-                    except:
-                        log.warning("empty line in %s %s" % (key, line))
-                        k = line.strip()
-                        v = ''
-                    if k.endswith(":"):
-                        k = k.strip().rstrip(":")
-                    kp[k] = v
-                output[key] = kp.copy()
-            # list of dictionaries
-            elif key == 'REFERENCE':
-                # transform to a list since you may have several entries
-                newvalue = [_interpret_references(this)
-                        for this in _tolist(value)]
-                output[key] = newvalue
-            # list of dictionaries
-            elif key == 'PLASMID':
-                newvalue = [_interpret_plasmid(this)
-                        for this in _tolist(value)]
-                output[key] = newvalue
-            # list of dictionaries
-            elif key == 'CHROMOSOME':
-                newvalue = [_interpret_chromosome(this)
-                    for this in _tolist(value)]
-                output[key] = newvalue
-            # list of dictionaries
-            elif key == 'TAXONOMY':
-                newvalue = [_interpret_taxonomy(this)
-                    for this in _tolist(value)]
-                output[key] = newvalue
-
-            # dictionary, interpreted as follows
-            # on each line, there is an identifier followed by : character
-            # looks like there is just one line...
-            elif key in ['DRUG_TARGET', 'STRUCTURE', 'MOTIF']:
-                # STRUCTURE PDB can be long and span over several lines. e.g.,
-                # hsa:1525
-                new = {}
-                import re
-                value = re.sub("\n {6,20}", " ", value)
-                for line in value.split("\n"):
-                    thiskey, content = line.split(None, 1)
-                    if thiskey.endswith(":"):
-                        new[thiskey[:-1]] = content
-                    else:
-                        log.warning("Could not fully interpret %s " % key )
-                output[key] = new
-            elif key in ['DBLINKS', 'INTERACTION', 'METABOLISM']:
-                # D01441 for metabolism
-                # DBLINKS for C00624 should work out of the box
-                new = {}
-                import re
-                value = re.sub("\n {12,12+1}", "\n", value)
-                for line in value.split("\n"):
-                    thiskey, content = line.strip().split(":", 1)
-                    new[thiskey] = content.strip()
-                output[key] = new
-            # floats
-            elif key in ['EXACT_MASS', 'MOL_WEIGHT']:
-                output[key] = float(value)
-            # get rid of the length
-            elif key in ['AASEQ', 'NTSEQ']:
-                output[key] = value.split("\n", 1)[1].replace("\n","").replace(" ", "")
-            elif key.startswith("ENTRY"):
-                newvalue = _interpret_entry(value)
-                output[key] = newvalue.strip()
-            # extract list of strings from structure. These strings are not
-            # interpreted
-            elif key in ['ATOM', 'BOND', 'NODE', 'EDGE', 'ALIGN', 'RDM']:
-                # starts with a number that defines number of entries. Let us
-                # get rid of that number and then send a list
-                output[key] = _interpret_enumeration(output[key])
-            # not interpreted
-            elif key in ['BRACKET', 'COMPONENT', 'SOURCE', 'BRITE',
-                    'CARCINOGEN', 'MARKER', 'PRODUCT']: # do not interpret to keep structure
-                pass
-            else:
-                print("""\nWarning. Found keyword %s, which has not special parsing for now. please report this issue with the identifier (%s) into github.com/bioservices""" % (key,output['ENTRY']))
 
-        return output
+def _kegg_statistics(key, value):
+    data = [x.split(":", 1) for x in value.split("\n")]
+    return dict([(x[0].strip(), float(x[1].strip())) for x in data])
 
-    def _interpret_enumeration(data):
-        N = data.strip().split("\n")[0]
-        # must be a number
-        N = int(N)
-        lines = data.strip().split("\n")[1:]
-        lines = [line.strip() for line in lines]
-        if len(lines) != N:
-            self.warning('number of lines not as expected in %s' % data)
 
-        if N == 0:
-            return []
+_kegg_continuation = re.compile("\n {6,20}")
+
+
+def _kegg_colon_keys(key, value):
+    # an identifier followed by : on each line, STRUCTURE PDB can span over several lines (e.g. hsa:1525)
+    new = {}
+    for line in _kegg_continuation.sub(" ", value).split("\n"):
+        thiskey, content = line.split(None, 1)
+        if thiskey.endswith(":"):
+            new[thiskey[:-1]] = content
         else:
-            return lines
+            log.warning("Could not fully interpret %s " % key)
+    return new
 
-    def _tolist(value):
-        # transform to a list since you may have several entries
-        if isinstance(value, list) is False:
-            value = [value]
-        return value
 
-    def _interpret_entry(data):
-        res = {}
+def _kegg_links(key, value):
+    # D01441 for metabolism, DBLINKS for C00624
+    new = {}
+    for line in value.split("\n"):
+        thiskey, content = line.strip().split(":", 1)
+        new[thiskey] = content.strip()
+    return new
 
-        return res
-        for this in data.split("\n"):
-            if this.strip().startswith("ENTRY"):
-                pass
-            elif this.strip().startswith("COMPOUND"):
-                res['COMPOUND'] = this.strip().split(None,1)[1]
-            elif this.strip().startswith("ATOM"):
-                res['AUTHORS'] = this.strip().split(None,1)[1]
-            elif this.strip().startswith("TITLE"):
-                res['TITLE'] = this.strip().split(None,1)[1]
-        return res
 
-    def _interpret_taxonomy(data):
-        res = {}
-        for this in data.split("\n"):
-            if this.strip().startswith("TAXONOMY"):
-                res['TAXONOMY'] = this.strip()
-            elif this.strip().startswith('LINEAGE'):
-                res['LINEAGE'] = this.strip().split(None,1)[1]
-        return res
+def _kegg_float(key, value):
+    return float(value)
 
-    def _interpret_references(data):
-        res = {}
-        for this in data.split("\n"):
-            if this.strip().startswith("REFERENCE"):
-                res['REFERENCE'] = this.strip().split(None,1)[1]
-            elif this.strip().startswith("JOURNAL"):
-                res['JOURNAL'] = this.strip().split(None,1)[1]
-            elif this.strip().startswith("AUTHORS"):
-                res['AUTHORS'] = this.strip().split(None,1)[1]
-            elif this.strip().startswith("TITLE"):
-                res['TITLE'] = this.strip().split(None,1)[1]
-        return res
 
-    def _interpret_plasmid(data):
-        res = {}
-        for this in data.split("\n"):
-            if this.strip().startswith("PLASMID"):
-                res['PLASMID'] = this.strip().split(None,1)[1]
-            elif this.strip().startswith("LENGTH"):
-                res['LENGTH'] = this.strip().split(None,1)[1]
-            elif this.strip().startswith("SEQUENCE"):
-                res['SEQUENCE'] = this.strip().split(None,1)[1]
-        return res
+def _kegg_sequence(key, value):
+    # get rid of the length
+    return value.split("\n", 1)[1].replace("\n", "").replace(" ", "")
+
+
+def _kegg_enumeration(key, value):
+    # starts with the number of lines, followed by the lines (not interpreted)
+    lines = value.strip().split("\n")
+    n = int(lines[0])
+    lines = [line.strip() for line in lines[1:]]
+    if len(lines) != n:
+        log.warning('number of lines not as expected in %s' % value)
+    return lines if n else []
+
 
-    def _interpret_chromosome(data):
+def _kegg_fields(*names):
+    # fields of the lines of a (possibly repeated) section, e.g. REFERENCE/JOURNAL/AUTHORS/TITLE
+    def _interpret(data):
         res = {}
         for this in data.split("\n"):
-            if this.strip().startswith("CHROMOSOME"):
-                try:
-                    res['CHROMOSOME'] = this.strip().split(None,1)[1]
-                except:
-                    #genome:T00012 has no name
-                    res['CHROMOSOME'] = this.strip()
-            elif this.strip().startswith("LENGTH"):
-                res['LENGTH'] = this.strip().split(None,1)[1]
-            elif this.strip().startswith("SEQUENCE"):
-                res['SEQUENCE'] = this.strip().split(None,1)[1]
+            this = this.strip()
+            for name in names:
+                if this.startswith(name):
+                    try:
+                        res[name] = this.split(None, 1)[1]
+                    except IndexError:
+                        # genome:T00012 has no name
+                        if name != 'CHROMOSOME':
+                            raise
+                        res[name] = this
+                    break
         return res
 
-    entry = res.split("\n")[0].split()[0]
+    def _parse(key, value):
+        # a list since there may be several entries
+        return [_interpret(this) for this in (value if isinstance(value, list) else [value])]
+
+    return _parse
+
+
+def _kegg_taxonomy(data):
+    res = {}
+    for this in data.split("\n"):
+        if this.strip().startswith("TAXONOMY"):
+            res['TAXONOMY'] = this.strip()
+        elif this.strip().startswith('LINEAGE'):
+            res['LINEAGE'] = this.strip().split(None, 1)[1]
+    return res
+
+
+def _kegg_keep(key, value):
+    # not interpreted, to keep the structure
+    return value
+
+
+_kegg_dispatch = {'STATISTICS': _kegg_statistics,
+                  'REFERENCE': _kegg_fields('REFERENCE', 'JOURNAL', 'AUTHORS', 'TITLE'),
+                  'PLASMID': _kegg_fields('PLASMID', 'LENGTH', 'SEQUENCE'),
+                  'CHROMOSOME': _kegg_fields('CHROMOSOME', 'LENGTH', 'SEQUENCE'),
+                  'TAXONOMY': lambda key, value: [_kegg_taxonomy(this) for this in
+                                                  (value if isinstance(value, list) else [value])]}
+_kegg_dispatch.update(dict.fromkeys(['POSITION', 'DESCRIPTION', 'ENTRY', 'ORGANISM', 'CLASS', 'FORMULA', 'KEYWORDS',
+                                     'CATEGORY', 'ANNOTATION', 'DATA_SOURCE', 'MASS', 'COMPOSITION', 'DEFINITION',
+                                     'KO_PATHWAY', 'EQUATION', 'TYPE', 'RCLASS'], _kegg_line))
+_kegg_dispatch.update(dict.fromkeys(['NAME', 'REMARK', 'ACTIVITY', 'COMMENT', 'ORIGINAL_DB'], _kegg_lines))
+_kegg_dispatch.update(dict.fromkeys(['ENZYME', 'REACTION', 'RPAIR', 'RELATEDPAIR'], _kegg_items))
+_kegg_dispatch.update(dict.fromkeys(['DRUG', 'ORTHOLOGY', 'GENE', 'COMPOUND', 'RMODULE', 'DISEASE', 'PATHWAY_MAP',
+                                     'STR_MAP', 'PATHWAY', 'MODULE', 'GENES'], _kegg_pairs))
+_kegg_dispatch.update(dict.fromkeys(['DRUG_TARGET', 'STRUCTURE', 'MOTIF'], _kegg_colon_keys))
+_kegg_dispatch.update(dict.fromkeys(['DBLINKS', 'INTERACTION', 'METABOLISM'], _kegg_links))
+_kegg_dispatch.update(dict.fromkeys(['EXACT_MASS', 'MOL_WEIGHT'], _kegg_float))
+_kegg_dispatch.update(dict.fromkeys(['AASEQ', 'NTSEQ'], _kegg_sequence))
+_kegg_dispatch.update(dict.fromkeys(['ATOM', 'BOND', 'NODE', 'EDGE', 'ALIGN', 'RDM'], _kegg_enumeration))
+_kegg_dispatch.update(dict.fromkeys(['BRACKET', 'COMPONENT', 'SOURCE', 'BRITE', 'CARCINOGEN', 'MARKER', 'PRODUCT'],
+                                    _kegg_keep))
+
+
+def _kegg_parse(res):
+    sections, counts = _kegg_sections(res)
+    # The dictionary contains as key the name found in the LHS (e.g. REACTION) and the value is either the section
+    # content as a string or a list of strings if the key is not unique (e.g. references).
+    output = collections.OrderedDict()
+    for section in sections:
+        name = section.split("\n", 1)[0].split()[0]
+        if counts[name] == 1:
+            output[name] = section
+        elif name in output:
+            output[name].append(section)
+        else:
+            output[name] = [section]
+
+    for key, value in output.items():
+        # remove the name from the single sections
+        if isinstance(value, str) and key not in ('CHROMOSOME', 'TAXONOMY'):
+            value = value.strip().replace(key, '', 1)
+        func = _kegg_dispatch.get(key)
+        if func is None:
+            log.warning("Found keyword %s, which has not special parsing for now (%s)" % (key, output['ENTRY']))
+        else:
+            value = func(key, value)
+        output[key] = value
+    return output
+
+
+def KEGGParser2(res):
+    """
+    Parse an entry returned by :meth:`KEGG.get` into a dictionary, sections are interpreted according to their
+    keyword (see :data:`_kegg_dispatch`)
+    :param str res: output of a KEGG.get
+    :return: a dictionary, or res if it could not be parsed
+    """
+    entry = res.split("\n", 1)[0].split()[0]
     if entry == "ENTRY":
-        dbentry = res.split("\n")[0].split(None, 2)[2]
+        dbentry = res.split("\n", 1)[0].split(None, 2)[2]
     else:
-        dbentry='?'
         raise ValueError
 
     try:
-        parser = _parse(res)
+        parser = _kegg_parse(res)
     except Exception as err:
         log.warning("Could not parse the entry %s correctly" % dbentry)
         log.warning(err)
         parser = res
     return parser
 
+
+def iter_kegg_records(source):
+    """
+    Split a KEGG flat file or a multi entries response into records, in constant memory
+    :param source: file name (gzipped if it ends with .gz), file like object, str/bytes document or iterable of lines
+        (e.g. the iterator returned by http_get(..., stream=True))
+    :return: iterator of the records text, as returned by :meth:`KEGG.get` (ending with ///)
+    """
+    opened = None
+    if isinstance(source, bytes):
+        source = source.decode("utf-8", "replace")
+    if isinstance(source, str):
+        if "\n" in source:
+            source = io.StringIO(source)
+        else:
+            source = opened = (gzip.open if source.endswith(".gz") else open)(source, "rt")
+    try:
+        record = []
+        for line in source:
+            if isinstance(line, bytes):
+                line = line.decode("utf-8", "replace")
+            line = line.rstrip("\r\n")
+            if line == "///":
+                if record:
+                    record.append(line)
+                    yield "\n".join(record) + "\n"
+                record = []
+            elif line or record:
+                record.append(line)
+        if any(x.strip() for x in record):
+            yield "\n".join(record) + "\n"
+    finally:
+        if opened is not None:
+            opened.close()
+
+
+def KEGGIterParser(source, parser=None, workers=1):
+    """
+    Parse a KEGG flat file (e.g. a whole genes catalogue) or a multi entries response record by record, in constant
+    memory
+
+    for entry in KEGGIterParser("T01001.ent.gz"):
+        entry['ENTRY'], entry['NAME']
+
+    :param source: see :func:`iter_kegg_records`
+    :param parser: callable parsing the text of one record, default to :func:`KEGGParser2`
+    :param workers: number of processes parsing the records, see :func:`parse_many`
+    :return: iterator of parsed records
+    """
+    return parse_many(iter_kegg_records(source), workers=workers, parser=parser)
+
+
+def _parse_chunk(parser, records):
+    return [parser(record) if record is not None else None for record in records]
+
+
+def parse_many(records, workers=1, chunk_size=256, parser=None):
+    """
+    Parse KEGG records, in a pool of processes for large inputs
+    Records are sent to the workers by chunks to amortise the inter process transfers, a bounded number of chunks
+    is in flight so records can come from a stream. Inputs of less than two chunks are parsed in process. None
+    records (entries not found by :meth:`KEGG.get_many`) give None, so results stay aligned with the entries.
+
+    for entry in parse_many(text for _, text in k.get_many(ids), workers=4):
+        if entry is not None:
+            entry['NAME']
+
+    :param records: iterable of records text (e.g. from :func:`iter_kegg_records` or :meth:`KEGG.get_many`)
+    :param workers: number of processes, None for the number of CPUs, 1 to parse in process
+    :param chunk_size: number of records by chunk
+    :param parser: callable parsing the text of one record, default to :func:`KEGGParser2`, must be picklable (a
+        module level function) when workers are used
+    :return: iterator of parsed records (None for None records), in the order of records
+    """
+    parser = parser or KEGGParser2
+    workers = workers or os.cpu_count() or 1
+    chunks = chunked(records, chunk_size)
+    first = list(itertools.islice(chunks, 2))
+    if workers < 2 or len(first) < 2:
+        # not worth starting processes
+        for chunk in itertools.chain(first, chunks):
+            for record in chunk:
+                yield parser(record) if record is not None else None
+        return
+    pool = concurrent.futures.ProcessPoolExecutor(max_workers=workers)
+    try:
+        pending = collections.deque()
+        for chunk in itertools.chain(first, chunks):
+            pending.append(pool.submit(_parse_chunk, parser, chunk))
+            if len(pending) >= workers * 2:
+                for res in pending.popleft().result():
+                    yield res
+        while pending:
+            for res in pending.popleft().result():
+                yield res
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
 class KEGGTools(KEGG):
     """Load all genes from the database.
     ::
@@ -943,8 +1339,11 @@ class KEGGTools(KEGG):
 
     def scan_genes(self):
         genes = {}
-        for i, gene in enumerate(self.genes):
-            genes[gene] = self.parser.parse(self.kegg.get(self.genes[i]))
+        for gene, res in self.kegg.get_many(self.genes):
+            if res is None:
+                log.warning("Entry %s not found" % gene)
+                continue
+            genes[gene] = self.parser.parse(res)
         return genes
 
     def load_reactions(self, organism):
@@ -954,6 +1353,9 @@ class KEGGTools(KEGG):
 
     def scan_reactions(self):
         reactions = {}
-        for i, this in enumerate(self.reactions):
-            reactions[this] = self.parser.parse(self.kegg.get(self.reactions[i]))
+        for this, res in self.kegg.get_many(self.reactions):
+            if res is None:
+                log.warning("Entry %s not found" % this)
+                continue
+            reactions[this] = self.parser.parse(res)
         return reactions
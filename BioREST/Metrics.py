@@ -0,0 +1,277 @@
+# coding=utf-8
+"""
+Metrics of REST services
+Every request updates the process wide registry :data:`metrics`: latency histograms by service and endpoint, bytes
+sent and received, status codes, retries, time waited for the rate limiter and cache hits. The registry can be read
+as a dict with snapshot() or exported in Prometheus text format, optionally from a local http endpoint.
+
+    from BioREST.Metrics import metrics
+    metrics.snapshot()['KEGG']['latency']['p95']
+    server = metrics.serve(port=9100)  # http://127.0.0.1:9100/metrics
+"""
+
+__author__ = "Arnaud KOPP"
+__copyright__ = "© 2015-2016 KOPP Arnaud All Rights Reserved"
+__credits__ = ["KOPP Arnaud"]
+__license__ = "GNU GPL V3.0"
+__maintainer__ = "Arnaud KOPP"
+__email__ = "kopp.arnaud@gmail.com"
+__status__ = "Production"
+
+import bisect
+import collections
+import threading
+import http.server
+import logging
+log = logging.getLogger(__name__)
+
+
+class Histogram(object):
+    """
+    Latency histogram with fixed buckets (for export) and a reservoir of the last samples (for percentiles)
+    Not thread safe, locking is done by the registry
+    """
+    buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1., 2.5, 5., 10., 30., 60.)
+
+    def __init__(self, reservoir=2048):
+        """
+        :param reservoir: number of last samples kept to compute percentiles
+        """
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.
+        self.count = 0
+        self._samples = collections.deque(maxlen=reservoir)
+
+    def observe(self, value):
+        """
+        Add a sample
+        :param value: seconds
+        """
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+        self._samples.append(value)
+
+    def percentile(self, q):
+        """
+        Percentile of the last samples
+        :param q: percentile between 0 and 100
+        :return: seconds or None if no sample
+        """
+        if not self._samples:
+            return None
+        data = sorted(self._samples)
+        return data[min(len(data) - 1, int(round(q / 100. * (len(data) - 1))))]
+
+    def summary(self):
+        """
+        :return: dict with count, sum, mean, p50, p95 and p99
+        """
+        return {'count': self.count, 'sum': self.sum, 'mean': self.sum / self.count if self.count else None,
+                'p50': self.percentile(50), 'p95': self.percentile(95), 'p99': self.percentile(99)}
+
+
+class _Stats(object):
+    def __init__(self):
+        self.latency = Histogram()
+        self.requests = 0
+        self.status = collections.Counter()
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.retries = 0
+
+    def summary(self):
+        return {'requests': self.requests, 'status': dict(self.status), 'bytes_in': self.bytes_in,
+                'bytes_out': self.bytes_out, 'retries': self.retries, 'latency': self.latency.summary()}
+
+
+class _ServiceStats(_Stats):
+    def __init__(self):
+        super(_ServiceStats, self).__init__()
+        self.rate_limit_wait = 0.
+        self.queue_wait = 0.
+        self.cache = collections.Counter()
+        self.endpoints = collections.defaultdict(_Stats)
+
+    def summary(self):
+        res = super(_ServiceStats, self).summary()
+        hits = sum(v for k, v in self.cache.items() if k != 'miss')
+        total = hits + self.cache['miss']
+        res['rate_limit_wait'] = self.rate_limit_wait
+        res['queue_wait'] = self.queue_wait
+        res['cache'] = {'hits': dict((k, v) for k, v in self.cache.items() if k != 'miss'),
+                        'misses': self.cache['miss'], 'hit_ratio': hits / total if total else 0.}
+        res['endpoints'] = dict((name, stats.summary()) for name, stats in self.endpoints.items())
+        return res
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class MetricsRegistry(object):
+    """
+    Thread safe registry of requests metrics by service and endpoint
+    """
+
+    def __init__(self):
+        self._services = collections.defaultdict(_ServiceStats)
+        self._lock = threading.Lock()
+
+    def observe_request(self, service, endpoint, status, latency, bytes_in=0, bytes_out=0):
+        """
+        Record one attempt sent on the network
+        :param service: service name
+        :param endpoint: endpoint name (first part of the query path)
+        :param status: status code or 'error' if no response was received
+        :param latency: seconds spent to get the response
+        :param bytes_in: size of the received body
+        :param bytes_out: size of the sent body
+        """
+        with self._lock:
+            stats = self._services[service]
+            for this in (stats, stats.endpoints[endpoint]):
+                this.requests += 1
+                this.status[status] += 1
+                this.latency.observe(latency)
+                this.bytes_in += bytes_in
+                this.bytes_out += bytes_out
+
+    def observe_retry(self, service, endpoint):
+        """
+        Record a retry
+        :param service: service name
+        :param endpoint: endpoint name
+        """
+        with self._lock:
+            stats = self._services[service]
+            stats.retries += 1
+            stats.endpoints[endpoint].retries += 1
+
+    def observe_rate_limit(self, service, waited):
+        """
+        Record time waited for the rate limiter
+        :param service: service name
+        :param waited: seconds
+        """
+        with self._lock:
+            self._services[service].rate_limit_wait += waited
+
+    def observe_queue(self, service, waited):
+        """
+        Record time waited for a slot of the scheduler
+        :param service: service name
+        :param waited: seconds
+        """
+        with self._lock:
+            self._services[service].queue_wait += waited
+
+    def observe_cache(self, service, kind):
+        """
+        Record a cache lookup
+        :param service: service name
+        :param kind: 'memory', 'disk' or 'revalidated' for hits, 'miss' otherwise
+        """
+        with self._lock:
+            self._services[service].cache[kind] += 1
+
+    def reset(self):
+        """
+        Drop all metrics
+        """
+        with self._lock:
+            self._services.clear()
+
+    def snapshot(self):
+        """
+        :return: dict of metrics by service, with latency percentiles, bytes, status counts, retries, rate limiter
+            wait, cache hit ratio and the same metrics by endpoint
+        """
+        with self._lock:
+            return dict((name, stats.summary()) for name, stats in self._services.items())
+
+    def to_prometheus(self):
+        """
+        Export metrics in Prometheus text format
+        :return: str
+        """
+        lines = []
+
+        def header(name, kind, doc):
+            lines.append("# HELP %s %s" % (name, doc))
+            lines.append("# TYPE %s %s" % (name, kind))
+
+        with self._lock:
+            items = sorted(self._services.items())
+            header("biorest_requests_total", "counter", "Requests sent by service, endpoint and status")
+            for service, stats in items:
+                for endpoint, this in sorted(stats.endpoints.items()):
+                    for status, count in sorted(this.status.items(), key=lambda x: str(x[0])):
+                        lines.append('biorest_requests_total{service="%s",endpoint="%s",status="%s"} %s' % (
+                            _label(service), _label(endpoint), _label(status), count))
+            header("biorest_request_duration_seconds", "histogram", "Latency of requests")
+            for service, stats in items:
+                for endpoint, this in sorted(stats.endpoints.items()):
+                    labels = 'service="%s",endpoint="%s"' % (_label(service), _label(endpoint))
+                    cumulative = 0
+                    for bound, count in zip(Histogram.buckets + ('+Inf',), this.latency.counts):
+                        cumulative += count
+                        lines.append('biorest_request_duration_seconds_bucket{%s,le="%s"} %s' % (labels, bound,
+                                                                                                 cumulative))
+                    lines.append('biorest_request_duration_seconds_sum{%s} %s' % (labels, this.latency.sum))
+                    lines.append('biorest_request_duration_seconds_count{%s} %s' % (labels, this.latency.count))
+            for name, attr, doc in (("biorest_response_bytes_total", "bytes_in", "Bytes received"),
+                                    ("biorest_request_bytes_total", "bytes_out", "Bytes sent"),
+                                    ("biorest_retries_total", "retries", "Retried requests")):
+                header(name, "counter", doc)
+                for service, stats in items:
+                    for endpoint, this in sorted(stats.endpoints.items()):
+                        lines.append('%s{service="%s",endpoint="%s"} %s' % (name, _label(service), _label(endpoint),
+                                                                            getattr(this, attr)))
+            header("biorest_rate_limit_wait_seconds_total", "counter", "Time waited for the host rate limiter")
+            for service, stats in items:
+                lines.append('biorest_rate_limit_wait_seconds_total{service="%s"} %s' % (_label(service),
+                                                                                         stats.rate_limit_wait))
+            header("biorest_queue_wait_seconds_total", "counter", "Time waited for a slot of the scheduler")
+            for service, stats in items:
+                lines.append('biorest_queue_wait_seconds_total{service="%s"} %s' % (_label(service), stats.queue_wait))
+            header("biorest_cache_requests_total", "counter", "Cache lookups by result (memory, disk, revalidated, "
+                                                              "miss)")
+            for service, stats in items:
+                for kind, count in sorted(stats.cache.items()):
+                    lines.append('biorest_cache_requests_total{service="%s",result="%s"} %s' % (_label(service),
+                                                                                                _label(kind), count))
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port=9100, host="127.0.0.1"):
+        """
+        Serve metrics in Prometheus text format on http://host:port/metrics from a daemon thread
+        :param port: port to listen on (0 to pick a free one)
+        :param host: interface to listen on
+        :return: the http server, call shutdown() to stop it
+        """
+        registry = self
+
+        class _Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = registry.to_prometheus().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, fmt, *args):
+                log.debug(fmt % args)
+
+        server = http.server.ThreadingHTTPServer((host, port), _Handler)
+        thread = threading.Thread(target=server.serve_forever, name="BioREST-metrics", daemon=True)
+        thread.start()
+        log.info("Serving metrics on http://%s:%s/metrics" % server.server_address[:2])
+        return server
+
+
+metrics = MetricsRegistry()
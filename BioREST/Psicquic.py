@@ -137,7 +137,6 @@ __status__ = "Production"
 
 import logging
 from BioREST.Service import REST, check_param_in_list, RestServiceError
-from BioREST.Uniprot import Uniprot
 
 log = logging.getLogger(__name__)
 
@@ -225,12 +224,17 @@ class Psicquic(REST):
         """
         super(Psicquic, self).__init__("PSICQUIC", url='http://www.ebi.ac.uk/Tools/webservices/psicquic')
         self._registry = None
-        try:
-            self.uniprot = Uniprot()
-        except:
-            log.warning("UniProt service can't be initialised, needed for some parts")
+        self._uniprot = None
         self.buffer = {}
 
+    def _get_uniprot(self):
+        if self._uniprot is None:
+            from BioREST.Uniprot import Uniprot
+            self._uniprot = Uniprot()
+        return self._uniprot
+
+    uniprot = property(_get_uniprot, doc="UniProt service used for identifiers mapping (built on first use)")
+
     def _get_formats(self):
         return Psicquic._formats
 
@@ -472,7 +476,7 @@ class Psicquic(REST):
         return results
 
     def retrieve(self, service, query, methods='query', output="tab25", firstresult=None, maxresults=None,
-                 compressed=True):
+                 compressed=True, stream=False):
         """
         Send a query to a specific database
 
@@ -483,6 +487,8 @@ class Psicquic(REST):
         :param str query: a valid query. Can be `*` or a protein name.
         :param str output: a valid format. See s._formats
         :param compressed: gzipped or not data, speedup and requests unzipped auto
+        :param stream: if True, returns an iterator over entries read from the network in constant memory
+            (not available for xml outputs)
 
             s.query("intact", "brca2", "tab27")
             s.query("intact", "zap70", "xml25")
@@ -531,6 +537,12 @@ class Psicquic(REST):
 
         url = resturl + 'query/' + query
 
+        if stream and "xml" not in output:
+            lines = self.http_get(url, frmt="txt", params=params, stream=True)
+            if output.startswith("tab"):
+                return (line.split("\t") for line in lines if line)
+            return (line for line in lines if line)
+
         if "xml" in output:
             res = self.http_get(url, frmt="xml", params=params)
         else:
@@ -544,6 +556,39 @@ class Psicquic(REST):
 
         return res
 
+    def iter_retrieve(self, service, query, methods='query', output="tab25", page_size=1000, limit=None,
+                      compressed=True, concurrency=1):
+        """
+        Iterate over all the entries of a query to a specific database, pages of results (firstResult/maxResults)
+        are requested lazily
+
+        for entry in s.iter_retrieve("intact", "species:9606", page_size=5000):
+            ...
+
+        :param service: a registered service. See :attr:`registry_names`.
+        :param query: a valid query. Can be `*` or a protein name.
+        :param methods: interation , interactor or query
+        :param output: a tab format (tab25, tab26 or tab27)
+        :param page_size: number of entries by request
+        :param limit: maximum number of entries, None for all
+        :param compressed: gzipped or not data
+        :param concurrency: if greater than 1, the number of entries is counted first and that many pages are
+            requested in parallel
+        :return: generator of entries (list of columns)
+        """
+        if not output.startswith("tab"):
+            raise ValueError("Only tab formats can be paginated")
+        total = None
+        if concurrency > 1:
+            total = int(self.retrieve(service, query, methods=methods, output="count")[0])
+
+        def _fetch(offset, size):
+            return self.retrieve(service, query, methods=methods, output=output, firstresult=offset, maxresults=size,
+                                 compressed=compressed)
+
+        return self.paginate(_fetch, page_size, records=lambda res: [x for x in res or [] if x != [""]],
+                             limit=limit, total=total, concurrency=concurrency)
+
     def retrieve_all(self, query, methods='query', databases=None, output="tab25", firstresult=None, maxresults=None,
                      compressed=True):
         """
@@ -818,12 +863,9 @@ class Psicquic(REST):
 
         # the data to store
         mapping = {}
-        n = len(data)
 
         # scan all entries
-        counter = 0
         for entryA, entryB in zip(entriesa, entriesb):
-            counter += 1
             dba, ida = entryA.split(":")
             try:
                 dbb, idb = entryB.split(":")
@@ -840,31 +882,27 @@ class Psicquic(REST):
                 else:
                     query[dbb].add(idb)
 
-            for k in query.keys():
-                if len(query[k]) > 2000 or counter == n:
-                    this_query = list(query[k])
-                    dbname = self._mapping_uniprot[k]
-
-                    if dbname is not None:
-                        log.info("Request sent to uniprot for %s database (%s/%s)" % (dbname, counter, n))
-                        res = self.uniprot.mapping(fr=dbname, to="ID", query=" ".join(this_query))
-                        for x in this_query:
-                            if x not in res:  # was not found
-                                mapping[x] = "!" + k + ":" + x
-                            else:
-                                # we should be here since the queries are populated
-                                # if not already in the mapping dictionary
-                                if x not in res.keys():
-                                    raise ValueError(x)
-                                if len(res[x]) == 1:
-                                    mapping[x] = res[x][0]
-                                else:
-                                    log.info("Psicquic mapping found more than 1 id. keep first one")
-                                    mapping[x] = res[x][0]
+        # one mapping by database, uniprot splits the ids in requests of acceptable size
+        for k in query.keys():
+            this_query = list(query[k])
+            dbname = self._mapping_uniprot[k]
+
+            if dbname is not None:
+                log.info("Request sent to uniprot for %s database (%s ids)" % (dbname, len(this_query)))
+                res = self.uniprot.mapping(fr=dbname, to="ID", query=this_query)
+                for x in this_query:
+                    if x not in res:  # was not found
+                        mapping[x] = "!" + k + ":" + x
                     else:
-                        for x in this_query:
-                            mapping[x] = k + ":" + x
-                    query[k] = set()
+                        if len(res[x]) == 1:
+                            mapping[x] = res[x][0]
+                        else:
+                            log.info("Psicquic mapping found more than 1 id. keep first one")
+                            mapping[x] = res[x][0]
+            else:
+                for x in this_query:
+                    mapping[x] = k + ":" + x
+            query[k] = set()
 
         for k in query.keys():
             assert len(query[k]) == 0
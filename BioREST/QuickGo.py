@@ -89,7 +89,7 @@ class QuickGo(REST):
         return res
 
     def Annotation(self, goid=None, protein=None, frmt="tsv", limit=10000, gz=False, col=None, db=None, aspect=None,
-                   termUse=None, evidence=None, source=None, ref=None, tax=9606, qualifier=None):
+                   termUse=None, evidence=None, source=None, ref=None, tax=9606, qualifier=None, stream=False):
         """
         Calling the Annotation service
         Mutual exclusive parameters are goid, protein
@@ -131,6 +131,7 @@ class QuickGo(REST):
             `*`  after ref type). Can be 'PUBMED:`*`', 'GO_REF:0000002'.
         :param qualifier: tags that modify the interpretation of an annotation.
              Examples are NOT, colocalizes_with, contributes_to.
+        :param stream: if True, returns an iterator over lines read from the network (gzip is decoded on the fly)
 
             * Any number of fields can be specified; they will be AND'ed together.
             * Any number of values can be specified for each field; they will be OR'ed together.
@@ -246,7 +247,7 @@ class QuickGo(REST):
         if gz is True:
             url += '&gz'
 
-        res = self.http_get(url, frmt="txt", params=params)
+        res = self.http_get(url, frmt="txt", params=params, stream=stream)
 
         return res
 
@@ -265,13 +266,17 @@ class QuickGo(REST):
         cols = ",".join(self._valid_col)
         kargs['col'] = cols
 
+        kargs['stream'] = True
         data = self.Annotation(goid=goid, **kargs)
-        data = data.strip().split("\n")[1:]
+        # skip header
+        next(data, None)
         res = {}
         for c in cols.split(","):
             res[c] = []
 
         for entry in data:
+            if not entry.strip():
+                continue
             values = entry.split("\t")
             for k, v in zip(cols.split(","), values):
                 res[k].append(v)
@@ -297,13 +302,17 @@ class QuickGo(REST):
         cols = ",".join(self._valid_col)
         kargs['col'] = cols
 
+        kargs['stream'] = True
         data = self.Annotation(protein=protein, **kargs)
-        data = data.strip().split("\n")[1:]
+        # skip header
+        next(data, None)
         res = {}
         for c in cols.split(","):
             res[c] = []
 
         for entry in data:
+            if not entry.strip():
+                continue
             values = entry.split("\t")
             for k, v in zip(cols.split(","), values):
                 res[k].append(v)
@@ -58,7 +58,7 @@ __email__ = "kopp.arnaud@gmail.com"
 __status__ = "Production"
 
 import logging
-from BioREST.Service import REST, list2string, check_param_in_list
+from BioREST.Service import REST, RestServiceError, list2string, check_param_in_list
 
 log = logging.getLogger(__name__)
 
@@ -77,14 +77,14 @@ class Reactome(REST):
 
     def _download_list_pathways(self):
         if self._list_pathways is None:
-            res = self.session.get("http://www.reactome.org/download/current/ReactomePathways.txt")
-            if res.status_code == 200:
-                res = res.text
-                res = res.strip()
-                self._list_pathways = [x.split("\t") for x in res.split("\n")]
-            else:
+            # go through http_get so the file is cached and only revalidated when it did not change
+            try:
+                res = self.http_get("http://www.reactome.org/download/current/ReactomePathways.txt", frmt="txt")
+            except RestServiceError:
                 log.error("Could not fetch the pathways")
                 raise IOError
+            res = res.strip()
+            self._list_pathways = [x.split("\t") for x in res.split("\n")]
         return self._list_pathways
 
     def get_list_pathways(self):
@@ -432,3 +432,25 @@ class ReactomeAnalysis(REST):
         :param token:
         """
         raise NotImplementedError
+
+    def iter_pathways(self, token, page_size=1000, sortby='ENTITIES_PVALUE', resource='TOTAL', concurrency=1):
+        """
+        Iterate over the pathways of a previous analysis, pages (page/pageSize) are requested lazily
+        ra.iter_pathways(ra.identifiers("TP53")['summary']['token'])
+
+        :param token: token of the analysis
+        :param page_size: number of pathways by request
+        :param sortby: sort key of the pathways
+        :param resource: resource of the analysis (TOTAL, UNIPROT ...)
+        :param concurrency: number of pages requested in parallel once the number of pathways is known (first page)
+        :return: generator of pathways (dict)
+        """
+        def _fetch(offset, size):
+            # pages are numbered, size is page_size as no limit is given to paginate
+            params = {'pageSize': str(size), 'page': str(offset // size + 1), 'sortBy': sortby,
+                      'order': 'ASC', 'resource': resource}
+            return self.http_get("token/{}".format(token), params=params,
+                                 headers={"Content-Type": "text/plain;charset=UTF-8", "Accept": "application/json"})
+
+        return self.paginate(_fetch, page_size, records=lambda res: res['pathways'],
+                             total=lambda res: res.get('pathwaysFound'), concurrency=concurrency)
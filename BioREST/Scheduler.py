@@ -0,0 +1,238 @@
+# coding=utf-8
+"""
+Process wide scheduler of the requests sent by all the REST services
+Every request waits for a slot before going on the network. Slots are bounded per host and globally, waiting
+requests are served by priority class (interactive before bulk) and, inside a class, in turn between jobs so a large
+export does not starve the other jobs of the process. The per host rate budget (token bucket) is still applied once
+the slot is granted.
+
+    from BioREST.Scheduler import job, BULK
+    with job("export", priority=BULK):
+        Ensembl().post_lookup_by_id(ids)  # 50k ids
+    # meanwhile, from another thread, interactive lookups go first
+    KEGG().get("hsa:7535")
+"""
+
+__author__ = "Arnaud KOPP"
+__copyright__ = "© 2015-2016 KOPP Arnaud All Rights Reserved"
+__credits__ = ["KOPP Arnaud"]
+__license__ = "GNU GPL V3.0"
+__maintainer__ = "Arnaud KOPP"
+__email__ = "kopp.arnaud@gmail.com"
+__status__ = "Production"
+
+import time
+import itertools
+import threading
+import contextlib
+import contextvars
+import collections
+import urllib.parse
+import logging
+log = logging.getLogger(__name__)
+
+INTERACTIVE = 'interactive'
+BULK = 'bulk'
+priorities = (INTERACTIVE, BULK)
+
+_current_job = contextvars.ContextVar("BioREST_job", default=None)
+_job_ids = itertools.count(1)
+
+
+class Job(object):
+    """
+    Group of requests sharing a priority, jobs of the same priority get slots in turn
+    """
+
+    def __init__(self, name=None, priority=INTERACTIVE):
+        """
+        :param name: name of the job, default to a unique one
+        :param priority: INTERACTIVE or BULK
+        """
+        if priority not in priorities:
+            raise ValueError("priority must be one of %s" % (priorities,))
+        self.name = name or "job-%s" % next(_job_ids)
+        self.priority = priority
+
+    def __repr__(self):
+        return "Job(%r, %r)" % (self.name, self.priority)
+
+
+def current_job():
+    """
+    :return: job of the current context (thread or task), None outside of :func:`job`
+    """
+    return _current_job.get()
+
+
+@contextlib.contextmanager
+def job(name=None, priority=INTERACTIVE):
+    """
+    Run the requests of the block (and of the concurrent calls started from it) as one job
+    :param name: name of the job
+    :param priority: INTERACTIVE or BULK
+    """
+    token = _current_job.set(Job(name, priority))
+    try:
+        yield _current_job.get()
+    finally:
+        _current_job.reset(token)
+
+
+def _host(url):
+    return urllib.parse.urlsplit(url).netloc.lower() or url
+
+
+class _Waiter(object):
+    __slots__ = ('host', 'event')
+
+    def __init__(self, host):
+        self.host = host
+        self.event = threading.Event()
+
+
+class Scheduler(object):
+    """
+    Thread safe slot scheduler with per host and global in flight caps, priority classes and fair queuing between jobs
+    """
+
+    def __init__(self, max_in_flight=64, host_concurrency=16):
+        """
+        :param max_in_flight: maximum number of requests in flight in the process
+        :param host_concurrency: default maximum number of requests in flight by host
+        """
+        if max_in_flight < 1 or host_concurrency < 1:
+            raise ValueError("concurrency must be greater than 0")
+        self.max_in_flight = max_in_flight
+        self.host_concurrency = host_concurrency
+        self._hosts = {}
+        self._in_flight = collections.Counter()
+        self._total = 0
+        # priority -> job name -> waiters, jobs are served in turn (moved at the end once served)
+        self._queues = dict((priority, collections.OrderedDict()) for priority in priorities)
+        self._lock = threading.Lock()
+
+    def configure_host(self, url, concurrency=None, rate=None, burst=None):
+        """
+        Set the budget of a host
+        :param url: url or host
+        :param concurrency: maximum number of requests in flight to the host
+        :param rate: maximum number of requests per second to the host, it replaces the rate asked by the services
+        :param burst: maximum number of requests sent at once
+        """
+        host = _host(url)
+        if concurrency is not None:
+            if concurrency < 1:
+                raise ValueError("concurrency must be greater than 0")
+            with self._lock:
+                self._hosts[host] = concurrency
+                self._dispatch()
+        if rate is not None:
+            from BioREST.Service import get_rate_limiter
+            get_rate_limiter(url, rate, burst).set_rate(rate, burst)
+
+    def _capacity(self, host):
+        return self._hosts.get(host, self.host_concurrency)
+
+    def _next(self):
+        for priority in priorities:
+            queues = self._queues[priority]
+            for name, waiters in queues.items():
+                for waiter in waiters:
+                    if self._in_flight[waiter.host] < self._capacity(waiter.host):
+                        waiters.remove(waiter)
+                        if waiters:
+                            queues.move_to_end(name)
+                        else:
+                            del queues[name]
+                        return waiter
+        return None
+
+    def _dispatch(self):
+        # called with the lock held, grant slots while there is room
+        while self._total < self.max_in_flight:
+            waiter = self._next()
+            if waiter is None:
+                return
+            self._in_flight[waiter.host] += 1
+            self._total += 1
+            waiter.event.set()
+
+    def acquire(self, url, priority=None, job=None):
+        """
+        Block the current thread until a slot to the host of url is granted
+        :param url: targeted url
+        :param priority: priority of the request, default to the one of job
+        :param job: Job (or job name) of the request, default to the job of the current context
+        :return: waited time in seconds
+        """
+        current = current_job()
+        if job is None:
+            job = current.name if current is not None else None
+        elif isinstance(job, Job):
+            priority = priority or job.priority
+            job = job.name
+        priority = priority or (current.priority if current is not None else INTERACTIVE)
+        if priority not in priorities:
+            raise ValueError("priority must be one of %s" % (priorities,))
+        waiter = _Waiter(_host(url))
+        start = time.monotonic()
+        with self._lock:
+            self._queues[priority].setdefault(job, collections.deque()).append(waiter)
+            self._dispatch()
+        try:
+            waiter.event.wait()
+        except BaseException:
+            # interrupted (KeyboardInterrupt ...): leave the queue, or give back the slot granted meanwhile
+            with self._lock:
+                if waiter.event.is_set():
+                    self._in_flight[waiter.host] -= 1
+                    if self._in_flight[waiter.host] <= 0:
+                        del self._in_flight[waiter.host]
+                    self._total -= 1
+                    self._dispatch()
+                else:
+                    waiters = self._queues[priority].get(job)
+                    if waiters is not None and waiter in waiters:
+                        waiters.remove(waiter)
+                        if not waiters:
+                            del self._queues[priority][job]
+            raise
+        return time.monotonic() - start
+
+    def release(self, url):
+        """
+        Give back a slot granted by :meth:`acquire`
+        :param url: targeted url
+        """
+        host = _host(url)
+        with self._lock:
+            self._in_flight[host] -= 1
+            if self._in_flight[host] <= 0:
+                del self._in_flight[host]
+            self._total -= 1
+            self._dispatch()
+
+    @contextlib.contextmanager
+    def slot(self, url, priority=None, job=None):
+        """
+        Hold a slot to the host of url during the block, see :meth:`acquire`
+        :return: waited time in seconds
+        """
+        waited = self.acquire(url, priority=priority, job=job)
+        try:
+            yield waited
+        finally:
+            self.release(url)
+
+    def snapshot(self):
+        """
+        :return: dict with the number of requests in flight (total and by host) and waiting (by priority and job)
+        """
+        with self._lock:
+            return {'in_flight': self._total, 'hosts': dict(self._in_flight),
+                    'queued': dict((priority, dict((name, len(waiters)) for name, waiters in queues.items()))
+                                   for priority, queues in self._queues.items())}
+
+
+scheduler = Scheduler()
@@ -1,7 +1,7 @@
 # coding=utf-8
 """
 Base Class for REST services, inspired by bioservices package
-Use requests package for all HTTP methods, but may be in future will change to aiohttp
+Use requests package for all HTTP methods, list of queries are fan-out concurrently with asyncio
 class Service is ground class for making REST or SOAP (don't implemented)
 class REST is for making REST request at database
 """
@@ -17,29 +17,544 @@ __version__ = "1.0"
 
 import sys
 import os
+import asyncio
+import concurrent.futures
+import contextvars
+import copy
+import functools
+import itertools
 import platform
 import webbrowser
 import binascii
+import codecs
+import collections
+import zlib
 import json
 import time
+import random
+import threading
+import email.utils
 import xml.etree.ElementTree as ET
-import bs4
 import urllib
+import urllib.parse
 from urllib.request import urlopen
 import requests  # replacement for urllib2 (2-3 times faster)
 from requests.models import Response
+from BioREST.Cache import request_key
+from BioREST.Metrics import metrics as default_metrics
+from BioREST.Transport import HTTPTransport
+from BioREST.Download import Downloader
+from BioREST.Scheduler import scheduler as default_scheduler, current_job, job, priorities, INTERACTIVE
 import logging
 log = logging.getLogger(__name__)
 
 
 class RestServiceError(Exception):
-    def __init__(self, value):
+    def __init__(self, value, status=None):
         self.value = value
+        self.status = status
 
     def __str__(self):
         return repr(self.value)
 
 
+class BatchError(RestServiceError):
+    """
+    Some chunks of a batch failed (see :meth:`REST.batch`), the results of the other chunks are kept
+    """
+
+    def __init__(self, value, result=None, failures=None, status=None):
+        """
+        :param value: error message
+        :param result: merged result of the chunks that succeeded
+        :param failures: list of (chunk, exception) of the chunks that failed
+        :param status: HTTP status of the first failure
+        """
+        super(BatchError, self).__init__(value, status=status)
+        self.result = result
+        self.failures = failures or []
+
+
+class TokenBucket(object):
+    """
+    Thread safe token bucket, tokens are refilled at rate per second up to burst
+    Each acquire reserves the next free slot, so concurrent callers are spaced out without sleeping twice
+    """
+
+    def __init__(self, rate, burst=None):
+        """
+        :param rate: number of tokens refilled per second
+        :param burst: maximum number of tokens that can be consumed at once, default to rate (at least 1)
+        """
+        if rate <= 0:
+            raise ValueError("rate must be greater than 0")
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else max(1, int(rate)))
+        self._tokens = self.burst
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def set_rate(self, rate, burst=None):
+        """
+        Change the refill rate (and burst) of the bucket
+        :param rate: number of tokens refilled per second
+        :param burst: maximum number of tokens that can be consumed at once, default to rate (at least 1)
+        """
+        with self._lock:
+            self._refill()
+            self.rate = float(rate)
+            self.burst = float(burst if burst is not None else max(1, int(rate)))
+            self._tokens = min(self._tokens, self.burst)
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def reserve(self):
+        """
+        Take one token
+        :return: number of seconds to wait before the token can be used
+        """
+        with self._lock:
+            self._refill()
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.
+            return -self._tokens / self.rate
+
+    def acquire(self):
+        """
+        Block the current thread until a token is available
+        :return: waited time in seconds
+        """
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+_rate_limiters = {}
+_rate_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(url, rate, burst=None):
+    """
+    Get the process wide rate limiter of the host targeted by url
+    When several services ask for a different rate on the same host, the most restrictive one is kept
+    :param url: url or host
+    :param rate: maximum number of requests per second
+    :param burst: maximum number of requests sent at once
+    :return: TokenBucket
+    """
+    host = urllib.parse.urlsplit(url).netloc.lower() or url
+    with _rate_limiters_lock:
+        limiter = _rate_limiters.get(host)
+        if limiter is None:
+            limiter = TokenBucket(rate, burst)
+            _rate_limiters[host] = limiter
+        elif rate < limiter.rate:
+            limiter.set_rate(rate, burst)
+    return limiter
+
+
+class CircuitBreaker(object):
+    """
+    Per host circuit breaker fed by real traffic
+
+    closed: requests go through, consecutive failures are counted
+    open: after failure_threshold consecutive failures, requests fail fast during recovery_timeout seconds
+    half_open: then one trial request is let through, its success closes the circuit, its failure opens it again
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, host, failure_threshold=5, recovery_timeout=30):
+        """
+        :param host: host protected by the breaker
+        :param failure_threshold: number of consecutive failures opening the circuit
+        :param recovery_timeout: seconds before a trial request is allowed on an open circuit
+        """
+        self.host = host
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.
+        self._trial = False
+        self._lock = threading.Lock()
+
+    def _get_state(self):
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    state = property(_get_state, doc="Current state of the circuit (closed, open or half_open)")
+
+    def allow(self):
+        """
+        Check if a request can be sent
+        :return: True if allowed
+        """
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN and time.monotonic() - self._opened_at < self.recovery_timeout:
+                return False
+            # half open, only one trial request at a time
+            if self._trial:
+                return False
+            self._state = self.HALF_OPEN
+            self._trial = True
+            return True
+
+    def record_success(self):
+        """
+        Report a request that reached the host
+        """
+        with self._lock:
+            if self._state != self.CLOSED:
+                log.info("Circuit of %s closed" % self.host)
+            self._state = self.CLOSED
+            self._failures = 0
+            self._trial = False
+
+    def release(self):
+        """
+        Report a request that ended without an answer attributable to the host (e.g. invalid url), a trial request
+        in flight is released so another one can be sent
+        """
+        with self._lock:
+            self._trial = False
+
+    def record_failure(self):
+        """
+        Report a request that failed because of the host (connection error, timeout, 5xx)
+        """
+        with self._lock:
+            self._failures += 1
+            self._trial = False
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    log.warning("Circuit of %s opened after %s failures" % (self.host, self._failures))
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+
+_circuit_breakers = {}
+_circuit_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(url):
+    """
+    Get the process wide circuit breaker of the host targeted by url
+    :param url: url or host
+    :return: CircuitBreaker
+    """
+    host = urllib.parse.urlsplit(url).netloc.lower() or url
+    with _circuit_breakers_lock:
+        breaker = _circuit_breakers.get(host)
+        if breaker is None:
+            breaker = CircuitBreaker(host)
+            _circuit_breakers[host] = breaker
+    return breaker
+
+
+class SingleFlight(object):
+    """
+    Coalesce concurrent calls sharing the same key
+    The first caller runs the function, callers arriving while it runs wait and get the same result (or exception)
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, func):
+        """
+        Run func once for all concurrent callers of key
+        :param key: key identifying the call
+        :param func: callable without arguments
+        :return: result of func
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = concurrent.futures.Future()
+                self._calls[key] = future
+        if not leader:
+            log.debug("Joining request already in flight")
+            return future.result()
+        try:
+            result = func()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+
+_single_flight = SingleFlight()
+
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+_session_config = {'pool_connections': 10, 'pool_maxsize': 32, 'max_retries': 3}
+
+
+def configure_sessions(pool_connections=None, pool_maxsize=None, max_retries=None):
+    """
+    Configure connection pools of http sessions, already created sessions are dropped so the new
+    configuration is used for the next requests
+    :param pool_connections: number of hosts kept in the urllib3 pool manager of a session
+    :param pool_maxsize: maximum number of connections kept alive per host
+    :param max_retries: connection level retries of the adapter
+    """
+    with _sessions_lock:
+        if pool_connections is not None:
+            _session_config['pool_connections'] = pool_connections
+        if pool_maxsize is not None:
+            _session_config['pool_maxsize'] = pool_maxsize
+        if max_retries is not None:
+            _session_config['max_retries'] = max_retries
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+
+
+def get_session(url):
+    """
+    Get the process wide http session of the scheme and host targeted by url
+    Services targeting the same host (e.g. www.ebi.ac.uk) reuse the same kept alive connections
+    :param url: url
+    :return: requests.Session
+    """
+    parts = urllib.parse.urlsplit(url)
+    key = (parts.scheme.lower(), parts.netloc.lower())
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            log.debug("Create http session for %s://%s" % key)
+            session = requests.session()
+            # only connection errors are retried here, status codes are handled by RetryPolicy
+            retries = requests.adapters.Retry(total=_session_config['max_retries'], read=False,
+                                              respect_retry_after_header=False)
+            adapter = requests.adapters.HTTPAdapter(pool_connections=_session_config['pool_connections'],
+                                                    pool_maxsize=_session_config['pool_maxsize'],
+                                                    max_retries=retries)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            session.headers['Connection'] = 'keep-alive'
+            _sessions[key] = session
+    return session
+
+
+_health_pool = concurrent.futures.ThreadPoolExecutor(max_workers=4, thread_name_prefix="BioREST-health")
+
+
+class RetryPolicy(object):
+    """
+    Retry policy of REST requests
+
+    Failed requests (connection errors or retryable status) are retried with an exponential backoff with full
+    jitter, or after the delay asked by the server in the Retry-After header. Requests that are not idempotent (POST)
+    are only retried when the server did not process them (429, 503 or connection not established), unless the call
+    is flagged as idempotent. Retrying stops after max_retries or when max_elapsed seconds are spent.
+
+    s = KEGG()
+    s.retry_policy = RetryPolicy(max_retries=5, backoff_factor=1, max_elapsed=120)
+    """
+    idempotent_methods = ('GET', 'HEAD', 'PUT', 'DELETE', 'OPTIONS')
+    unprocessed_statuses = (429, 503)
+
+    def __init__(self, max_retries=3, backoff_factor=0.5, backoff_max=60, max_elapsed=300, jitter=True,
+                 statuses=(429, 500, 502, 503, 504), retry_post=False):
+        """
+        :param max_retries: maximum number of retries after the first attempt
+        :param backoff_factor: delay before the first retry, doubled at each retry
+        :param backoff_max: maximum delay between two attempts
+        :param max_elapsed: time budget in seconds for all attempts of a request
+        :param jitter: randomize the delay between 0 and the backoff value
+        :param statuses: status codes that are retried
+        :param retry_post: consider POST requests as idempotent
+        """
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.backoff_max = backoff_max
+        self.max_elapsed = max_elapsed
+        self.jitter = jitter
+        self.statuses = tuple(statuses)
+        self.retry_post = retry_post
+
+    @staticmethod
+    def parse_retry_after(value):
+        """
+        Delay in seconds from a Retry-After header, given in seconds or as a HTTP date
+        :param value: header value
+        :return: seconds or None
+        """
+        if not value:
+            return None
+        try:
+            return max(0., float(value))
+        except ValueError:
+            pass
+        try:
+            date = email.utils.parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        return max(0., date.timestamp() - time.time())
+
+    def delay(self, attempt, response=None):
+        """
+        Delay before the next attempt
+        :param attempt: number of retries already done
+        :param response: failed response if any
+        :return: seconds
+        """
+        if response is not None:
+            retry_after = self.parse_retry_after(response.headers.get('Retry-After'))
+            if retry_after is not None:
+                return retry_after
+        backoff = min(self.backoff_max, self.backoff_factor * (2 ** attempt))
+        if self.jitter:
+            return random.uniform(0, backoff)
+        return backoff
+
+    def should_retry(self, method, attempt, elapsed, response=None, error=None, idempotent=None):
+        """
+        Decide if a failed request is retried
+        :param method: http method
+        :param attempt: number of retries already done
+        :param elapsed: seconds spent since the first attempt
+        :param response: failed response if any
+        :param error: exception raised by the transport if any
+        :param idempotent: force idempotency of the request, default depends on method
+        :return: delay in seconds before retrying or None if the request must not be retried
+        """
+        if attempt >= self.max_retries:
+            return None
+        if response is not None and response.status_code not in self.statuses:
+            return None
+        if idempotent is None:
+            idempotent = method.upper() in self.idempotent_methods or (self.retry_post and method.upper() == 'POST')
+        if not idempotent:
+            # the request may have been processed, only retry when the server told us it was not
+            if response is not None and response.status_code not in self.unprocessed_statuses:
+                return None
+            if error is not None and not isinstance(error, requests.exceptions.ConnectTimeout):
+                return None
+        delay = self.delay(attempt, response)
+        if elapsed + delay > self.max_elapsed:
+            return None
+        return delay
+
+
+class Hooks(object):
+    """
+    Registry of request lifecycle hooks
+
+    Events and their payload (a dict, always with service, method, url, endpoint, request_id and context):
+        before_request: attempt, sent before each attempt on the network
+        after_response: attempt, status, network_time, bytes_in
+        on_error: attempt, error (and status if a response was received)
+        on_retry: attempt, delay, status or error of the failed attempt
+        on_parse: frmt, decode_time, source ('network' or 'cache')
+    context is a dict shared by all events of a request, e.g. to store a tracing span.
+    Exceptions raised by hooks are logged and ignored.
+
+    def start(payload):
+        payload['context']['span'] = tracer.start_span(payload['endpoint'])
+    def end(payload):
+        payload['context']['span'].end()
+    k = KEGG()
+    k.hooks.register('before_request', start)
+    k.hooks.register('after_response', end)
+    """
+    events = ('before_request', 'after_response', 'on_error', 'on_retry', 'on_parse')
+
+    def __init__(self):
+        self._hooks = dict((event, []) for event in self.events)
+
+    def register(self, event, func):
+        """
+        Register a hook
+        :param event: one of :attr:`events`
+        :param func: callable receiving the payload dict
+        :return: func (can be used as decorator with functools.partial)
+        """
+        check_param_in_list(event, list(self.events), name="event")
+        self._hooks[event].append(func)
+        return func
+
+    def unregister(self, event, func):
+        """
+        Remove a hook
+        :param event: one of :attr:`events`
+        :param func: registered callable
+        """
+        self._hooks[event].remove(func)
+
+    def __contains__(self, event):
+        return len(self._hooks.get(event, ())) > 0
+
+    def fire(self, event, payload):
+        """
+        Call hooks registered for event
+        :param event: one of :attr:`events`
+        :param payload: dict given to hooks
+        """
+        for func in list(self._hooks[event]):
+            try:
+                func(payload)
+            except Exception as e:
+                log.warning("Hook %s failed for %s: %s" % (func, event, e))
+
+
+hooks = Hooks()
+_request_ids = itertools.count(1)
+
+
+_default_cache = None
+_default_memory_cache = None
+_default_transport = HTTPTransport()
+_missing = object()
+
+
+def set_default_cache(cache):
+    """
+    Set the response cache used by every REST service that does not define its own
+    :param cache: a cache (e.g. :class:`BioREST.Cache.DiskCache`) or None to disable caching
+    """
+    global _default_cache
+    _default_cache = cache
+
+
+def set_default_transport(transport):
+    """
+    Set the transport used by every REST service that does not define its own
+    :param transport: a transport (see :mod:`BioREST.Transport`) or None to send requests on the network
+    """
+    global _default_transport
+    _default_transport = transport or HTTPTransport()
+
+
+def set_default_memory_cache(cache):
+    """
+    Set the in memory cache of decoded responses used by every REST service that does not define its own
+    :param cache: a :class:`BioREST.Cache.MemoryCache` or None to disable memoization
+    """
+    global _default_memory_cache
+    _default_memory_cache = cache
+
+
 class Service(object):
     """
     Base class for REST class
@@ -56,7 +571,9 @@ class Service(object):
         415: "Unsupported Media Type",
         429: "You have been rate-limited, wait and retry",
         500: "Internal server error (Most likely a temporary problem)",
-        503: "Service not available (the server is being updated, try again later)"
+        502: "Bad Gateway (Most likely a temporary problem)",
+        503: "Service not available (the server is being updated, try again later)",
+        504: "Gateway Timeout (Most likely a temporary problem)"
     }
 
     def __init__(self, name, url=None, request_per_sec=3):
@@ -69,24 +586,69 @@ class Service(object):
             limit, an error is raise. The reason for this limitation is
             that some services (e.g.., NCBI) may black list you IP.
             If you need or can do more (e.g., ChEMBL does not seem to have
-            restrictions), change the value. You can also have several instance
-            but again, if you send too many requests at the same, your future
-            requests may be restricted.
+            restrictions), change the value. The budget is shared per host by
+            all instances (see :func:`get_rate_limiter`), so several instances
+            together stay within the limit.
         """
         self._request_per_sec = request_per_sec
+        self._request_burst = None
         self.url = url
         self._timeout = 30
         self._max_retries = 3
-        try:
-            if self.url is not None:
-                urlopen(self.url)
-        except Exception:
-            log.warning("The URL (%s) provided cannot be reached." % self.url)
+        self._concurrency = 4
+        # availability is no more probed here, see health() and the per host circuit breaker
         self.name = name
 
     def _get_url(self):
         return self.url
 
+    def _rate_limiter(self, url=None):
+        """
+        Rate limiter shared by every service targeting the same host
+        :param url: targeted url, default to service url
+        """
+        return get_rate_limiter(url or self.url, self._request_per_sec, self._request_burst)
+
+    def _circuit_breaker(self, url=None):
+        """
+        Circuit breaker shared by every service targeting the same host
+        :param url: targeted url, default to service url
+        """
+        return get_circuit_breaker(url or self.url)
+
+    def _probe(self):
+        """
+        Check that the service url can be reached, the host circuit breaker is updated with the result
+        :return: dict with service, url, reachable, status, latency and circuit state
+        """
+        breaker = self._circuit_breaker()
+        start = time.monotonic()
+        status, reachable = None, False
+        try:
+            res = get_session(self.url).head(self.url, timeout=self._timeout, allow_redirects=True)
+            status = res.status_code
+            reachable = status < 500
+        except requests.exceptions.RequestException as e:
+            log.warning("The URL (%s) provided cannot be reached: %s" % (self.url, e))
+        if reachable:
+            breaker.record_success()
+        else:
+            breaker.record_failure()
+        return {'service': self.name, 'url': self.url, 'reachable': reachable, 'status': status,
+                'latency': time.monotonic() - start, 'circuit': breaker.state}
+
+    def health(self):
+        """
+        Probe the service in background
+        :return: a concurrent.futures.Future, its result is a dict with service, url, reachable, status, latency
+            and circuit state
+
+        k = KEGG()
+        k.health().result()
+        {'service': 'KEGG', 'url': 'http://rest.kegg.jp', 'reachable': True, 'status': 200, ...}
+        """
+        return _health_pool.submit(self._probe)
+
     def _set_url(self, url):
         if url is not None:
             url = url.rstrip("/")
@@ -173,10 +735,21 @@ class REST(Service):
         'yaml': 'text/x-yaml'
     }
 
+    _cached_headers = ('content-type', 'etag', 'last-modified', 'date')
+
     def __init__(self, name, url=None):
         super(REST, self).__init__(name, url)
         log.info("Initialising %s service (REST)" % self.name)
         self._session = None
+        self._cache = None
+        self._memory_cache = None
+        self._transport = None
+        self._cache_ttl = None
+        self.retry_policy = RetryPolicy(max_retries=self._max_retries)
+        self.metrics = default_metrics
+        self.scheduler = default_scheduler
+        self._priority = None
+        self.hooks = Hooks()
         self.last_response = None
 
     def _get_session(self):
@@ -184,19 +757,14 @@ class REST(Service):
             self._session = self._create_session()
         return self._session
 
-    session = property(_get_session)
+    session = property(_get_session, doc="http session of the service host, shared with other services")
 
-    def _create_session(self):
+    def _create_session(self, url=None):
         """
-        Creates a normal session using HTTPAdapter
-        max retries is defined in the :attr:`MAX_RETRIES`
+        Get the pooled session of the targeted host from the process wide registry (see :func:`get_session`)
+        :param url: targeted url, default to service url
         """
-        log.debug("Create http session")
-        self._session = requests.session()
-        adapter = requests.adapters.HTTPAdapter(max_retries=self._max_retries)
-        self._session.mount('http://', adapter)
-        self._session.mount('https://', adapter)
-        return self._session
+        return get_session(url or self.url)
 
     def _get_timeout(self):
         return self._timeout
@@ -211,9 +779,255 @@ class REST(Service):
 
     def _set_retries(self, retries):
         self._max_retries = retries
+        self.retry_policy.max_retries = retries
 
     RETRIES = property(_get_retries, _set_retries)
 
+    def _get_cache(self):
+        if self._cache is None:
+            return _default_cache
+        return self._cache
+
+    def _set_cache(self, cache):
+        self._cache = cache
+
+    cache = property(_get_cache, _set_cache, doc="Response cache of the service, default to the one set with "
+                                                 ":func:`set_default_cache`, False disables caching")
+
+    def _get_transport(self):
+        if self._transport is None:
+            return _default_transport
+        return self._transport
+
+    def _set_transport(self, transport):
+        self._transport = transport
+
+    transport = property(_get_transport, _set_transport,
+                         doc="Transport sending the requests, default to the one set with :func:`set_default_transport`"
+                             ", e.g. a :class:`BioREST.Transport.ReplayTransport` to work offline")
+
+    def _get_memory_cache(self):
+        if self._memory_cache is None:
+            return _default_memory_cache
+        return self._memory_cache
+
+    def _set_memory_cache(self, cache):
+        self._memory_cache = cache
+
+    memory_cache = property(_get_memory_cache, _set_memory_cache,
+                            doc="In memory cache of decoded responses, default to the one set with "
+                                ":func:`set_default_memory_cache`, False disables memoization")
+
+    def _get_cache_ttl(self):
+        return self._cache_ttl
+
+    def _set_cache_ttl(self, ttl):
+        self._cache_ttl = ttl
+
+    CACHE_TTL = property(_get_cache_ttl, _set_cache_ttl,
+                         doc="Time to live in seconds of cached responses, default to the cache one")
+
+    def _get_concurrency(self):
+        return self._concurrency
+
+    def _set_concurrency(self, concurrency):
+        if concurrency < 1:
+            raise ValueError("concurrency must be greater than 0")
+        self._concurrency = concurrency
+
+    CONCURRENCY = property(_get_concurrency, _set_concurrency,
+                           doc="Maximum number of requests in flight when a list of queries is fan-out")
+
+    def _get_request_per_sec(self):
+        return self._request_per_sec
+
+    def _set_request_per_sec(self, rate):
+        if rate <= 0:
+            raise ValueError("rate must be greater than 0")
+        self._request_per_sec = rate
+
+    REQUEST_PER_SEC = property(_get_request_per_sec, _set_request_per_sec,
+                               doc="Maximum number of requests per second, the most restrictive rate asked by the "
+                                   "services of a host is kept")
+
+    def _get_priority(self):
+        return self._priority
+
+    def _set_priority(self, priority):
+        if priority is not None:
+            check_param_in_list(priority, list(priorities))
+        self._priority = priority
+
+    PRIORITY = property(_get_priority, _set_priority,
+                        doc="Priority class of the requests of the service (interactive or bulk), default to the one "
+                            "of the current job (see :func:`BioREST.Scheduler.job`), interactive otherwise")
+
+    @staticmethod
+    def _run_sync(coro):
+        """
+        Run a coroutine to completion from synchronous code
+        If an event loop is already running in this thread (e.g. notebook), the coroutine is run in a helper thread
+        :param coro: coroutine
+        :return: coroutine result
+        """
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(coro)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as pool:
+            # the context (current job and its priority) follows the coroutine in the helper thread
+            return pool.submit(contextvars.copy_context().run, asyncio.run, coro).result()
+
+    async def gather(self, calls, concurrency=None):
+        """
+        Run blocking callables concurrently over the pooled http session
+        requests has no native async support, so calls are dispatched on a bounded thread pool, connections are
+        reused from the session pool.
+        :param calls: list of callables without arguments
+        :param concurrency: maximum number of calls in flight, default to :attr:`CONCURRENCY`
+        :return: list of results in the same order as calls
+        """
+        calls = list(calls)
+        if len(calls) == 0:
+            return []
+        loop = asyncio.get_running_loop()
+        pool = concurrent.futures.ThreadPoolExecutor(max_workers=min(concurrency or self._concurrency, len(calls)))
+        try:
+            futures = [loop.run_in_executor(pool, contextvars.copy_context().run, call) for call in calls]
+            return await asyncio.gather(*futures)
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def batch(self, func, items, size=None, max_bytes=None, merge=None, weight=None, concurrency=None):
+        """
+        Run a request on an arbitrary number of items for an endpoint limiting the number of items by request
+        Items are split in chunks (see :func:`chunked`), chunks are requested concurrently within the host rate
+        limit and their results merged back. If some chunks fail, the others are still requested; a single failure is
+        raised as is, several raise a :class:`BatchError` holding the merged result of the successful chunks and the
+        failures.
+
+        s.batch(lambda ids: s.http_post("lookup/id", data=to_json({'ids': ids}), frmt='json'), ids, size=1000)
+
+        :param func: callable receiving a list of items and returning the result for them
+        :param items: iterable of items
+        :param size: maximum number of items by request
+        :param max_bytes: maximum size of the items by request (url length or body size)
+        :param merge: callable (list of chunk results) -> result, default to :func:`merge_results`
+        :param weight: callable giving the size of an item, default to its length with a separator
+        :param concurrency: maximum number of requests in flight, default to :attr:`CONCURRENCY`
+        :return: merged result
+        """
+        return self._run_sync(self.batch_async(func, items, size=size, max_bytes=max_bytes, merge=merge,
+                                               weight=weight, concurrency=concurrency))
+
+    async def batch_async(self, func, items, size=None, max_bytes=None, merge=None, weight=None, concurrency=None):
+        """
+        Coroutine version of :meth:`batch`
+        """
+        chunks = list(chunked(items, size=size, max_bytes=max_bytes, weight=weight or _item_size))
+        if len(chunks) > 1:
+            log.info("%s: %s items split in %s requests" % (self.name, sum(len(x) for x in chunks), len(chunks)))
+
+        def _call(chunk):
+            try:
+                return func(chunk), None
+            except Exception as e:
+                log.warning("%s: request for a chunk of %s items failed (%s)" % (self.name, len(chunk), e))
+                return None, e
+
+        calls = [functools.partial(_call, chunk) for chunk in chunks]
+        if current_job() is None and len(chunks) > 1:
+            # the chunks share the scheduler slots in turn with the other jobs of the process
+            with job("%s batch" % self.name, priority=self._priority or INTERACTIVE):
+                res = await self.gather(calls, concurrency=concurrency)
+        else:
+            res = await self.gather(calls, concurrency=concurrency)
+        result = (merge or merge_results)([value for value, error in res if error is None])
+        failures = [(chunk, error) for chunk, (value, error) in zip(chunks, res) if error is not None]
+        if len(failures) == 1:
+            # a single failure keeps its own message and status
+            raise failures[0][1]
+        if failures:
+            first = failures[0][1]
+            raise BatchError("%s/%s chunks failed, first error: %s" % (len(failures), len(chunks), first),
+                             result=result, failures=failures, status=getattr(first, 'status', None))
+        return result
+
+    def paginate(self, fetch, page_size, records=None, start=0, limit=None, total=None, concurrency=1):
+        """
+        Iterate lazily over the records of an offset/limit paginated endpoint
+        The next page is requested while the records of the current one are consumed. When the total number of
+        records is known (total), up to concurrency pages are requested in parallel, records are still yielded in
+        order. Iteration stops on a short page, at total or after limit records.
+
+        # UniProt like endpoint
+        s.paginate(lambda offset, size: s.http_get("search", params={'offset': offset, 'limit': size}), 100)
+        # page numbered endpoint
+        s.paginate(lambda offset, size: s.http_get("list", params={'page': offset // size + 1, 'pageSize': size}),
+                   100, records=lambda res: res['elements'], total=lambda res: res['count'], concurrency=4)
+
+        :param fetch: callable (offset, size) -> response of the page starting at offset (0 based) and holding at most
+            size records
+        :param page_size: number of records by page
+        :param records: callable (response) -> list of records of the page, default to the response if it is a list,
+            its non empty lines if it is a text
+        :param start: offset of the first record
+        :param limit: maximum number of records, None for all
+        :param total: total number of records of the endpoint, or callable (first response) -> total
+        :param concurrency: maximum number of pages in flight once the total is known
+        :return: generator of records
+        """
+        if page_size < 1:
+            raise ValueError("page_size must be greater than 0")
+        records = records or _page_records
+        end = start + limit if limit is not None else None
+        pool = concurrent.futures.ThreadPoolExecutor(max_workers=max(concurrency, 1),
+                                                     thread_name_prefix="BioREST-pages")
+        pending = collections.deque()
+
+        def _submit(offset):
+            size = page_size if end is None else min(page_size, end - offset)
+            pending.append((pool.submit(contextvars.copy_context().run, fetch, offset, size), size))
+
+        try:
+            _submit(start)
+            following = start + page_size
+            known = None
+            while pending:
+                future, size = pending.popleft()
+                res = future.result()
+                if known is None and total is not None:
+                    known = total(res) if callable(total) else total
+                    if known is not None:
+                        end = min(end, known) if end is not None else known
+                page = records(res)
+                if len(page) >= size:
+                    # a full page, more records may follow: keep the pipeline fed before handing the page out
+                    window = max(concurrency, 1) if known is not None else 1
+                    while len(pending) < window and (end is None or following < end):
+                        _submit(following)
+                        following += page_size
+                for record in page[:size]:
+                    yield record
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def download(self, query, filename, checksum=None, decompress=False, **kargs):
+        """
+        Download a bulk file to disk, resumable and in parallel segments (see :class:`BioREST.Download.Downloader`)
+        :param query: suffix appended to the service url, or a full url
+        :param filename: target file
+        :param checksum: expected digest of the downloaded bytes, 'algorithm:hexdigest'
+        :param decompress: gunzip the downloaded bytes to filename
+        :param kargs: Downloader parameters (segments, progress ...)
+        :return: filename
+        """
+        url = query if query.startswith("http") else '%s/%s' % (self.url, query)
+        kargs.setdefault('timeout', self._timeout)
+        kargs.setdefault('scheduler', self.scheduler)
+        return Downloader(**kargs).download(url, filename, checksum=checksum, decompress=decompress,
+                                            headers={'User-Agent': self.get_user_agent()})
+
     @staticmethod
     def __interpret_returned_request(res, frmt):
         # must be a response
@@ -232,17 +1046,34 @@ class REST(Service):
     def http_get(self, query, frmt='json', params={}, **kargs):
         """
         Do a HTTP Get
-        :param kargs: headers or other
+        :param kargs: headers or other, cache=False bypass the response caches for this call, stream=True returns
+            an iterator of lines (stream='bytes' of byte chunks) instead of loading the whole response,
+            idempotent=True allows retries of non idempotent methods
         :param params: params to add in url
         :param frmt: frmt of response, xml or json mainly
         :param query: suffix that will be appended to the main url attribute.
         """
         if isinstance(query, list):
             log.debug("Running http get (call for a list)")
-            return [self.__get_one(key, frmt, params=params, **kargs) for key in query]
+            return self._run_sync(self.http_get_async(query, frmt, params=params, **kargs))
         log.debug("Running http get (single call mode)")
         return self.__get_one(query, frmt, params=params, **kargs)
 
+    async def http_get_async(self, query, frmt='json', params={}, concurrency=None, **kargs):
+        """
+        Do a HTTP Get from a coroutine, a list of queries is fetched concurrently
+        :param query: suffix that will be appended to the main url attribute, or a list of them
+        :param frmt: frmt of response, xml or json mainly
+        :param params: params to add in url
+        :param concurrency: maximum number of requests in flight, default to :attr:`CONCURRENCY`
+        :param kargs: headers or other
+        :return: response, or list of responses in the same order as query
+        """
+        queries = query if isinstance(query, list) else [query]
+        calls = [functools.partial(self.__get_one, key, frmt, params=params, **kargs) for key in queries]
+        res = await self.gather(calls, concurrency=concurrency)
+        return res if isinstance(query, list) else res[0]
+
     def __get_one(self, query, frmt='json', params={}, **kargs):
         """
         HTTP get only one requests
@@ -259,33 +1090,8 @@ class REST(Service):
                 url = query
             else:
                 url = '%s/%s' % (self.url, query)
-        try:
-            kargs['params'] = params
-            kargs['timeout'] = self._timeout
-
-            log.debug("Start downloading requests")
-            res = self.session.get(url, **kargs)
-            log.debug("Finish downloading requests Targeted URL :%s" % res.url)
-
-            if res.status_code != 200:
-                mes = ("Requests Status is not OK => {0} : {1}".format(res.status_code, self.response_codes[
-                    res.status_code]))
-                raise RestServiceError(mes)
-
-            # For avoid too many requests
-            time.sleep(1 / self._request_per_sec)
-
-            self.last_response = res
-            res = self.__interpret_returned_request(res, frmt)
-            try:
-                # for python 3 compatibility
-                res = res.decode()
-            except:
-                pass
-            return res
-        except Exception as e:
-            log.error(e)
-            raise RestServiceError(e)
+        kargs['params'] = params
+        return self.__request('GET', url, frmt, **kargs)
 
     def http_post(self, query, params=None, data=None, frmt='xml', headers=None, files=None, **kargs):
         """
@@ -294,8 +1100,7 @@ class REST(Service):
         query and frmt are services parameters. Others are post parameters
         #NOTE in requests.get you can use params parameter
         BUT in post, you use data
-        only single post implemented for now unlike get that can be asynchronous
-        or list of queries
+        a list of queries is posted concurrently (see :meth:`http_post_async`)
 
         :param query:
         :param params:
@@ -306,6 +1111,10 @@ class REST(Service):
         :param kargs:
         :return:
         """
+        if isinstance(query, list):
+            log.debug("Running http post (call for a list)")
+            return self._run_sync(self.http_post_async(query, params=params, data=data, frmt=frmt, headers=headers,
+                                                       files=files, **kargs))
         if headers is None:
             headers = {'User-Agent': self.get_user_agent(), 'Accept': self.content_types[frmt]}
 
@@ -318,6 +1127,26 @@ class REST(Service):
         kargs.update({'frmt': frmt})
         return self.__post_one(**kargs)
 
+    async def http_post_async(self, query, params=None, data=None, frmt='xml', headers=None, files=None,
+                              concurrency=None, **kargs):
+        """
+        Do a HTTP post from a coroutine, a list of queries is posted concurrently with the same data
+        :param query: suffix that will be appended to the main url attribute, or a list of them
+        :param params:
+        :param data:
+        :param frmt:
+        :param headers:
+        :param files:
+        :param concurrency: maximum number of requests in flight, default to :attr:`CONCURRENCY`
+        :param kargs:
+        :return: response, or list of responses in the same order as query
+        """
+        queries = query if isinstance(query, list) else [query]
+        calls = [functools.partial(self.http_post, key, params=params, data=data, frmt=frmt, headers=headers,
+                                   files=files, **kargs) for key in queries]
+        res = await self.gather(calls, concurrency=concurrency)
+        return res if isinstance(query, list) else res[0]
+
     def __post_one(self, query, frmt='json', **kargs):
         """
         Perform a HTTP post
@@ -330,29 +1159,299 @@ class REST(Service):
             url = self.url
         else:
             url = '%s/%s' % (self.url, query)
+        return self.__request('POST', url, frmt, **kargs)
+
+    def __request(self, method, url, frmt, cache=True, stream=False, chunk_size=64 * 1024, idempotent=None, **kargs):
+        """
+        Perform one HTTP request, going through the memory and disk caches and the host rate limiter
+        Stale cached responses are revalidated with If-None-Match/If-Modified-Since, a 304 is served locally
+        Identical requests in flight at the same time are coalesced into one network call
+        :param method: http method
+        :param url: full url
+        :param frmt: frmt of response, xml or json mainly
+        :param cache: if False, the memory and disk caches are bypassed for this call
+        :param stream: if True, returns an iterator of lines, if 'bytes' an iterator of byte chunks (never cached)
+        :param chunk_size: size of chunks read from the network when streaming
+        :param idempotent: if True, the request can be retried even if the method is not idempotent (see
+            :class:`RetryPolicy`)
+        :param kargs: requests parameters (params, data, headers ...)
+        :return: decoded response
+        """
+        try:
+            kargs.setdefault('timeout', self._timeout)
+            store = self.cache if cache and not stream else None
+            memo = self.memory_cache if cache and not stream else None
+            accept = (kargs.get('headers') or {}).get('Accept')
+            key = request_key(method, url, kargs.get('params'), kargs.get('data', kargs.get('json')), accept)
+            # decoded value depends on frmt
+            memo_key = "%s:%s" % (key, frmt)
+            if memo:
+                value = memo.get(memo_key, _missing)
+                if value is not _missing:
+                    log.debug("Memory cache hit for %s" % url)
+                    self.metrics.observe_cache(self.name, 'memory')
+                    return value
+            if stream:
+                return self.__fetch(method, url, frmt, key, memo_key, None, None, stream, chunk_size, idempotent,
+                                    kargs)
+            # identical requests in flight (other threads or coroutines) share the same network call
+            return _single_flight.do(memo_key, functools.partial(self.__fetch, method, url, frmt, key, memo_key,
+                                                                 store, memo, stream, chunk_size, idempotent, kargs))
+        except Exception as e:
+            log.error(e)
+            raise RestServiceError(e, status=getattr(e, 'status', None))
+
+    def __fetch(self, method, url, frmt, key, memo_key, store, memo, stream, chunk_size, idempotent, kargs):
+        """
+        Get a response from the disk cache or the network, see :meth:`__request` for parameters
+        """
+        call = {'service': self.name, 'method': method, 'url': url, 'endpoint': self._endpoint(url),
+                'request_id': next(_request_ids), 'context': {}}
+        entry = None
+        if store:
+            entry = store.get(key, stale=True)
+            if entry is not None and entry['fresh']:
+                log.debug("Cache hit for %s" % url)
+                self.metrics.observe_cache(self.name, 'disk')
+                return self.__from_cache_entry(entry, frmt, memo, memo_key, call)
+            if entry is not None:
+                # stale copy, ask the server if it is still valid
+                conditional = self._validators(entry['headers'])
+                if conditional:
+                    kargs['headers'] = dict(kargs.get('headers') or {}, **conditional)
+                else:
+                    entry = None
+
+        res = self.__send(method, url, call, stream=bool(stream), idempotent=idempotent, **kargs)
+
+        if res.status_code == 304 and entry is not None:
+            log.debug("Not modified, serving local copy of %s" % url)
+            self.metrics.observe_cache(self.name, 'revalidated')
+            store.refresh(key, ttl=self._cache_ttl, service=self.name)
+            return self.__from_cache_entry(entry, frmt, memo, memo_key, call)
+
+        if res.status_code != 200:
+            res.close()
+            mes = ("Requests Status is not OK => {0} : {1}".format(res.status_code, self.response_codes.get(
+                res.status_code, res.reason)))
+            self.__fire('on_error', call, status=res.status_code, error=mes)
+            raise RestServiceError(mes, status=res.status_code)
+
+        if stream:
+            self.last_response = res
+            return iter_response(res, mode='bytes' if stream == 'bytes' else 'lines', chunk_size=chunk_size)
+
+        if store or memo:
+            self.metrics.observe_cache(self.name, 'miss')
+        headers = {k: v for k, v in res.headers.items() if k.lower() in self._cached_headers}
+        if store:
+            store.set(key, res.url, res.status_code, headers, res.content, ttl=self._cache_ttl, service=self.name)
+        value = self.__decode(res, frmt, call, source='network')
+        if memo:
+            memo.set(memo_key, value, len(res.content), ttl=self._cache_ttl, service=self.name,
+                     tag=self._validators(headers))
+        return value
+
+    def __send(self, method, url, call, idempotent=None, **kargs):
+        """
+        Send a request on the network, retrying according to :attr:`retry_policy`
+        Failures feed the host circuit breaker, requests fail fast while it is open
+        :param method: http method
+        :param url: full url
+        :param call: hooks payload of the request
+        :param idempotent: force idempotency of the request, default depends on method
+        :param kargs: requests parameters
+        :return: last response
+        """
+        policy = self.retry_policy
+        transport = self.transport
+        start = time.monotonic()
+        attempt = 0
+        breaker = self._circuit_breaker(url)
+        endpoint = self._endpoint(url)
+        # the breaker counts logical requests: it is checked before the first attempt and told the outcome once
+        # the retries are over
+        if not breaker.allow():
+            state = breaker.state
+            raise RestServiceError("Host %s is unavailable (%s), failing fast" % (
+                breaker.host, "half open, trial in flight" if state == breaker.HALF_OPEN else "circuit open"))
+        try:
+            while True:
+                if attempt and breaker.state == breaker.OPEN:
+                    # opened by other requests meanwhile
+                    raise RestServiceError("Host %s is unavailable (circuit open), failing fast" % breaker.host)
+                if transport.throttle:
+                    # wait for a slot of the process wide scheduler, then our turn on the host budget, both shared
+                    # with all other services
+                    job = current_job()
+                    queued = self.scheduler.acquire(url, priority=self._priority,
+                                                    job=job if job is not None else self.name)
+                    self.metrics.observe_queue(self.name, queued)
+                try:
+                    if transport.throttle:
+                        waited = self._rate_limiter(url).acquire()
+                        self.metrics.observe_rate_limit(self.name, waited)
+                        log.debug("Start downloading requests (waited %.3fs for rate limit)" % waited)
+                    res, error = None, None
+                    self.__fire('before_request', call, attempt=attempt)
+                    sent = time.monotonic()
+                    try:
+                        res = transport.send(method, url, **kargs)
+                        log.debug("Finish downloading requests Targeted URL :%s" % res.url)
+                    except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                        error = e
+                    network_time = time.monotonic() - sent
+                finally:
+                    if transport.throttle:
+                        self.scheduler.release(url)
+                self.__observe(endpoint, res, network_time, kargs.get('stream'))
+                if error is not None:
+                    self.__fire('on_error', call, attempt=attempt, error=error)
+                else:
+                    self.__fire('after_response', call, attempt=attempt, status=res.status_code,
+                                network_time=network_time,
+                                bytes_in=int(res.headers.get('Content-Length') or 0) if kargs.get('stream') else len(
+                                    res.content or b''))
+                if error is None and res.status_code < 500:
+                    breaker.record_success()
+                    if res.status_code not in policy.statuses:
+                        return res
+                delay = policy.should_retry(method, attempt, time.monotonic() - start, response=res, error=error,
+                                            idempotent=idempotent)
+                if delay is None:
+                    if error is not None or res.status_code >= 500:
+                        breaker.record_failure()
+                    if error is not None:
+                        raise error
+                    return res
+                self.__fire('on_retry', call, attempt=attempt, delay=delay,
+                            status=res.status_code if res is not None else None, error=error)
+                attempt += 1
+                self.metrics.observe_retry(self.name, endpoint)
+                log.warning("Request to %s failed (%s), retry %s/%s in %.1fs" % (
+                    url, error if error is not None else res.status_code, attempt, policy.max_retries, delay))
+                if res is not None:
+                    res.close()
+                time.sleep(delay)
+        except BaseException:
+            # any other error (invalid url, decoding, cassette miss, interruption ...) must not leave a trial
+            # request of a half open circuit in flight forever
+            breaker.release()
+            raise
+
+    def _endpoint(self, url):
+        """
+        Endpoint name used in metrics, the first part of the path relative to the service url
+        :param url: full url
+        """
+        if self.url and url.startswith(self.url):
+            path = url[len(self.url):]
+        else:
+            path = urllib.parse.urlsplit(url).path
+        return path.strip("/").split("/")[0].split("?")[0] or "/"
+
+    def __observe(self, endpoint, res, latency, stream=False):
+        """
+        Record one network attempt in metrics
+        :param endpoint: endpoint name
+        :param res: response or None if the request failed
+        :param latency: seconds
+        :param stream: if True, the body is not read, its size is taken from Content-Length
+        """
+        if res is None:
+            self.metrics.observe_request(self.name, endpoint, 'error', latency)
+            return
+        body = res.request.body if res.request is not None else None
+        if stream:
+            bytes_in = int(res.headers.get('Content-Length') or 0)
+        else:
+            bytes_in = len(res.content or b'')
+        self.metrics.observe_request(self.name, endpoint, res.status_code, latency, bytes_in=bytes_in,
+                                     bytes_out=len(body) if body else 0)
 
+    def __from_cache_entry(self, entry, frmt, memo, memo_key, call):
+        """
+        Decoded value of a disk cache entry, reusing the memory cache copy if it is the same version
+        :param entry: disk cache entry
+        :param frmt: frmt of response
+        :param memo: memory cache or None
+        :param memo_key: key in memory cache
+        :param call: hooks payload of the request
+        """
+        tag = self._validators(entry['headers'])
+        previous = memo.peek(memo_key) if memo else None
+        if previous is not None and tag and previous[1] == tag:
+            # same version already decoded, no parsing needed
+            value = previous[0]
+        else:
+            value = self.__decode(self._response_from_cache(entry), frmt, call, source='cache')
+        if memo:
+            memo.set(memo_key, value, len(entry['body']), ttl=self._cache_ttl, service=self.name, tag=tag)
+        return value
+
+    def __decode(self, res, frmt, call=None, source='network'):
+        """
+        Interpret a response according to frmt, bytes are decoded to str when possible
+        :param res: response
+        :param frmt: frmt of response
+        :param call: hooks payload of the request
+        :param source: origin of the response, network or cache
+        """
+        self.last_response = res
+        start = time.monotonic()
+        res = self.__interpret_returned_request(res, frmt)
         try:
-            log.debug("Start downloading requests")
-            res = self.session.post(url, **kargs)
-            log.debug("Finish downloading requests Targeted URL :%s" % url)
+            # for python 3 compatibility
+            res = res.decode()
+        except:
+            pass
+        if call is not None:
+            self.__fire('on_parse', call, frmt=frmt, decode_time=time.monotonic() - start, source=source)
+        return res
 
-            if res.status_code != 200:
-                mes = ("Requests Status is not OK => {0} : {1}".format(res.status_code, self.response_codes[
-                    res.status_code]))
-                raise RestServiceError(mes)
+    def __fire(self, event, call, **extra):
+        """
+        Fire an event on global and service hooks
+        :param event: event name
+        :param call: hooks payload of the request
+        :param extra: event specific payload
+        """
+        if event not in hooks and event not in self.hooks:
+            return
+        payload = dict(call, **extra)
+        hooks.fire(event, payload)
+        self.hooks.fire(event, payload)
 
-            # For avoid too many requests
-            time.sleep(1 / self._request_per_sec)
+    @staticmethod
+    def _validators(headers):
+        """
+        Conditional request headers built from the validators of a cached response
+        :param headers: headers of the cached response
+        :return: dict with If-None-Match and/or If-Modified-Since
+        """
+        headers = requests.structures.CaseInsensitiveDict(headers)
+        conditional = {}
+        if headers.get('ETag'):
+            conditional['If-None-Match'] = headers['ETag']
+        if headers.get('Last-Modified'):
+            conditional['If-Modified-Since'] = headers['Last-Modified']
+        return conditional
 
-            self.last_response = res
-            res = self.__interpret_returned_request(res, frmt)
-            try:
-                return res.decode()
-            except:
-                return res
-        except Exception as e:
-            log.error(e)
-            raise RestServiceError(e)
+    @staticmethod
+    def _response_from_cache(entry):
+        """
+        Rebuild a requests Response from a cache entry
+        :param entry: dict with url, status, headers and body
+        :return: Response
+        """
+        res = Response()
+        res.url = entry['url']
+        res.status_code = entry['status']
+        res.reason = "OK"
+        res.headers = requests.structures.CaseInsensitiveDict(entry['headers'])
+        res.encoding = requests.utils.get_encoding_from_headers(res.headers)
+        res._content = entry['body']
+        return res
 
     @staticmethod
     def get_user_agent():
@@ -500,11 +1599,378 @@ def check_range(value, a, b, strict=False):
             raise ValueError(" {} must be less than {}".format(value, b))
 
 
+def _item_size(item):
+    # encoded length of the item and its separator in a query
+    return len(str(item).encode()) + 1
+
+
+def chunked(items, size=None, max_bytes=None, weight=_item_size):
+    """
+    Split items in consecutive chunks holding at most size items and max_bytes
+    An item heavier than max_bytes is put alone in its chunk.
+
+    list(chunked(range(5), 2))
+    [[0, 1], [2, 3], [4]]
+
+    :param items: iterable of items (ids ...)
+    :param size: maximum number of items by chunk, None for no limit
+    :param max_bytes: maximum size by chunk (sum of weight of its items), None for no limit
+    :param weight: callable giving the size of an item, default to its length in the url/body with a separator
+    :return: generator of lists
+    """
+    if size is not None and size < 1:
+        raise ValueError("size must be greater than 0")
+    chunk, total = [], 0
+    for item in items:
+        w = weight(item) if max_bytes is not None else 0
+        if chunk and ((size is not None and len(chunk) >= size) or (max_bytes is not None and total + w > max_bytes)):
+            yield chunk
+            chunk, total = [], 0
+        chunk.append(item)
+        total += w
+    if chunk:
+        yield chunk
+
+
+def merge_dict(parts):
+    """
+    Merge dict results of chunks, nested dicts are merged, lists concatenated, other values of later chunks win
+    :param parts: list of dict
+    :return: dict (of the type of the first part, e.g. defaultdict)
+    """
+    res = copy.copy(parts[0]) if parts else {}
+    for part in parts[1:]:
+        for key, value in part.items():
+            current = res.get(key)
+            if isinstance(current, dict) and isinstance(value, dict):
+                res[key] = merge_dict([current, value])
+            elif isinstance(current, list) and isinstance(value, list):
+                res[key] = current + value
+            else:
+                res[key] = value
+    return res
+
+
+def merge_list(parts):
+    """
+    Concatenate list results of chunks
+    :param parts: list of lists
+    :return: list
+    """
+    return [x for part in parts for x in part]
+
+
+def merge_text(separator=""):
+    """
+    Build a merge function joining text results of chunks, records of consecutive chunks are separated by separator
+    (not added if a part already ends with it)
+    :param separator: record separator, e.g. "\\n" for line based formats
+    :return: callable (parts) -> str or bytes
+    """
+    def _merge(parts):
+        if not parts:
+            return ""
+        sep = separator.encode() if isinstance(parts[0], bytes) else separator
+        out = []
+        for i, part in enumerate(parts):
+            out.append(part)
+            if sep and i < len(parts) - 1 and not part.endswith(sep):
+                out.append(sep)
+        return parts[0][:0].join(out)
+    return _merge
+
+
+def merge_xml(parts):
+    """
+    Merge XML documents of chunks: the children of the root elements of the following documents are appended to the
+    root element of the first one
+    :param parts: list of XML documents (str or bytes)
+    :return: merged document, of the type of the parts
+    """
+    parts = [x for x in parts if x]
+    if not parts:
+        return None
+    if len(parts) == 1:
+        return parts[0]
+    root = ET.fromstring(parts[0])
+    for part in parts[1:]:
+        root.extend(list(ET.fromstring(part)))
+    if isinstance(parts[0], bytes):
+        return ET.tostring(root, encoding="utf-8")
+    return ET.tostring(root, encoding="unicode")
+
+
+def _page_records(res):
+    # default records of a page: the response itself or its non empty lines
+    if isinstance(res, list):
+        return res
+    if isinstance(res, bytes):
+        res = res.decode()
+    if isinstance(res, str):
+        return [line for line in res.split("\n") if line]
+    raise TypeError("Don't know how to get records of a %s page, provide records" % type(res).__name__)
+
+
+def merge_results(parts, separator="\n"):
+    """
+    Merge results of chunks according to their type: dicts are merged, lists concatenated, texts joined by separator
+    :param parts: list of chunk results (same type)
+    :param separator: record separator of text results
+    :return: merged result
+    """
+    parts = [x for x in parts if x is not None]
+    if not parts:
+        return None
+    if isinstance(parts[0], dict):
+        return merge_dict(parts)
+    if isinstance(parts[0], list):
+        return merge_list(parts)
+    if isinstance(parts[0], (str, bytes)):
+        return merge_text(separator)(parts)
+    raise TypeError("Don't know how to merge results of type %s" % type(parts[0]).__name__)
+
+
+def _gunzip(chunks):
+    """
+    Incrementally decompress gzip chunks, concatenated gzip members are supported
+    :param chunks: iterable of compressed bytes
+    """
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        while chunk:
+            data = decompressor.decompress(chunk)
+            if data:
+                yield data
+            chunk = decompressor.unused_data
+            if decompressor.eof:
+                decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            else:
+                chunk = b''
+    data = decompressor.flush()
+    if data:
+        yield data
+
+
+def iter_response(res, mode='lines', chunk_size=64 * 1024, decompress=None):
+    """
+    Iterate over a streamed response in constant memory, the response is closed at the end
+    :param res: requests Response opened with stream=True
+    :param mode: 'lines' yields str lines without end of line, 'bytes' yields byte chunks
+    :param chunk_size: size of chunks read from the network
+    :param decompress: gunzip the body (not the Content-Encoding, already handled by requests), default to auto
+        detection of the gzip magic number
+    """
+    try:
+        chunks = (chunk for chunk in res.iter_content(chunk_size=chunk_size) if chunk)
+        first = next(chunks, b'')
+        if decompress is None:
+            decompress = first[:2] == b'\x1f\x8b'
+
+        def _source():
+            yield first
+            for chunk in chunks:
+                yield chunk
+
+        source = _gunzip(_source()) if decompress else _source()
+        if mode == 'bytes':
+            for chunk in source:
+                yield chunk
+            return
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        pending = ''
+        for chunk in source:
+            lines = (pending + decoder.decode(chunk)).split('\n')
+            pending = lines.pop()
+            for line in lines:
+                yield line
+        pending += decoder.decode(b'', final=True)
+        if pending:
+            yield pending
+    finally:
+        res.close()
+
+
+def _local_name(tag):
+    """
+    Name of a tag as seen by the lxml soup: namespace dropped and lowercased
+    :param tag: ElementTree tag, e.g. {http://uri}restUrl
+    """
+    if not isinstance(tag, str):
+        # comments and processing instructions
+        return None
+    return tag.rsplit("}", 1)[-1].lower()
+
+
+def _name_matcher(name):
+    """
+    Build the predicate used by findAll to match tag names
+    :param name: tag name, list of tag names, or None/True for any tag (prefixed names like ns:tag are matched on
+        their local part)
+    """
+    if name is None or name is True:
+        return lambda local: local is not None
+    names = [name] if isinstance(name, str) else list(name)
+    names = set(x.rsplit(":", 1)[-1].lower() for x in names)
+    if len(names) == 1:
+        single = names.pop()
+        return lambda local: local == single
+    return lambda local: local in names
+
+
+def _find_all(elements, name=None, attrs=None, limit=None, **kwargs):
+    """
+    Filter ElementTree elements like bs4 findAll
+    :param elements: iterable of elements
+    :param name: tag name, list of tag names or None for any tag
+    :param attrs: dict of attributes values the elements must have
+    :param limit: maximum number of elements returned
+    :param kwargs: attributes values, as attrs
+    :return: list of :class:`XMLElement`
+    """
+    match = _name_matcher(name)
+    attrs = dict(attrs or {}, **kwargs)
+    found = []
+    for element in elements:
+        if not match(_local_name(element.tag)):
+            continue
+        this = XMLElement(element)
+        if attrs and any(this.get(k) != v for k, v in attrs.items()):
+            continue
+        found.append(this)
+        if limit is not None and len(found) >= limit:
+            break
+    return found
+
+
+class XMLElement(object):
+    """
+    Read only view of an ElementTree element with the BeautifulSoup methods used on easyXML results
+    Tag and attribute names are lowercased and namespaces dropped, as they are with the lxml soup, so
+    element.findAll("resturl") or element.get("entry1") work the same.
+    """
+    __slots__ = ('element',)
+
+    def __init__(self, element):
+        """
+        :param element: xml.etree.ElementTree.Element
+        """
+        self.element = element
+
+    def _get_name(self):
+        return _local_name(self.element.tag)
+
+    name = property(_get_name, doc="Tag name (lowercased, without namespace)")
+
+    def _get_attrs(self):
+        return dict((_local_name(k), v) for k, v in self.element.attrib.items())
+
+    attrs = property(_get_attrs, doc="Dict of attributes")
+
+    def get(self, key, default=None):
+        """
+        Get an attribute
+        :param key: attribute name
+        :param default: returned if the attribute is missing
+        """
+        value = self.element.get(key)
+        if value is None:
+            return self.attrs.get(key.lower(), default)
+        return value
+
+    def _get_text(self):
+        return "".join(self.element.itertext())
+
+    text = property(_get_text, doc="Text of the element and its descendants")
+
+    def _get_string(self):
+        if len(self.element):
+            return None
+        return self.element.text
+
+    string = property(_get_string, doc="Text of the element if it has no children, None otherwise")
+
+    def _get_children(self):
+        return [XMLElement(x) for x in self.element if _local_name(x.tag) is not None]
+
+    children = property(_get_children, doc="List of child elements")
+
+    def _get_contents(self):
+        contents = [self.element.text] if self.element.text else []
+        for child in self.element:
+            if _local_name(child.tag) is not None:
+                contents.append(XMLElement(child))
+            if child.tail:
+                contents.append(child.tail)
+        return contents
+
+    contents = property(_get_contents, doc="List of child elements and text nodes")
+
+    def findAll(self, name=None, attrs=None, recursive=True, limit=None, **kwargs):
+        """
+        Find descendant elements
+        :param name: tag name, list of tag names or None for any tag
+        :param attrs: dict of attributes values the elements must have
+        :param recursive: if False, only direct children are searched
+        :param limit: maximum number of elements returned
+        :param kwargs: attributes values, as attrs
+        :return: list of :class:`XMLElement`
+        """
+        if recursive:
+            elements = self.element.iter()
+            # the element itself is not a match, as with bs4
+            next(elements)
+        else:
+            elements = iter(self.element)
+        return _find_all(elements, name, attrs, limit, **kwargs)
+
+    find_all = findAll
+
+    def find(self, name=None, attrs=None, recursive=True, **kwargs):
+        """
+        Find the first descendant element, see :meth:`findAll`
+        :return: :class:`XMLElement` or None
+        """
+        found = self.findAll(name, attrs, recursive=recursive, limit=1, **kwargs)
+        return found[0] if found else None
+
+    def __getattr__(self, name):
+        # bs4 shortcut, element.graphics is element.find("graphics")
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return self.find(name)
+
+    def __getitem__(self, key):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __iter__(self):
+        return iter(self.children)
+
+    def __len__(self):
+        return len(self.element)
+
+    def __eq__(self, other):
+        return isinstance(other, XMLElement) and other.element is self.element
+
+    def __hash__(self):
+        return id(self.element)
+
+    def __str__(self):
+        return ET.tostring(self.element, encoding="unicode")
+
+    def __repr__(self):
+        return "<XMLElement %s>" % self.name
+
+
 class easyXML(object):
     """
     class to ease the introspection of XML documents.
-    This class uses the standard xml module as well as the package BeautifulSoup
-    to help introspecting the XML documents.
+    The document is parsed once with the standard xml module, findAll/find/get/text work on the ElementTree
+    (see :class:`XMLElement`). The BeautifulSoup instance is only built if the soup attribute is used, or if the
+    document is not well formed XML.
+    For large documents, see :func:`iterparse`.
     """
 
     def __init__(self, data):
@@ -515,38 +1981,143 @@ class easyXML(object):
         have an URL instead, use :class:`readXML`
 
         """
-        self.data = data[:]
-
+        self.data = data
         try:
             self.root = ET.fromstring(self.data)
-        except:
-            self.root = self.data[:]
+            self._element = XMLElement(self.root)
+        except (ET.ParseError, ValueError):
+            # not xml (e.g. html), the soup is more tolerant
+            self.root = self.data
+            self._element = None
         self._soup = None
-        self.prettify = self.soup.prettify
-        self.findAll = self.soup.findAll
 
     def getchildren(self):
         """
         returns all children of the root XML document
-        This is just an alias to self.soup.getchildren()
         """
-        return self.root.getchildren()
+        return list(self.root)
 
     def _get_soup(self):
         if self._soup is None:
+            import bs4
             self._soup = bs4.BeautifulSoup(self.data, 'lxml')
         return self._soup
 
-    soup = property(_get_soup, doc="Returns the beautiful soup instance")
+    soup = property(_get_soup, doc="Returns the beautiful soup instance (built on first use)")
+
+    def findAll(self, name=None, attrs=None, recursive=True, limit=None, **kwargs):
+        """
+        Find elements of the document, the root element included
+        See :meth:`XMLElement.findAll` for parameters
+        :return: list of :class:`XMLElement` (bs4 Tag if the document is not well formed XML)
+        """
+        if self._element is None:
+            return self.soup.findAll(name, attrs or {}, recursive=recursive, limit=limit, **kwargs)
+        # the soup is the document, so the root element is one of its children
+        elements = self.root.iter() if recursive else iter([self.root])
+        return _find_all(elements, name, attrs, limit, **kwargs)
+
+    find_all = findAll
+
+    def find(self, name=None, attrs=None, recursive=True, **kwargs):
+        """
+        Find the first element of the document, see :meth:`findAll`
+        """
+        found = self.findAll(name, attrs, recursive=recursive, limit=1, **kwargs)
+        return found[0] if found else None
+
+    def _get_text(self):
+        if self._element is None:
+            return self.soup.text
+        return self._element.text
+
+    text = property(_get_text, doc="Text of the document")
+
+    def prettify(self):
+        """
+        :return: the document indented
+        """
+        if self._element is None:
+            return self.soup.prettify()
+        root = copy.deepcopy(self.root)
+        ET.indent(root)
+        return ET.tostring(root, encoding="unicode")
 
     def __str__(self):
-        txt = self.soup.prettify()
-        return txt
+        return self.prettify()
 
     def __getitem__(self, i):
         return self.findAll(i)
 
 
+def iterparse(source, tag=None, chunk_size=64 * 1024):
+    """
+    Parse a large XML document incrementally, in constant memory
+    Each matching element is yielded once fully parsed, then cleared and dropped from the tree: copy what is needed
+    before the next iteration.
+    :param source: file name, file like object, bytes/str document or iterable of chunks (e.g. the iterator returned
+        by http_get(..., stream='bytes'))
+    :param tag: name or list of names of the elements to yield (matched as in findAll), default to the children of
+        the root element
+    :param chunk_size: size of chunks read from files
+    :return: iterator of :class:`XMLElement`
+
+    for entry in iterparse(k.http_get("get/hsa04660/kgml", frmt="txt", stream="bytes"), tag="entry"):
+        entry.get("name"), entry.find("graphics").get("name")
+    """
+    if isinstance(source, (bytes, str)) and (isinstance(source, bytes) or source.lstrip().startswith("<")):
+        chunks = [source]
+    elif isinstance(source, str):
+        chunks = _read_chunks(open(source, "rb"), chunk_size)
+    elif hasattr(source, "read"):
+        chunks = _read_chunks(source, chunk_size, close=False)
+    else:
+        chunks = source
+    match = _name_matcher(tag) if tag is not None else None
+    parser = ET.XMLPullParser(events=("start", "end"))
+    # open elements with their selected flag, and number of open selected elements
+    stack = []
+    opened = 0
+
+    def _events():
+        nonlocal opened
+        for event, element in parser.read_events():
+            if event == "start":
+                selected = len(stack) == 1 if match is None else match(_local_name(element.tag))
+                stack.append((element, selected))
+                opened += selected
+                continue
+            element, selected = stack.pop()
+            opened -= selected
+            if selected:
+                yield element
+            if selected or not opened:
+                # nothing outside selected elements is kept
+                element.clear()
+                if stack:
+                    stack[-1][0].remove(element)
+
+    for chunk in chunks:
+        parser.feed(chunk)
+        for element in _events():
+            yield XMLElement(element)
+    parser.close()
+    for element in _events():
+        yield XMLElement(element)
+
+
+def _read_chunks(f, chunk_size, close=True):
+    try:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        if close:
+            f.close()
+
+
 class readXML(easyXML):
     """
     Read XML and converts to beautifulsoup data structure
@@ -0,0 +1,264 @@
+# coding=utf-8
+"""
+Transports used by the REST class to send requests
+HTTPTransport sends requests on the network with the pooled session of the host. RecordingTransport does the same and
+keeps every response in a cassette, a zip file with one compressed entry per request key. ReplayTransport answers from
+a cassette without any network access, with a simulated latency and bandwidth, so services can be profiled end to end
+on an offline machine.
+
+    from BioREST.Service import set_default_transport
+    from BioREST.Transport import Cassette, RecordingTransport, ReplayTransport
+    with Cassette("kegg.zip") as cassette:
+        set_default_transport(RecordingTransport(cassette))
+        KEGG().get("hsa:7535")
+    set_default_transport(ReplayTransport(Cassette("kegg.zip"), latency=0.15, bandwidth=2 * 1024 ** 2))
+    KEGG().get("hsa:7535")  # no network, ~150ms
+"""
+
+__author__ = "Arnaud KOPP"
+__copyright__ = "© 2015-2016 KOPP Arnaud All Rights Reserved"
+__credits__ = ["KOPP Arnaud"]
+__license__ = "GNU GPL V3.0"
+__maintainer__ = "Arnaud KOPP"
+__email__ = "kopp.arnaud@gmail.com"
+__status__ = "Production"
+
+import io
+import os
+import json
+import time
+import random
+import zipfile
+import threading
+import requests
+from requests.models import Response
+from BioREST.Cache import request_key
+import logging
+log = logging.getLogger(__name__)
+
+
+def transport_key(method, url, **kargs):
+    """
+    Key of a request in a cassette, the same as the response cache one
+    :param method: http method
+    :param url: full url
+    :param kargs: requests parameters (params, data, json, headers ...)
+    """
+    accept = (kargs.get('headers') or {}).get('Accept')
+    return request_key(method, url, kargs.get('params'), kargs.get('data', kargs.get('json')), accept)
+
+
+class CassetteMiss(KeyError):
+    """
+    Raised when a replayed request was not recorded
+    """
+    pass
+
+
+class Cassette(object):
+    """
+    Recorded responses stored in a zip file
+    Each request key has a <key>.json entry (method, url, status, reason, headers, elapsed) and a deflated <key>.body
+    entry. Bodies are read lazily, recorded responses are kept in memory until save() (or the end of a with block).
+    """
+
+    def __init__(self, path):
+        """
+        :param path: zip file, created on save if it does not exist
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._recorded = {}
+        self._index = {}
+        if os.path.exists(path):
+            with zipfile.ZipFile(path) as archive:
+                for name in archive.namelist():
+                    if name.endswith(".json"):
+                        self._index[name[:-5]] = json.loads(archive.read(name).decode())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.save()
+
+    def __contains__(self, key):
+        return key in self._recorded or key in self._index
+
+    def __len__(self):
+        return len(set(self._recorded) | set(self._index))
+
+    def keys(self):
+        """
+        :return: list of recorded request keys
+        """
+        return list(set(self._recorded) | set(self._index))
+
+    def get(self, key):
+        """
+        Get a recorded response
+        :param key: request key (see :func:`transport_key`)
+        :return: tuple (meta, body) or None
+        """
+        with self._lock:
+            if key in self._recorded:
+                return self._recorded[key]
+            meta = self._index.get(key)
+        if meta is None:
+            return None
+        with zipfile.ZipFile(self.path) as archive:
+            return meta, archive.read(key + ".body")
+
+    def record(self, key, method, res):
+        """
+        Keep a response, a later response for the same key replaces it (e.g. the success after a retried 503)
+        :param key: request key (see :func:`transport_key`)
+        :param method: http method
+        :param res: requests Response, its body is read
+        """
+        body = res.content
+        # body is stored decoded, the replayed response must not look compressed
+        headers = dict((k, v) for k, v in res.headers.items() if k.lower() not in ('content-encoding',
+                                                                                    'transfer-encoding'))
+        headers['Content-Length'] = str(len(body))
+        meta = {'method': method, 'url': res.url, 'status': res.status_code, 'reason': res.reason,
+                'headers': headers, 'elapsed': res.elapsed.total_seconds()}
+        with self._lock:
+            self._recorded[key] = (meta, body)
+
+    def save(self):
+        """
+        Write recorded responses, the file is replaced atomically
+        """
+        with self._lock:
+            if not self._recorded:
+                return
+            tmp = self.path + ".tmp"
+            with zipfile.ZipFile(tmp, "w", compression=zipfile.ZIP_DEFLATED) as out:
+                if self._index:
+                    with zipfile.ZipFile(self.path) as archive:
+                        for key, meta in self._index.items():
+                            if key not in self._recorded:
+                                out.writestr(key + ".json", json.dumps(meta))
+                                out.writestr(key + ".body", archive.read(key + ".body"))
+                for key, (meta, body) in self._recorded.items():
+                    out.writestr(key + ".json", json.dumps(meta))
+                    out.writestr(key + ".body", body)
+            os.replace(tmp, self.path)
+            for key, (meta, body) in self._recorded.items():
+                self._index[key] = meta
+            self._recorded.clear()
+        log.debug("Cassette %s saved (%s responses)" % (self.path, len(self._index)))
+
+
+class HTTPTransport(object):
+    """
+    Send requests on the network with the pooled session of the host
+    """
+    # requests go through the host rate limiter
+    throttle = True
+
+    def send(self, method, url, **kargs):
+        """
+        :param method: http method
+        :param url: full url
+        :param kargs: requests parameters
+        :return: requests Response
+        """
+        # imported here as Service imports this module
+        from BioREST.Service import get_session
+        return get_session(url).request(method, url, **kargs)
+
+
+class RecordingTransport(HTTPTransport):
+    """
+    Send requests on the network and record responses in a cassette
+    Streamed responses are read entirely to be recorded.
+    """
+
+    def __init__(self, cassette, transport=None):
+        """
+        :param cassette: :class:`Cassette`
+        :param transport: transport sending the requests, default to :class:`HTTPTransport`
+        """
+        self.cassette = cassette
+        self.transport = transport or HTTPTransport()
+
+    def send(self, method, url, **kargs):
+        res = self.transport.send(method, url, **kargs)
+        self.cassette.record(transport_key(method, url, **kargs), method, res)
+        return res
+
+
+class _ThrottledReader(io.RawIOBase):
+    """
+    File like object delivering a body at a given bandwidth
+    """
+
+    def __init__(self, body, bandwidth):
+        self._body = io.BytesIO(body)
+        self._bandwidth = bandwidth
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        data = self._body.read(size)
+        if data and self._bandwidth:
+            time.sleep(len(data) / float(self._bandwidth))
+        return data
+
+
+class ReplayTransport(object):
+    """
+    Answer requests from a cassette, without network access
+    The simulated time of a request is latency (+/- jitter) then the body size divided by bandwidth. Streamed bodies
+    are delivered chunk by chunk at that bandwidth.
+    """
+    # no remote server to protect
+    throttle = False
+
+    def __init__(self, cassette, latency=0., bandwidth=None, jitter=0., recorded_latency=False):
+        """
+        :param cassette: :class:`Cassette`
+        :param latency: seconds before the response headers are received
+        :param bandwidth: bytes per second, None for no limit
+        :param jitter: fraction of latency randomly added or removed
+        :param recorded_latency: if True, use the elapsed time recorded with each response instead of latency
+        """
+        self.cassette = cassette
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.jitter = jitter
+        self.recorded_latency = recorded_latency
+
+    def send(self, method, url, **kargs):
+        """
+        :param method: http method
+        :param url: full url
+        :param kargs: requests parameters
+        :return: requests Response
+        :raise CassetteMiss: if the request was not recorded
+        """
+        recorded = self.cassette.get(transport_key(method, url, **kargs))
+        if recorded is None:
+            raise CassetteMiss("No recorded response for %s %s" % (method, url))
+        meta, body = recorded
+        latency = meta.get('elapsed', self.latency) if self.recorded_latency else self.latency
+        if self.jitter:
+            latency *= 1 + random.uniform(-self.jitter, self.jitter)
+        if latency > 0:
+            time.sleep(latency)
+        res = Response()
+        res.url = meta['url']
+        res.status_code = meta['status']
+        res.reason = meta['reason']
+        res.headers = requests.structures.CaseInsensitiveDict(meta['headers'])
+        res.encoding = requests.utils.get_encoding_from_headers(res.headers)
+        if kargs.get('stream'):
+            res.raw = _ThrottledReader(body, self.bandwidth)
+        else:
+            if self.bandwidth:
+                time.sleep(len(body) / float(self.bandwidth))
+            res._content = body
+        return res
@@ -35,12 +35,12 @@ __email__ = "kopp.arnaud@gmail.com"
 __status__ = "Production"
 
 import io
-import urllib.request
-import gzip
+import functools
 import os
 import logging
-import pandas as pd
-from BioREST.Service import REST, list2string, check_param_in_list, tolist, reporthook
+from collections import defaultdict
+from BioREST.Service import REST, list2string, check_param_in_list, tolist, merge_dict
+from BioREST.Download import print_progress
 from BioREST.Fasta import FASTA
 
 log = logging.getLogger(__name__)
@@ -175,6 +175,7 @@ class Uniprot(REST):
                       'keywords', 'keyword-id', 'last-modified', 'length', 'organism', 'organism-id', 'pathway',
                       'protein names', 'reviewed', 'score', 'sequence', '3d', 'subcellular locations', 'taxonomy',
                       'tools', 'version', 'virus hosts', 'lineage-id', 'sequence-modified', 'proteome']
+    _max_mapping_ids = 2000
 
     def __init__(self, user="BioRestUser"):
         """
@@ -185,23 +186,18 @@ class Uniprot(REST):
         self.__uniprot_flt_file = None
         self.__headers = {'User-Agent': str(user)}
 
-    def download_flat_files(self, directory=''):
+    def download_flat_files(self, directory='', segments=4, progress=print_progress):
         """
-        Download uniprot swissprot fasta file
+        Download uniprot swissprot flat file, the download resumes if it was interrupted and is uncompressed on the
+        fly
         :param directory: Where to save file
+        :param segments: number of parallel segments
+        :param progress: progress callback, see :class:`BioREST.Download.Progress`
         """
-        log.infor('Retrieving file')
-        url = "ftp://ftp.ebi.ac.uk/pub/databases/uniprot/knowledgebase/uniprot_sprot.dat.gz"
-        gzfile = os.path.join(directory, "uniprot_sprot.dat.gz")
-        urllib.request.urlretrieve(url=url, filename=gzfile, reporthook=reporthook)
-
-        log.info("Uncompressing file...")
-        str_file = gzip.open("uniprot_sprot.dat.gz")
-        content = str_file.read()
+        log.info('Retrieving file')
+        url = "https://ftp.ebi.ac.uk/pub/databases/uniprot/knowledgebase/uniprot_sprot.dat.gz"
         self.__uniprot_flt_file = os.path.join(directory, "uniprot_sprot.fasta")
-        f = open(self.__uniprot_flt_file, "wb")
-        f.write(content)
-        f.close()
+        self.download(url, self.__uniprot_flt_file, decompress=True, segments=segments, progress=progress)
         log.info('Finish uncompressing file')
 
     def mapping(self, fr="ID", to="KEGG_ID", query="P13368"):
@@ -210,7 +206,7 @@ class Uniprot(REST):
         :param fr: the source database identifier.
         :param to: the targetted database identifier.
         :param query: a string containing one or more IDs separated by a space
-        It can also be a list of strings.
+        It can also be a list of strings, ids are mapped by chunks of 2000.
         :return: a list. The first element is the source database Id. The second
         is the targetted source identifier. Following elements are alternate
         of one the entry and its mapped Id. If a query has several mapped
@@ -225,31 +221,35 @@ class Uniprot(REST):
         defaultdict(<type 'list'>, {'P43403': ['1FBV', '1M61', '1U59',
         '2CBL', '2OQ1', '2OZO', '2Y1N', '3ZNI', '4A4B', '4A4C', '4K2R']})
 
+        """
+        query = list2string(query, sep=" ", space=False).split()
+        # the service accepts a limited number of ids by request
+        return self.batch(functools.partial(self._mapping, fr, to), query, size=self._max_mapping_ids,
+                          merge=merge_dict)
+
+    def _mapping(self, fr, to, ids):
+        """
+        Map one chunk of ids, see :meth:`mapping`
         """
         url = 'mapping/'  # the slash matters
 
-        query = list2string(query, sep=" ", space=False)
+        query = list2string(ids, sep=" ", space=False)
         params = {'from': fr, 'to': to, 'format': "tab", 'query': query}
         result = self.http_post(url, frmt="txt", data=params, headers=self.__headers)
 
+        result_dict = defaultdict(list)
         try:
             result = result.split()
             del result[0]
             del result[0]
         except:
             log.warning("Results seems empty...returning empty dictionary.")
-            return {}
-
-        if len(result) == 0:
-            return {}
-        else:
-            from collections import defaultdict
-            result_dict = defaultdict(list)
+            return result_dict
 
-            keys = result[0::2]
-            values = result[1::2]
-            for i, key in enumerate(keys):
-                result_dict[key].append(values[i])
+        keys = result[0::2]
+        values = result[1::2]
+        for i, key in enumerate(keys):
+            result_dict[key].append(values[i])
         return result_dict
 
     def retrieve(self, uniprot_id, frmt="xml"):
@@ -300,7 +300,7 @@ class Uniprot(REST):
         return f.sequence
 
     def search(self, query, frmt="tab", columns=None, include=False, sort="score", compress=False, limit=None,
-               offset=None):
+               offset=None, stream=False):
         """
         Provide some interface to the uniprot search interface.
         :param str query: query must be a valid uniprot query.
@@ -322,6 +322,8 @@ class Uniprot(REST):
         :param int limit: Maximum number of results to retrieve.
         :param int offset: Offset of the first result, typically used together
         with the limit parameter.
+        :param bool stream: returns an iterator over lines read from the network in constant memory, compressed
+        results are decoded on the fly
 
         To obtain the list of uniprot ID returned by the search of zap70 can be
         retrieved as follows::
@@ -388,9 +390,50 @@ class Uniprot(REST):
 
         params['query'] = query.replace("+", " ")
 
-        res = self.http_get("uniprot/", frmt="txt", params=params, headers=self.__headers)
+        res = self.http_get("uniprot/", frmt="txt", params=params, headers=self.__headers, stream=stream)
         return res
 
+    def iter_search(self, query, frmt="tab", columns=None, include=False, sort="score", page_size=1000, limit=None,
+                    offset=0):
+        """
+        Iterate over all the results of a search, pages of results (offset/limit) are requested lazily
+        The header line of tab results is yielded first, only once.
+
+        for line in u.iter_search("taxonomy:9606", frmt="tab", columns="id,entry name", page_size=5000):
+            ...
+
+        :param query: a valid uniprot query, see :meth:`search`
+        :param frmt: a line based format (tab or list)
+        :param columns: columns of tab results, see :meth:`search`
+        :param include: see :meth:`search`
+        :param sort: see :meth:`search`
+        :param page_size: number of results by request
+        :param limit: maximum number of results, None for all
+        :param offset: offset of the first result
+        :return: generator of lines
+        """
+        check_param_in_list(frmt, ["tab", "list"])
+        header = []
+
+        def _records(res):
+            lines = [x for x in (res or "").split("\n") if x]
+            if frmt == "tab" and lines:
+                # every page starts with the header
+                if not header:
+                    header.append(lines[0])
+                lines = lines[1:]
+            return lines
+
+        def _fetch(start, size):
+            return self.search(query, frmt=frmt, columns=columns, include=include, sort=sort, limit=size,
+                               offset=start)
+
+        pages = self.paginate(_fetch, page_size, records=_records, start=offset, limit=limit)
+        for i, line in enumerate(pages):
+            if i == 0 and header:
+                yield header[0]
+            yield line
+
     def quick_search(self, query, include=False, sort="score", limit=None):
         """
 
@@ -428,6 +471,7 @@ class Uniprot(REST):
         df = u.uniref("member:Q03063")
         df.Size
         """
+        import pandas as pd
         res = self.http_get("uniref/", params={"query": query, 'format': 'tab'}, frmt="txt", headers=self.__headers)
         res = pd.read_csv(io.StringIO(res.strip()), sep="\t")
         return res
@@ -444,6 +488,7 @@ class Uniprot(REST):
         separated by ; into a list of strings. e.g. the Gene Ontology IDs
         .. warning:: requires pandas library
         """
+        import pandas as pd
         if isinstance(entries, str):
             entries = [entries]
         else:
@@ -468,7 +513,7 @@ class Uniprot(REST):
                 if isinstance(output, type(None)):
                     output = df.copy()
                 else:
-                    output = output.append(df, ignore_index=True)
+                    output = pd.concat([output, df], ignore_index=True)
 
         output.drop_duplicates(inplace=True)
 
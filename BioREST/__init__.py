@@ -1,18 +1,65 @@
 # coding=utf-8
-from BioREST.ArrayExpress import ArrayExpress
-from BioREST.BioDBnet import BioDBnet
-from BioREST.Biogrid import Biogrid, BiogridParser
-from BioREST.Biomart import Biomart, BioMartQuery
-from BioREST.Encode import Encode
-from BioREST.Ensembl import Ensembl
-from BioREST.Eutils import EUtils, EUtilsParser
-from BioREST.Fasta import FASTA, MultiFASTA
-from BioREST.Intact import Intact
-from BioREST.KEGG import KEGG, KEGGParser, KEGGParser2
-from BioREST.Psicquic import Psicquic, AppsPPI
-from BioREST.QuickGo import QuickGo
-from BioREST.Reactome import Reactome, ReactomeAnalysis
-from BioREST.String import String
-from BioREST.Uniprot import Uniprot
-from BioREST.HGNC import HGNC
-from BioREST.PDB import PDB
+"""
+Services are imported on first access, so `import BioREST` stays cheap and only the modules (and their dependencies,
+e.g. pandas) of the services actually used are loaded.
+"""
+import sys
+import types
+import importlib
+
+_lazy = {
+    'ArrayExpress': 'BioREST.ArrayExpress',
+    'BioDBnet': 'BioREST.BioDBnet',
+    'Biogrid': 'BioREST.Biogrid',
+    'BiogridParser': 'BioREST.Biogrid',
+    'Biomart': 'BioREST.Biomart',
+    'BioMartQuery': 'BioREST.Biomart',
+    'Encode': 'BioREST.Encode',
+    'Ensembl': 'BioREST.Ensembl',
+    'EUtils': 'BioREST.Eutils',
+    'EUtilsParser': 'BioREST.Eutils',
+    'FASTA': 'BioREST.Fasta',
+    'MultiFASTA': 'BioREST.Fasta',
+    'Intact': 'BioREST.Intact',
+    'KEGG': 'BioREST.KEGG',
+    'KEGGParser': 'BioREST.KEGG',
+    'KEGGParser2': 'BioREST.KEGG',
+    'KEGGIterParser': 'BioREST.KEGG',
+    'KEGGMirror': 'BioREST.KEGG',
+    'Psicquic': 'BioREST.Psicquic',
+    'AppsPPI': 'BioREST.Psicquic',
+    'QuickGo': 'BioREST.QuickGo',
+    'Reactome': 'BioREST.Reactome',
+    'ReactomeAnalysis': 'BioREST.Reactome',
+    'String': 'BioREST.String',
+    'Uniprot': 'BioREST.Uniprot',
+    'HGNC': 'BioREST.HGNC',
+    'PDB': 'BioREST.PDB',
+}
+
+__all__ = sorted(_lazy)
+
+
+def __getattr__(name):
+    module = _lazy.get(name)
+    if module is None:
+        raise AttributeError("module 'BioREST' has no attribute %r" % name)
+    value = getattr(importlib.import_module(module), name)
+    # cache it, next accesses do not go through __getattr__
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_lazy))
+
+
+class _Package(types.ModuleType):
+    def __setattr__(self, name, value):
+        # importing a submodule binds it on the package, keep the service class of the same name instead
+        if isinstance(value, types.ModuleType) and _lazy.get(name) == value.__name__:
+            value = getattr(value, name)
+        super(_Package, self).__setattr__(name, value)
+
+
+sys.modules[__name__].__class__ = _Package
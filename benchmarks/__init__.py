@@ -0,0 +1,19 @@
+# coding=utf-8
+"""
+Benchmarks of BioREST
+A local stand-in server serves fixture payloads of configurable size in place of the remote services, so the main
+entry points can be measured offline and compared between versions.
+
+    python -m benchmarks                          # small fixtures, all cases
+    python -m benchmarks --preset full -o 1.0.json  # 1M lines MITAB, 50k KEGG entries, 100MB FASTA ...
+    python -m benchmarks --case KEGG.get --set kegg_gets=1000
+    python -m benchmarks --compare 1.0.json -o 1.1.json
+"""
+
+__author__ = "Arnaud KOPP"
+__copyright__ = "© 2015-2016 KOPP Arnaud All Rights Reserved"
+__credits__ = ["KOPP Arnaud"]
+__license__ = "GNU GPL V3.0"
+__maintainer__ = "Arnaud KOPP"
+__email__ = "kopp.arnaud@gmail.com"
+__status__ = "Production"
@@ -0,0 +1,64 @@
+# coding=utf-8
+"""
+Command line of the benchmarks, results are written as JSON
+"""
+
+__author__ = "Arnaud KOPP"
+__copyright__ = "© 2015-2016 KOPP Arnaud All Rights Reserved"
+__credits__ = ["KOPP Arnaud"]
+__license__ = "GNU GPL V3.0"
+__maintainer__ = "Arnaud KOPP"
+__email__ = "kopp.arnaud@gmail.com"
+__status__ = "Production"
+
+import sys
+import json
+import argparse
+import logging
+from benchmarks import suite
+
+
+def _parse_set(values):
+    params = {}
+    for value in values or []:
+        key, _, number = value.partition("=")
+        if not number:
+            raise argparse.ArgumentTypeError("--set expects key=value, got %s" % value)
+        params[key] = float(number) if "." in number else int(number)
+    return params
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Benchmarks of BioREST entry points "
+                                                                              "against a local stand-in server")
+    parser.add_argument("--preset", default="small", choices=sorted(suite.presets), help="fixture sizes")
+    parser.add_argument("--case", action="append", dest="cases", choices=suite.cases(),
+                        help="case to run (repeatable), default to all")
+    parser.add_argument("--set", action="append", metavar="KEY=VALUE", help="override a preset value")
+    parser.add_argument("--repeat", type=int, default=3, help="number of timed runs by case")
+    parser.add_argument("--latency", type=float, default=0., help="seconds waited by the server before answering")
+    parser.add_argument("--no-memory", action="store_true", help="skip the peak memory run")
+    parser.add_argument("--compare", metavar="JSON", help="previous result to compare with")
+    parser.add_argument("-o", "--output", metavar="JSON", help="write results to this file instead of stdout")
+    parser.add_argument("-v", "--verbose", action="store_true")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format='%(asctime)s %(levelname)-8s %(message)s')
+    res = suite.run(names=args.cases, preset=args.preset, params=_parse_set(args.set), repeat=args.repeat,
+                    memory=not args.no_memory, latency=args.latency)
+    if args.compare:
+        with open(args.compare) as f:
+            res['comparison'] = suite.compare(json.load(f), res)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(res, f, indent=2)
+    else:
+        json.dump(res, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+    return 1 if any('error' in x for x in res['results'].values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
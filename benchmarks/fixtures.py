@@ -0,0 +1,210 @@
+# coding=utf-8
+"""
+Deterministic fixture payloads for the benchmarks
+Every generator returns bytes and gives the same output for the same arguments, so results of different versions
+are comparable.
+"""
+
+__author__ = "Arnaud KOPP"
+__copyright__ = "© 2015-2016 KOPP Arnaud All Rights Reserved"
+__credits__ = ["KOPP Arnaud"]
+__license__ = "GNU GPL V3.0"
+__maintainer__ = "Arnaud KOPP"
+__email__ = "kopp.arnaud@gmail.com"
+__status__ = "Production"
+
+import random
+
+_amino_acids = "ACDEFGHIKLMNPQRSTVWY"
+_nucleotides = "acgt"
+
+
+def _accession(rnd):
+    return "%s%s%s%s" % (rnd.choice("OPQ"), rnd.randint(0, 9), "".join(rnd.choice("ABCDEFGHIJKLMNOPQRSTUVWXYZ")
+                                                                       for _ in range(3)), rnd.randint(0, 9))
+
+
+def _wrap(sequence, width=60, indent=""):
+    return "\n".join(indent + sequence[i:i + width] for i in range(0, len(sequence), width))
+
+
+def mitab(lines, seed=0):
+    """
+    PSICQUIC MITAB 2.5 lines (15 tab separated columns)
+    :param lines: number of interactions
+    :param seed: random seed
+    """
+    rnd = random.Random(seed)
+    out = []
+    for i in range(lines):
+        a, b = _accession(rnd), _accession(rnd)
+        out.append("\t".join([
+            "uniprotkb:%s" % a, "uniprotkb:%s" % b,
+            "intact:EBI-%s" % rnd.randint(1, 10 ** 7), "intact:EBI-%s" % rnd.randint(1, 10 ** 7),
+            "psi-mi:%s_human(display_long)" % a.lower(), "psi-mi:%s_human(display_long)" % b.lower(),
+            'psi-mi:"MI:0018"(two hybrid)', "Author et al. (20%02d)" % rnd.randint(0, 16),
+            "pubmed:%s" % rnd.randint(10 ** 6, 3 * 10 ** 7), "taxid:9606(human)", "taxid:9606(human)",
+            'psi-mi:"MI:0915"(physical association)', 'psi-mi:"MI:0469"(IntAct)',
+            "intact:EBI-%s" % (10 ** 7 + i), "intact-miscore:%.2f" % rnd.random()]))
+    return ("\n".join(out) + "\n").encode()
+
+
+def kegg_entry(index, seed=0):
+    """
+    One KEGG gene entry, as returned by KEGG.get (ends with ///)
+    :param index: entry number, used as gene id (the entry of hsa:<index>)
+    :param seed: random seed
+    """
+    rnd = random.Random("%s-%s" % (seed, index))
+    gene = index
+    name = "GENE%s" % index
+    aaseq = "".join(rnd.choice(_amino_acids) for _ in range(rnd.randint(100, 600)))
+    ntseq = "".join(rnd.choice(_nucleotides) for _ in range(len(aaseq) * 3))
+    pathways = ["            hsa%05d  Pathway %s" % (rnd.randint(0, 5200), j) for j in range(rnd.randint(1, 6))]
+    pathways[0] = "PATHWAY     " + pathways[0].strip()
+    lines = [
+        "ENTRY       %-18sCDS       T01001" % gene,
+        "NAME        %s, %s-like" % (name, name),
+        "DEFINITION  protein %s" % name,
+        "ORTHOLOGY   K%05d  ortholog of %s" % (rnd.randint(0, 25000), name),
+        "ORGANISM    hsa  Homo sapiens (human)",
+    ] + pathways + [
+        "POSITION    %s" % rnd.choice(["1p36.33", "12q13.13", "17q21.31", "Xq28"]),
+        "MOTIF       Pfam: SH2 Pkinase_Tyr",
+        "DBLINKS     NCBI-GeneID: %s" % gene,
+        "            NCBI-ProteinID: NP_%06d" % index,
+        "            HGNC: %s" % rnd.randint(1, 50000),
+        "            UniProt: %s" % _accession(rnd),
+        "STRUCTURE   PDB: %s" % " ".join("%d%s" % (rnd.randint(1, 9), "".join(rnd.choice("ABCDEFGHIJKLMNOPQRSTUVWXYZ")
+                                                                            for _ in range(3))) for _ in range(4)),
+        "AASEQ       %s" % len(aaseq),
+        _wrap(aaseq, indent="            "),
+        "NTSEQ       %s" % len(ntseq),
+        _wrap(ntseq, indent="            "),
+        "///"]
+    return "\n".join(lines) + "\n"
+
+
+def kegg_flat(entries, seed=0):
+    """
+    KEGG flat file with several entries separated by ///
+    :param entries: number of entries
+    :param seed: random seed
+    """
+    return "".join(kegg_entry(i, seed) for i in range(entries)).encode()
+
+
+def fasta(size, seed=0):
+    """
+    UniProt (sp) multi FASTA
+    :param size: approximate size in bytes
+    :param seed: random seed
+    """
+    rnd = random.Random(seed)
+    out = []
+    total = 0
+    index = 0
+    while total < size:
+        accession = "Q%05d" % index
+        sequence = "".join(rnd.choice(_amino_acids) for _ in range(rnd.randint(200, 2000)))
+        record = ">sp|%s|P%s_HUMAN Protein %s OS=Homo sapiens GN=G%s PE=1 SV=1\n%s\n" % (
+            accession, index, index, index, _wrap(sequence))
+        out.append(record)
+        total += len(record)
+        index += 1
+    return "".join(out).encode()
+
+
+uniprot_columns = ["Entry", "Entry name", "Status", "Protein names", "Gene names", "Organism", "Length",
+                   "PubMed ID", "Comments", "Domains", "Protein families", "Gene ontology (GO)", "Gene ontology IDs",
+                   "InterPro", "Interacts with", "Keywords", "Subcellular location", "Sequence"]
+
+
+def uniprot_tab(entries, seed=0):
+    """
+    UniProt search result in tab format, one row by entry name
+    :param entries: list of entry names
+    :param seed: random seed
+    """
+    out = ["\t".join(uniprot_columns)]
+    for entry in entries:
+        rnd = random.Random("%s-%s" % (seed, entry))
+        sequence = "".join(rnd.choice(_amino_acids) for _ in range(rnd.randint(100, 800)))
+        out.append("\t".join([
+            _accession(rnd), entry, "reviewed", "Protein %s" % entry, "G%s G%sL" % (entry, entry),
+            "Homo sapiens (Human)", str(len(sequence)),
+            "; ".join(str(rnd.randint(10 ** 6, 3 * 10 ** 7)) for _ in range(5)), "FUNCTION: Unknown.",
+            "SH2 domain", "Protein kinase superfamily", "cytoplasm [GO:0005737]; kinase activity [GO:0016301]",
+            "GO:0005737; GO:0016301", "IPR000719; IPR000980", "P%05d; Q%05d" % (rnd.randint(0, 99999),
+                                                                             rnd.randint(0, 99999)),
+            "ATP-binding; Kinase", "Cytoplasm", " ".join(sequence[i:i + 10] for i in range(0, len(sequence), 10))]))
+    return ("\n".join(out) + "\n").encode()
+
+
+def quickgo_tsv(rows, columns, seed=0):
+    """
+    QuickGO annotation download in tsv format, with a header line
+    :param rows: number of annotations
+    :param columns: list of column names
+    :param seed: random seed
+    """
+    rnd = random.Random(seed)
+    out = ["\t".join(columns)]
+    for i in range(rows):
+        out.append("\t".join("%s_%s" % (column, rnd.randint(0, 10 ** 6)) for column in columns))
+    return ("\n".join(out) + "\n").encode()
+
+
+def biogrid_tab2(rows, seed=0):
+    """
+    BioGRID tab2 interactions (24 tab separated columns, no header)
+    :param rows: number of interactions
+    :param seed: random seed
+    """
+    rnd = random.Random(seed)
+    out = []
+    for i in range(rows):
+        a, b = rnd.randint(1, 10 ** 5), rnd.randint(1, 10 ** 5)
+        out.append("\t".join([
+            str(i), str(a), str(b), str(a + 10 ** 5), str(b + 10 ** 5), "ORF%s" % a, "ORF%s" % b, "G%s" % a,
+            "G%s" % b, "-", "-", "Two-hybrid", "physical", "Author (2015)", str(rnd.randint(10 ** 6, 3 * 10 ** 7)),
+            "9606", "9606", "High Throughput", "-", "-", "-", "-", "-", "BIOGRID"]))
+    return ("\n".join(out) + "\n").encode()
+
+
+def kgml(entries, seed=0):
+    """
+    KEGG KGML pathway with entries and relations between them
+    :param entries: number of entries
+    :param seed: random seed
+    """
+    rnd = random.Random(seed)
+    out = ['<?xml version="1.0"?>', '<!DOCTYPE pathway SYSTEM "http://www.kegg.jp/kegg/xml/KGML_v0.7.1_.dtd">',
+           '<pathway name="path:hsa04660" org="hsa" number="04660" title="T cell receptor signaling pathway">']
+    for i in range(entries):
+        out.append('    <entry id="%s" name="hsa:%s" type="gene" link="http://www.kegg.jp/dbget-bin/www_bget?hsa:%s">\n'
+                   '        <graphics name="GENE%s" fgcolor="#000000" bgcolor="#BFFFBF" type="rectangle" x="%s" y="%s" '
+                   'width="46" height="17"/>\n    </entry>' % (i, 1000 + i, 1000 + i, i, rnd.randint(0, 1200),
+                                                               rnd.randint(0, 800)))
+    for i in range(entries):
+        out.append('    <relation entry1="%s" entry2="%s" type="PPrel">\n'
+                   '        <subtype name="activation" value="--&gt;"/>\n'
+                   '    </relation>' % (i, rnd.randint(0, entries)))
+    out.append('</pathway>')
+    return ("\n".join(out) + "\n").encode()
+
+
+def psicquic_registry(services, url):
+    """
+    PSICQUIC registry (action=STATUS, format=xml) listing stand-in services
+    :param services: list of service names
+    :param url: base url of the stand-in PSICQUIC services, resturl of a service is url/<name>/
+    """
+    out = ['<?xml version="1.0" encoding="UTF-8"?>', '<registry xmlns="http://hupo.psi.org/psicquic/registry">']
+    for name in services:
+        out.append("<service><name>%s</name><soapUrl>%s/%s/soap</soapUrl><restUrl>%s/%s/</restUrl>"
+                   "<restExample>%s/%s/query/brca2</restExample><active>true</active><count>1000</count>"
+                   "<version>1.3</version><restricted>false</restricted></service>" % (name, url, name, url, name,
+                                                                                       url, name))
+    out.append("</registry>")
+    return "\n".join(out).encode()
@@ -0,0 +1,137 @@
+# coding=utf-8
+"""
+Local stand-in server serving fixture payloads in place of the remote services
+"""
+
+__author__ = "Arnaud KOPP"
+__copyright__ = "© 2015-2016 KOPP Arnaud All Rights Reserved"
+__credits__ = ["KOPP Arnaud"]
+__license__ = "GNU GPL V3.0"
+__maintainer__ = "Arnaud KOPP"
+__email__ = "kopp.arnaud@gmail.com"
+__status__ = "Production"
+
+import gzip
+import time
+import threading
+import http.server
+import urllib.parse
+import logging
+log = logging.getLogger(__name__)
+
+
+class StandInServer(object):
+    """
+    Threaded http server answering GET and POST requests with payloads built by routes
+    A route is a callable receiving the path (without the prefix) and the query parameters and returning the payload
+    (bytes) or a tuple (payload, content type). Requests with compressed=y are answered gzip encoded, as PSICQUIC
+    does.
+
+    with StandInServer(latency=0.01) as server:
+        server.route("/kegg/get/", lambda path, query: kegg_entry(int(path)).encode())
+        KEGG service pointed to server.url + "/kegg"
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.):
+        """
+        :param host: interface to listen on
+        :param port: port to listen on (0 to pick a free one)
+        :param latency: seconds waited before answering each request
+        """
+        self.latency = latency
+        self.requests = 0
+        self._routes = []
+        self._lock = threading.Lock()
+        self._server = http.server.ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    def _get_url(self):
+        return "http://%s:%s" % self._server.server_address[:2]
+
+    url = property(_get_url, doc="base url of the server")
+
+    def route(self, prefix, func):
+        """
+        Serve requests whose path starts with prefix
+        :param prefix: path prefix, longest prefixes are tried first
+        :param func: callable (path, query) -> payload or (payload, content type)
+        """
+        self._routes.append((prefix, func))
+        self._routes.sort(key=lambda x: -len(x[0]))
+
+    def _resolve(self, raw_path, body=None):
+        parts = urllib.parse.urlsplit(raw_path)
+        query = dict(urllib.parse.parse_qsl(parts.query, keep_blank_values=True))
+        if body:
+            query.update(urllib.parse.parse_qsl(body.decode(), keep_blank_values=True))
+        path = urllib.parse.unquote(parts.path)
+        for prefix, func in self._routes:
+            if path.startswith(prefix):
+                res = func(path[len(prefix):], query)
+                if isinstance(res, tuple):
+                    return res[0], res[1], query
+                return res, "text/plain", query
+        return None, None, query
+
+    def _handler(self):
+        server = self
+
+        class _Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # headers and body are written separately, avoid delayed ACK stalls on keep-alive connections
+            disable_nagle_algorithm = True
+
+            def _answer(self, body=None):
+                with server._lock:
+                    server.requests += 1
+                if server.latency:
+                    time.sleep(server.latency)
+                payload, content_type, query = server._resolve(self.path, body)
+                if payload is None:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                if query.get("compressed") == "y":
+                    payload = gzip.compress(payload, compresslevel=1)
+                    self.send_header("Content-Encoding", "gzip")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                view = memoryview(payload)
+                for i in range(0, len(view), 1024 ** 2):
+                    self.wfile.write(view[i:i + 1024 ** 2])
+
+            def do_GET(self):
+                self._answer()
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                self._answer(self.rfile.read(length) if length else None)
+
+            def log_message(self, fmt, *args):
+                log.debug(fmt % args)
+
+        return _Handler
+
+    def start(self):
+        """
+        Serve from a daemon thread
+        """
+        self._thread = threading.Thread(target=self._server.serve_forever, name="BioREST-standin", daemon=True)
+        self._thread.start()
+        log.info("Stand-in server listening on %s" % self.url)
+        return self
+
+    def stop(self):
+        """
+        Stop serving
+        """
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
@@ -0,0 +1,439 @@
+# coding=utf-8
+"""
+Benchmark cases of the main entry points of BioREST
+Network cases talk to a local :class:`~benchmarks.server.StandInServer` serving fixture payloads, parsing cases run
+on the same fixtures. Each case reports throughput, latency percentiles of its operations (requests or records) and
+peak memory (traced Python allocations).
+"""
+
+__author__ = "Arnaud KOPP"
+__copyright__ = "© 2015-2016 KOPP Arnaud All Rights Reserved"
+__credits__ = ["KOPP Arnaud"]
+__license__ = "GNU GPL V3.0"
+__maintainer__ = "Arnaud KOPP"
+__email__ = "kopp.arnaud@gmail.com"
+__status__ = "Production"
+
+import os
+import sys
+import json
+import time
+import subprocess
+import shutil
+import platform
+import tempfile
+import datetime
+import tracemalloc
+import collections
+import logging
+from BioREST.Metrics import Histogram, MetricsRegistry
+from benchmarks import fixtures
+from benchmarks.server import StandInServer
+
+log = logging.getLogger(__name__)
+
+presets = {
+    'small': {'imports': 5,
+              'kgml_entries': 5000,
+              'kegg_gets': 50,
+              'kegg_entries': 2000,
+              'mitab_lines': 20000,
+              'psicquic_services': 4,
+              'uniprot_entries': 500,
+              'fasta_bytes': 5 * 1024 ** 2,
+              'quickgo_rows': 20000,
+              'biogrid_rows': 20000},
+    'full': {'imports': 20,
+             'kgml_entries': 100000,
+             'kegg_gets': 500,
+             'kegg_entries': 50000,
+             'mitab_lines': 1000000,
+             'psicquic_services': 4,
+             'uniprot_entries': 5000,
+             'fasta_bytes': 100 * 1024 ** 2,
+             'quickgo_rows': 500000,
+             'biogrid_rows': 1000000},
+}
+
+_cases = collections.OrderedDict()
+
+
+def case(name, operation, memory=True):
+    """
+    Register a benchmark case
+    The decorated function receives a :class:`Context`, prepares its fixtures and returns a callable run(latency)
+    doing the measured work. run observes the duration of each operation in the latency histogram and returns a
+    dict with the number of records and bytes processed.
+    :param name: case name
+    :param operation: what a latency sample measures (request, record, file ...)
+    :param memory: False if peak memory is meaningless for the case (e.g. work done in subprocesses)
+    """
+
+    def decorator(func):
+        _cases[name] = (func, operation, memory)
+        return func
+
+    return decorator
+
+
+def cases():
+    """
+    :return: list of registered case names
+    """
+    return list(_cases)
+
+
+class Context(object):
+    """
+    Shared state of a benchmark run: stand-in server, parameters and a temporary directory
+    """
+
+    def __init__(self, server, params, tmpdir):
+        self.server = server
+        self.params = params
+        self.tmpdir = tmpdir
+
+    def service(self, service, prefix):
+        """
+        Point a service to the stand-in server, without caches nor throttling
+        :param service: REST instance
+        :param prefix: path prefix of the service on the stand-in server
+        :return: service
+        """
+        service.url = self.server.url + prefix
+        service.cache = False
+        service.memory_cache = False
+        service.REQUEST_PER_SEC = 10 ** 6
+        service.metrics = MetricsRegistry()
+        return service
+
+
+def _network_latency(service, latency):
+    """
+    Observe the network time of each request sent by service
+    :return: the hook, to be unregistered
+    """
+    return service.hooks.register('after_response', lambda payload: latency.observe(payload['network_time']))
+
+
+# modules that must not be loaded by importing the package and a service
+_heavy_modules = ('pandas', 'numpy', 'bs4', 'lxml')
+
+_import_script = """
+import sys, time, json
+start = time.perf_counter()
+import BioREST
+BioREST.KEGG
+print(json.dumps({'seconds': time.perf_counter() - start, 'heavy': [m for m in %r if m in sys.modules]}))
+""" % (_heavy_modules,)
+
+
+@case("import BioREST", operation="process", memory=False)
+def import_biorest(ctx):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+    def run(latency):
+        heavy = []
+        for _ in range(ctx.params['imports']):
+            out = subprocess.check_output([sys.executable, "-c", _import_script], cwd=root)
+            res = json.loads(out.decode())
+            latency.observe(res['seconds'])
+            heavy = res['heavy']
+        if heavy:
+            # guard, the package must stay cheap to import
+            raise AssertionError("import BioREST loaded %s" % ", ".join(heavy))
+        return {'records': ctx.params['imports'], 'bytes': 0}
+
+    return run
+
+
+@case("KEGG.get", operation="request")
+def kegg_get(ctx):
+    from BioREST.KEGG import KEGG
+    ctx.server.route("/kegg/get/", lambda path, query: fixtures.kegg_entry(int(path.split(":")[1])).encode())
+    k = ctx.service(KEGG(), "/kegg")
+    ids = ["hsa:%s" % i for i in range(ctx.params['kegg_gets'])]
+
+    def run(latency):
+        size = 0
+        for dbentry in ids:
+            start = time.perf_counter()
+            size += len(k.get(dbentry))
+            latency.observe(time.perf_counter() - start)
+        return {'records': len(ids), 'bytes': size}
+
+    return run
+
+
+@case("KEGGParser2", operation="record")
+def kegg_parser2(ctx):
+    from BioREST.KEGG import KEGGParser2
+    data = fixtures.kegg_flat(ctx.params['kegg_entries']).decode()
+    records = [x + "///" for x in data.split("///\n") if x.strip()]
+
+    def run(latency):
+        for record in records:
+            start = time.perf_counter()
+            KEGGParser2(record)
+            latency.observe(time.perf_counter() - start)
+        return {'records': len(records), 'bytes': len(data)}
+
+    return run
+
+
+@case("KEGGIterParser", operation="file")
+def kegg_iter_parser(ctx):
+    from BioREST.KEGG import KEGGIterParser
+    path = os.path.join(ctx.tmpdir, "kegg.ent")
+    with open(path, "wb") as f:
+        f.write(fixtures.kegg_flat(ctx.params['kegg_entries']))
+
+    def run(latency):
+        start = time.perf_counter()
+        records = sum(1 for _ in KEGGIterParser(path))
+        latency.observe(time.perf_counter() - start)
+        return {'records': records, 'bytes': os.path.getsize(path)}
+
+    return run
+
+
+@case("KEGG parse_many", operation="file", memory=False)
+def kegg_parse_many(ctx):
+    from BioREST.KEGG import parse_many, iter_kegg_records
+    data = fixtures.kegg_flat(ctx.params['kegg_entries'])
+
+    def run(latency):
+        start = time.perf_counter()
+        records = sum(1 for _ in parse_many(iter_kegg_records(data), workers=None))
+        latency.observe(time.perf_counter() - start)
+        return {'records': records, 'bytes': len(data)}
+
+    return run
+
+
+@case("Psicquic.retrieve_all", operation="request")
+def psicquic_retrieve_all(ctx):
+    from BioREST.Psicquic import Psicquic
+    names = ["db%s" % i for i in range(ctx.params['psicquic_services'])]
+    lines = ctx.params['mitab_lines'] // len(names)
+    payloads = dict((name, fixtures.mitab(lines, seed=i)) for i, name in enumerate(names))
+    registry = fixtures.psicquic_registry(names, ctx.server.url + "/psicquic")
+    ctx.server.route("/psicquic/registry/registry", lambda path, query: (registry, "application/xml"))
+    ctx.server.route("/psicquic/", lambda path, query: payloads.get(path.split("/")[0]))
+    p = ctx.service(Psicquic(), "/psicquic")
+
+    def run(latency):
+        hook = _network_latency(p, latency)
+        try:
+            res = p.retrieve_all("brca2")
+        finally:
+            p.hooks.unregister('after_response', hook)
+        return {'records': sum(len(x) for x in res.values()), 'bytes': sum(len(x) for x in payloads.values())}
+
+    return run
+
+
+@case("Uniprot.get_df", operation="request")
+def uniprot_get_df(ctx):
+    from BioREST.Uniprot import Uniprot
+    entries = ["E%s_HUMAN" % i for i in range(ctx.params['uniprot_entries'])]
+    ctx.server.route("/uniprot/uniprot/", lambda path, query: fixtures.uniprot_tab(query['query'].split(" or ")))
+    u = ctx.service(Uniprot(), "/uniprot")
+
+    def run(latency):
+        hook = _network_latency(u, latency)
+        try:
+            df = u.get_df(entries)
+        finally:
+            u.hooks.unregister('after_response', hook)
+        return {'records': len(df), 'bytes': int(u.metrics.snapshot()['UniProt']['bytes_in'])}
+
+    return run
+
+
+@case("MultiFASTA.read_fasta", operation="file")
+def multifasta_read_fasta(ctx):
+    from BioREST.Fasta import MultiFASTA
+    filename = os.path.join(ctx.tmpdir, "sequences.fasta")
+    with open(filename, "wb") as f:
+        f.write(fixtures.fasta(ctx.params['fasta_bytes']))
+
+    def run(latency):
+        start = time.perf_counter()
+        m = MultiFASTA()
+        m.read_fasta(filename)
+        latency.observe(time.perf_counter() - start)
+        return {'records': len(m), 'bytes': os.path.getsize(filename)}
+
+    return run
+
+
+@case("QuickGo.Annotation_from_goid", operation="request")
+def quickgo_annotation_from_goid(ctx):
+    from BioREST.QuickGo import QuickGo
+    payload = fixtures.quickgo_tsv(ctx.params['quickgo_rows'], QuickGo._valid_col)
+    ctx.server.route("/quickgo/GAnnotation", lambda path, query: payload)
+    q = ctx.service(QuickGo(), "/quickgo")
+
+    def run(latency):
+        start = time.perf_counter()
+        res = q.Annotation_from_goid("GO:0003824")
+        latency.observe(time.perf_counter() - start)
+        return {'records': len(res), 'bytes': len(payload)}
+
+    return run
+
+
+@case("BiogridParser", operation="file")
+def biogrid_parser(ctx):
+    from BioREST.Biogrid import BiogridParser
+    data = fixtures.biogrid_tab2(ctx.params['biogrid_rows']).decode()
+
+    def run(latency):
+        start = time.perf_counter()
+        parser = BiogridParser(data)
+        latency.observe(time.perf_counter() - start)
+        return {'records': len(parser.Data), 'bytes': len(data)}
+
+    return run
+
+
+def _kgml_entries(elements):
+    return [(x.get("id"), x.get("name"), x.find("graphics").get("name")) for x in elements]
+
+
+@case("easyXML (ElementTree + soup, previous)", operation="document")
+def easyxml_previous(ctx):
+    import xml.etree.ElementTree as ET
+    import bs4
+    data = fixtures.kgml(ctx.params['kgml_entries']).decode()
+
+    def run(latency):
+        # what easyXML used to do: parse with ElementTree then build the soup, and search it
+        start = time.perf_counter()
+        ET.fromstring(data)
+        soup = bs4.BeautifulSoup(data, 'lxml')
+        entries = _kgml_entries(soup.findAll("entry"))
+        latency.observe(time.perf_counter() - start)
+        return {'records': len(entries), 'bytes': len(data)}
+
+    return run
+
+
+@case("easyXML", operation="document")
+def easyxml(ctx):
+    from BioREST.Service import easyXML
+    data = fixtures.kgml(ctx.params['kgml_entries']).decode()
+
+    def run(latency):
+        start = time.perf_counter()
+        entries = _kgml_entries(easyXML(data).findAll("entry"))
+        latency.observe(time.perf_counter() - start)
+        return {'records': len(entries), 'bytes': len(data)}
+
+    return run
+
+
+@case("easyXML.iterparse", operation="document")
+def easyxml_iterparse(ctx):
+    from BioREST.Service import iterparse
+    data = fixtures.kgml(ctx.params['kgml_entries'])
+    # as read from the network
+    chunks = [data[i:i + 64 * 1024] for i in range(0, len(data), 64 * 1024)]
+
+    def run(latency):
+        start = time.perf_counter()
+        entries = _kgml_entries(iterparse(chunks, tag="entry"))
+        latency.observe(time.perf_counter() - start)
+        return {'records': len(entries), 'bytes': len(data)}
+
+    return run
+
+
+def measure(run, repeat=3, memory=True):
+    """
+    Run a case several times
+    :param run: callable returned by a case
+    :param repeat: number of timed runs, throughput is computed on the best one
+    :param memory: if True, an extra run measures the peak of traced allocations (tracemalloc slows it down)
+    :return: dict with records, bytes, seconds, records_per_sec, mb_per_sec, latency and peak_memory
+    """
+    latency = Histogram(reservoir=100000)
+    times = []
+    out = {}
+    for _ in range(max(1, repeat)):
+        start = time.perf_counter()
+        out = run(latency)
+        times.append(time.perf_counter() - start)
+    best = min(times)
+    res = {'records': out['records'], 'bytes': out['bytes'],
+           'seconds': {'min': best, 'mean': sum(times) / len(times), 'max': max(times)},
+           'records_per_sec': out['records'] / best if best else None,
+           'mb_per_sec': out['bytes'] / 1024. ** 2 / best if best else None,
+           'latency': latency.summary(), 'peak_memory': None}
+    if memory:
+        tracemalloc.start()
+        try:
+            run(Histogram())
+            res['peak_memory'] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return res
+
+
+def run(names=None, preset='small', params=None, repeat=3, memory=True, latency=0.):
+    """
+    Run benchmark cases
+    :param names: list of case names, default to all (see :func:`cases`)
+    :param preset: name of the fixture sizes preset (see :data:`presets`)
+    :param params: dict overriding preset values
+    :param repeat: number of timed runs by case
+    :param memory: if True, measure peak memory
+    :param latency: seconds waited by the stand-in server before each answer
+    :return: dict with environment, parameters and results by case, failing cases report their error
+    """
+    from BioREST.Service import __version__
+    conf = dict(presets[preset], **(params or {}))
+    names = names or cases()
+    for name in names:
+        if name not in _cases:
+            raise ValueError("Unknown case %s, must be in %s" % (name, cases()))
+    results = collections.OrderedDict()
+    tmpdir = tempfile.mkdtemp(prefix="BioREST-bench-")
+    try:
+        with StandInServer(latency=latency) as server:
+            ctx = Context(server, conf, tmpdir)
+            for name in names:
+                func, operation, traced = _cases[name]
+                log.info("Running %s" % name)
+                try:
+                    res = measure(func(ctx), repeat=repeat, memory=memory and traced)
+                    res['operation'] = operation
+                except Exception as e:
+                    log.warning("Case %s failed: %s" % (name, e))
+                    res = {'operation': operation, 'error': "%s: %s" % (type(e).__name__, e)}
+                results[name] = res
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+    return {'version': __version__, 'python': sys.version.split()[0], 'platform': platform.platform(),
+            'date': datetime.datetime.now().isoformat(), 'preset': preset, 'params': conf, 'repeat': repeat,
+            'server_latency': latency, 'results': results}
+
+
+def compare(old, new):
+    """
+    Compare two benchmark results
+    :param old: result of :func:`run` (e.g. loaded from a previous version JSON)
+    :param new: result of :func:`run`
+    :return: dict by case of speedup (old best time / new best time) and memory ratio (new peak / old peak)
+    """
+    out = collections.OrderedDict()
+    for name, res in new['results'].items():
+        before = old['results'].get(name)
+        if before is None or 'error' in before or 'error' in res:
+            out[name] = None
+            continue
+        out[name] = {'speedup': before['seconds']['min'] / res['seconds']['min'] if res['seconds']['min'] else None,
+                     'memory_ratio': res['peak_memory'] / before['peak_memory']
+                     if res['peak_memory'] and before['peak_memory'] else None}
+    return out